@@ -0,0 +1,166 @@
+import time
+import click
+from flask.cli import with_appcontext
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import delete, exists, func, insert, select, union, update
+from . import db
+from .models import ArchivedComment, ArchivedLike, Comment, Like, Post, PostArchive
+
+ARCHIVE_AFTER = timedelta(hours=24)
+
+
+def adjust_archive_counts(post_id, likes=0, comments=0):
+    """
+    Add to the archived totals of post_id, in the caller's transaction, when
+    an archived like or comment is removed by its author.
+    """
+    db.session.execute(
+        update(PostArchive)
+        .where(PostArchive.post_id == post_id)
+        .values(
+            likes_count=PostArchive.likes_count + likes,
+            comments_count=PostArchive.comments_count + comments,
+        )
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _expired_post_ids(time_threshold, batch_size):
+    """Posts past the 24h window that still have likes or comments in the hot tables."""
+    expired = union(
+        select(Like.post_id)
+        .join(Post, Post.post_id == Like.post_id)
+        .where(Post.posted_at < time_threshold),
+        select(Comment.post_id)
+        .join(Post, Post.post_id == Comment.post_id)
+        .where(Post.posted_at < time_threshold),
+    ).subquery()
+    return (
+        db.session.execute(select(expired.c.post_id).limit(batch_size)).scalars().all()
+    )
+
+
+def _count_by_post(model, post_ids):
+    return dict(
+        db.session.execute(
+            select(model.post_id, func.count())
+            .where(model.post_id.in_(post_ids))
+            .group_by(model.post_id)
+        ).all()
+    )
+
+
+def archive_batch(post_ids):
+    """Move the likes and comments of post_ids to the archive tables, set-based."""
+    moved_likes = db.session.execute(
+        insert(ArchivedLike).from_select(
+            ["post_id", "user_id", "liked_at"],
+            select(Like.post_id, Like.user_id, Like.liked_at).where(
+                Like.post_id.in_(post_ids),
+                ~exists().where(
+                    ArchivedLike.post_id == Like.post_id,
+                    ArchivedLike.user_id == Like.user_id,
+                ),
+            ),
+        )
+    ).rowcount
+    moved_comments = db.session.execute(
+        insert(ArchivedComment).from_select(
+            ["comment_id", "user_id", "post_id", "content", "commented_at"],
+            select(
+                Comment.comment_id,
+                Comment.user_id,
+                Comment.post_id,
+                Comment.content,
+                Comment.commented_at,
+            ).where(
+                Comment.post_id.in_(post_ids),
+                ~exists().where(ArchivedComment.comment_id == Comment.comment_id),
+            ),
+        )
+    ).rowcount
+
+    # Only delete what was copied: rows added since the INSERT stay hot and
+    # are picked up by the next run
+    db.session.execute(
+        delete(Like).where(
+            Like.post_id.in_(post_ids),
+            exists().where(
+                ArchivedLike.post_id == Like.post_id,
+                ArchivedLike.user_id == Like.user_id,
+            ),
+        )
+    )
+    db.session.execute(
+        delete(Comment).where(
+            Comment.post_id.in_(post_ids),
+            exists().where(ArchivedComment.comment_id == Comment.comment_id),
+        )
+    )
+
+    # Owners can still interact with their own old posts, so a post can be
+    # archived more than once. Recount rather than increment to stay exact.
+    likes = _count_by_post(ArchivedLike, post_ids)
+    comments = _count_by_post(ArchivedComment, post_ids)
+    summaries = {
+        archive.post_id: archive
+        for archive in PostArchive.query.filter(PostArchive.post_id.in_(post_ids))
+    }
+    now = datetime.now(timezone.utc)
+    for post_id in post_ids:
+        summary = summaries.get(post_id)
+        if summary is None:
+            summary = PostArchive(post_id=post_id)
+            db.session.add(summary)
+        summary.likes_count = likes.get(post_id, 0)
+        summary.comments_count = comments.get(post_id, 0)
+        summary.archived_at = now
+
+    db.session.commit()
+    return moved_likes, moved_comments
+
+
+def archive_expired_interactions(batch_size=500, now=None):
+    """
+    Archive the interactions of every expired post, one committed batch of
+    posts at a time. Returns the number of posts, likes and comments moved.
+    """
+    time_threshold = (now or datetime.now(timezone.utc)) - ARCHIVE_AFTER
+    totals = {"posts": 0, "likes": 0, "comments": 0}
+
+    while True:
+        post_ids = _expired_post_ids(time_threshold, batch_size)
+        if not post_ids:
+            return totals
+
+        likes, comments = archive_batch(post_ids)
+        totals["posts"] += len(post_ids)
+        totals["likes"] += likes
+        totals["comments"] += comments
+
+
+@click.command("archive-interactions")
+@click.option("--batch-size", default=500, show_default=True, help="Posts per batch")
+@click.option(
+    "--interval",
+    type=int,
+    default=None,
+    help="Keep running, archiving every INTERVAL seconds",
+)
+@with_appcontext
+def archive_interactions_command(batch_size, interval):
+    """Move likes and comments of posts older than 24h to the archive tables."""
+    while True:
+        totals = archive_expired_interactions(batch_size=batch_size)
+        click.echo(
+            f"Archived {totals['likes']} likes and {totals['comments']} comments "
+            f"from {totals['posts']} posts"
+        )
+        if interval is None:
+            return
+        db.session.remove()
+        time.sleep(interval)
+
+
+def init_app(app):
+    app.cli.add_command(archive_interactions_command)
@@ -1,6 +1,5 @@
 import re
 from flask import request
-from werkzeug.security import generate_password_hash, check_password_hash
 from flask_jwt_extended import (
     create_access_token,
     create_refresh_token,
@@ -12,6 +11,9 @@ from flask_restx import Namespace, Resource, fields
 from .models import User, RevokedToken
 from . import db
 from .utils import create_success_response, create_error_response
+from .deletion import is_disabled
+from .passwords import HashingBusy, check_password, hash_password, needs_rehash
+from .uploads import profile_picture_url
 
 api = Namespace("auth", description="Authentication operations")
 
@@ -70,6 +72,23 @@ def validate_password(password):
     return True, ""
 
 
+def hashing_busy_response():
+    response = create_error_response(
+        "Too many login attempts, try again shortly", status_code=503
+    )
+    response.headers["Retry-After"] = "1"
+    return response
+
+
+def upgrade_password_hash(user, password):
+    """Rehash with the current parameters, on a login that has the password."""
+    try:
+        user.password = hash_password(password)
+    except HashingBusy:
+        return  # On a later login
+    db.session.commit()
+
+
 def validate_email(email):
     """Validate the email address using a regular expression."""
     email_regex = r"^((?!\.)[a-zA-Z0-9_.-]*[^.])(@[a-zA-Z0-9-]+)(\.[a-zA-Z0-9-.]+)$"  # character \w-_ was causing an error, so regex has been updated.
@@ -114,9 +133,10 @@ class Register(Resource):
                 "Is not valid password", details=password_message, status_code=400
             )
 
-        hashed_password = generate_password_hash(
-            password
-        )  # By default, it has 16 character of salt.
+        try:
+            hashed_password = hash_password(password)
+        except HashingBusy:
+            return hashing_busy_response()
         new_user = User(username=username, email=email, password=hashed_password)
         db.session.add(new_user)
         db.session.commit()
@@ -130,7 +150,9 @@ class Register(Resource):
                 "access_token": access_token,
                 "refresh_token": refresh_token,
                 "username": new_user.username,
-                "profile_picture": f"/user/uploads/{new_user.profile_picture}",
+                "profile_picture": profile_picture_url(
+                    new_user.profile_picture, "small"
+                ),
             },
         )
 
@@ -146,10 +168,18 @@ class Login(Resource):
         if not email or not password:
             return create_error_response("Missing email or password", status_code=400)
 
-        user = User.query.filter_by(email=email).first()
+        user = User.query.filter(
+            User.email == email, ~is_disabled(User.user_id)
+        ).first()
+
+        try:
+            if not user or not check_password(user.password, password):
+                return create_error_response("Invalid credentials", status_code=401)
+        except HashingBusy:
+            return hashing_busy_response()
 
-        if not user or not check_password_hash(user.password, password):
-            return create_error_response("Invalid credentials", status_code=401)
+        if needs_rehash(user.password):
+            upgrade_password_hash(user, password)
 
         access_token = create_access_token(identity=str(user.user_id))
         refresh_token = create_refresh_token(identity=str(user.user_id))
@@ -163,7 +193,7 @@ class Login(Resource):
                 "access_token": access_token,
                 "refresh_token": refresh_token,
                 "username": user.username,
-                "profile_picture": f"/user/uploads/{user.profile_picture}",
+                "profile_picture": profile_picture_url(user.profile_picture, "small"),
             },
         )
 
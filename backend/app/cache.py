@@ -0,0 +1,435 @@
+"""
+Application cache. L1 is a bounded LRU with a TTL in each worker, L2 an
+optional backend shared by every worker (Redis). Entries carry tags such as
+post:<id>, user:<id> or collection:<id>, and write endpoints invalidate all
+the entries of a tag at once.
+"""
+
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from flask import current_app
+from .config import Config
+from .metrics import CACHE_EVICTIONS, CACHE_REQUESTS, COALESCED_CALLS
+from .singleflight import SingleFlight
+
+try:
+    import redis
+except ImportError:  # Only needed with CACHE_BACKEND=redis
+    redis = None
+
+MISSING = object()
+
+# Incremented by every invalidation, in L2
+GENERATION_KEY = "tag-generation"
+
+# How often workers waiting for another worker's compute check the L2
+LOCK_POLL_INTERVAL = 0.05
+
+
+class MemoryCache:
+    """Bounded, thread-safe LRU of key -> value with a TTL and tags per entry."""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()  # key -> (expires_at, value, tags)
+        self._tags = {}  # tag -> keys
+        # Incremented by every invalidation. The latest generation of the
+        # recently invalidated tags tells whether a value computed since a
+        # generation was built from data changed since.
+        self.generation = 0
+        self._invalidated = OrderedDict()  # tag -> generation
+        self._forgotten = 0  # Newest generation dropped from _invalidated
+        self._lock = threading.Lock()
+
+    def _remove(self, key):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            if entry[0] <= time.monotonic():
+                self._remove(key)
+                CACHE_EVICTIONS.labels("l1", "expired").inc()
+                return MISSING
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def _invalidated_since(self, tags, generation):
+        if generation < self._forgotten:
+            return True
+        return any(self._invalidated.get(tag, 0) > generation for tag in tags)
+
+    def set(self, key, value, ttl, tags=(), since=None):
+        """
+        Store value. With since, a generation read before computing value,
+        value is dropped if one of its tags was invalidated meanwhile.
+        """
+        with self._lock:
+            if since is not None and self._invalidated_since(tags, since):
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+                CACHE_EVICTIONS.labels("l1", "size").inc()
+
+    def delete(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def invalidate_tags(self, tags):
+        with self._lock:
+            self.generation += 1
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+                    CACHE_EVICTIONS.labels("l1", "invalidated").inc()
+                self._invalidated[tag] = self.generation
+                self._invalidated.move_to_end(tag)
+            while len(self._invalidated) > self.maxsize:
+                _, self._forgotten = self._invalidated.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedBackend(ABC):
+    """
+    Store shared by the workers, holding serialized entries and a version
+    counter per tag. Invalidating a tag bumps its version, which makes every
+    entry written with the previous version stale.
+    """
+
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def get_many(self, keys):
+        pass
+
+    @abstractmethod
+    def set(self, key, value, ttl):
+        pass
+
+    @abstractmethod
+    def delete(self, key):
+        pass
+
+    @abstractmethod
+    def incr(self, key):
+        pass
+
+    @abstractmethod
+    def add(self, key, value, ttl):
+        """Set key unless it exists, return whether it was set."""
+
+    @abstractmethod
+    def delete_if(self, key, value):
+        """Delete key if it still holds value."""
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+
+class RedisBackend(SharedBackend):
+    def __init__(self, url, prefix="flashnews:"):
+        if redis is None:
+            raise RuntimeError("CACHE_BACKEND=redis requires redis to be installed")
+        self.client = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self._delete_if = self.client.register_script(
+            "if redis.call('get', KEYS[1]) == ARGV[1] then "
+            "return redis.call('del', KEYS[1]) end return 0"
+        )
+
+    def get(self, key):
+        value = self.client.get(self.prefix + key)
+        return None if value is None else value.decode()
+
+    def get_many(self, keys):
+        values = self.client.mget([self.prefix + key for key in keys])
+        return [None if value is None else value.decode() for value in values]
+
+    def set(self, key, value, ttl):
+        self.client.set(self.prefix + key, value, ex=max(1, int(ttl)))
+
+    def delete(self, key):
+        self.client.delete(self.prefix + key)
+
+    def incr(self, key):
+        return self.client.incr(self.prefix + key)
+
+    def add(self, key, value, ttl):
+        return bool(self.client.set(self.prefix + key, value, ex=ttl, nx=True))
+
+    def delete_if(self, key, value):
+        self._delete_if(keys=[self.prefix + key], args=[value])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=f"{self.prefix}*"))
+        if keys:
+            self.client.delete(*keys)
+
+
+class LocalBackend(SharedBackend):
+    """
+    In-process stand-in for a shared backend, for tests and local development
+    of the two-layer path. Only shared by the threads of one process.
+    """
+
+    def __init__(self):
+        self._values = {}  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        entry = self._values.get(key)
+        if entry is None or (entry[0] is not None and entry[0] <= time.monotonic()):
+            return None
+        return entry[1]
+
+    def get(self, key):
+        with self._lock:
+            return self._get(key)
+
+    def get_many(self, keys):
+        with self._lock:
+            return [self._get(key) for key in keys]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._values[key] = (time.monotonic() + ttl, value)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def incr(self, key):
+        with self._lock:
+            value = int(self._get(key) or 0) + 1
+            self._values[key] = (None, str(value))
+            return value
+
+    def add(self, key, value, ttl):
+        with self._lock:
+            if self._get(key) is not None:
+                return False
+            self._values[key] = (time.monotonic() + ttl, value)
+            return True
+
+    def delete_if(self, key, value):
+        with self._lock:
+            if self._get(key) == value:
+                del self._values[key]
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Cache:
+    """
+    Two-layer cache. Values must be JSON serializable when there is an L2.
+    An invalidation only clears the L1 of the worker that made it, so L1
+    entries live at most l1_ttl seconds when there is an L2, and tagged ones
+    do without an L2 too: that bounds how long a worker can serve an entry
+    invalidated by another worker.
+    """
+
+    def __init__(
+        self,
+        maxsize=10000,
+        default_ttl=60,
+        backend=None,
+        l1_ttl=5,
+        json=None,
+        lock_timeout=0,
+    ):
+        self.l1 = MemoryCache(maxsize)
+        self.l2 = backend
+        self.default_ttl = default_ttl
+        self.l1_ttl = l1_ttl
+        self.json = json
+        self.lock_timeout = lock_timeout
+        self._flight = SingleFlight("cache")
+
+    def _tag_versions(self, tags):
+        versions = self.l2.get_many([f"tag:{tag}" for tag in tags])
+        return {tag: int(version or 0) for tag, version in zip(tags, versions)}
+
+    def _l1_ttl(self, ttl, tags):
+        return min(ttl, self.l1_ttl) if self.l2 is not None or tags else ttl
+
+    def get(self, key):
+        value = self.l1.get(key)
+        if value is not MISSING:
+            CACHE_REQUESTS.labels("l1", "hit").inc()
+            return value
+        CACHE_REQUESTS.labels("l1", "miss").inc()
+        if self.l2 is None:
+            return MISSING
+
+        payload = self.l2.get(f"entry:{key}")
+        if payload is not None:
+            entry = self.json.loads(payload)
+            tags = list(entry["tags"])
+            if self._tag_versions(tags) == entry["tags"]:
+                CACHE_REQUESTS.labels("l2", "hit").inc()
+                self.l1.set(key, entry["value"], self._l1_ttl(entry["ttl"], tags), tags)
+                return entry["value"]
+        CACHE_REQUESTS.labels("l2", "miss").inc()
+        return MISSING
+
+    def set(self, key, value, ttl=None, tags=()):
+        tags = list(tags)
+        versions = self._tag_versions(tags) if self.l2 is not None else None
+        self._store(key, value, ttl, tags, versions)
+
+    def _store(self, key, value, ttl, tags, versions, since=None):
+        ttl = ttl or self.default_ttl
+        if self.l2 is not None:
+            entry = {"value": value, "ttl": ttl, "tags": versions}
+            self.l2.set(f"entry:{key}", self.json.dumps(entry), ttl)
+        self.l1.set(key, value, self._l1_ttl(ttl, tags), tags, since)
+
+    def get_or_set(self, key, compute, ttl=None, tags=()):
+        """
+        Return the cached value of key, or compute, store and return it. tags
+        may be a function of the computed value, and None results are not
+        stored. Concurrent misses on the same key wait for a single compute:
+        within the process, and across workers when there is an L2 and a
+        lock_timeout.
+        """
+        value = self.get(key)
+        if value is not MISSING:
+            return value
+        return self._flight.do(key, lambda: self._load(key, compute, ttl, tags))
+
+    def _compute(self, key, compute, ttl, tags):
+        # A value computed while one of its tags was invalidated may have
+        # been built from the old data, so it isn't stored. The versions are
+        # read before computing. Tags computed from the value can't be read
+        # before, any invalidation during the compute drops the value then.
+        since = self.l1.generation
+        versions = generation = None
+        if self.l2 is not None:
+            if callable(tags):
+                generation = self.l2.get(GENERATION_KEY)
+            else:
+                tags = list(tags)
+                versions = self._tag_versions(tags)
+
+        value = compute()
+        if value is None:
+            return value
+        if callable(tags):
+            tags = list(tags(value))
+            if self.l2 is not None:
+                if self.l2.get(GENERATION_KEY) != generation:
+                    return value
+                versions = self._tag_versions(tags)
+        elif self.l2 is not None and self._tag_versions(tags) != versions:
+            return value
+        self._store(key, value, ttl, tags, versions, since)
+        return value
+
+    def _load(self, key, compute, ttl, tags):
+        if self.l2 is None or not self.lock_timeout:
+            return self._compute(key, compute, ttl, tags)
+
+        # Whoever holds the lock computes, the other workers poll for the
+        # value it stores. None results aren't stored, so the next worker
+        # takes the lock instead. Past the timeout, everyone computes.
+        lock, token = f"lock:{key}", uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        acquired = self.l2.add(lock, token, self.lock_timeout)
+        while not acquired and time.monotonic() < deadline:
+            time.sleep(LOCK_POLL_INTERVAL)
+            value = self.get(key)
+            if value is not MISSING:
+                COALESCED_CALLS.labels("cache-lock").inc()
+                return value
+            acquired = self.l2.add(lock, token, self.lock_timeout)
+        try:
+            return self._compute(key, compute, ttl, tags)
+        finally:
+            if acquired:
+                self.l2.delete_if(lock, token)
+
+    def delete(self, key):
+        self.l1.delete(key)
+        if self.l2 is not None:
+            self.l2.delete(f"entry:{key}")
+
+    def invalidate_tags(self, *tags):
+        # L2 first, so that a compute reading the versions meanwhile can't
+        # see the old ones once L1 is cleared
+        if self.l2 is not None:
+            for tag in tags:
+                self.l2.incr(f"tag:{tag}")
+            self.l2.incr(GENERATION_KEY)
+        self.l1.invalidate_tags(tags)
+
+    def clear(self):
+        self.l1.clear()
+        if self.l2 is not None:
+            self.l2.clear()
+
+
+def create_cache(app):
+    config = app.config
+    backend = config["CACHE_BACKEND"]
+    if backend == "memory":
+        shared = None
+    elif backend == "redis":
+        shared = RedisBackend(config["CACHE_REDIS_URL"])
+    elif backend == "local":
+        shared = LocalBackend()
+    else:
+        raise ValueError(f"Unknown CACHE_BACKEND {backend!r}")
+    return Cache(
+        maxsize=config["CACHE_MAX_ENTRIES"],
+        default_ttl=config["CACHE_DEFAULT_TTL"],
+        backend=shared,
+        l1_ttl=config["CACHE_L1_TTL"],
+        json=app.json,
+        lock_timeout=config["CACHE_LOCK_TIMEOUT"],
+    )
+
+
+def get_cache():
+    return current_app.extensions["cache"]
+
+
+def init_app(app):
+    for name in (
+        "CACHE_BACKEND",
+        "CACHE_REDIS_URL",
+        "CACHE_MAX_ENTRIES",
+        "CACHE_DEFAULT_TTL",
+        "CACHE_L1_TTL",
+        "CACHE_LOCK_TIMEOUT",
+    ):
+        app.config.setdefault(name, getattr(Config, name))
+    app.extensions["cache"] = create_cache(app)
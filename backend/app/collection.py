@@ -1,14 +1,34 @@
+from datetime import datetime, timezone
 from flask import request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_restx import Namespace, Resource, fields
-import json
+from sqlalchemy import DateTime, delete, func, literal, or_, select
 from . import db
-from .models import Collection, CollectionPost, User
-from .post import SinglePostOperations
-from .utils import create_success_response, create_error_response
+from .cache import MISSING, get_cache
+from .models import Article, Collection, CollectionPost, Post, User
+from .post import post_details_query, serialize_post
+from .utils import (
+    create_success_response,
+    create_error_response,
+    dialect_insert,
+    post_is_visible,
+    post_visibility,
+)
 
 api = Namespace("collections", description="Collections related operations")
 
+bulk_posts_model = api.model(
+    "CollectionPosts",
+    {
+        "post_ids": fields.List(
+            fields.Integer,
+            required=True,
+            description="IDs of the posts to add or remove",
+            example=[1, 2, 3],
+        ),
+    },
+)
+
 collection_model = api.model(
     "Collection",
     {
@@ -78,6 +98,7 @@ class AddCollections(Resource):
 
         db.session.add(collection)
         db.session.commit()
+        get_cache().invalidate_tags(f"user:{user_id}")
 
         return create_success_response(
             "Collection created successfully",
@@ -86,102 +107,381 @@ class AddCollections(Resource):
         )
 
 
+# Most cover previews a collection can be listed with
+PREVIEWS_MAX = 4
+
+# Previews are invalidated when posts are added to or removed from the
+# collection and when one of their posts is deleted
+PREVIEWS_TTL = 300
+
+# Listings are invalidated by any change to the user or their collections
+COLLECTIONS_TTL = 60
+
+
+def load_previews(collection_ids):
+    """
+    The PREVIEWS_MAX latest article previews of each collection, in one query
+    ranking each collection's posts with ROW_NUMBER().
+    """
+    position = (
+        func.row_number()
+        .over(
+            partition_by=CollectionPost.collection_id,
+            order_by=(CollectionPost.added_at.desc(), Post.post_id.desc()),
+        )
+        .label("position")
+    )
+    ranked = (
+        select(
+            CollectionPost.collection_id,
+            Post.post_id,
+            Article.title,
+            Article.preview,
+            position,
+        )
+        .join(Post, Post.post_id == CollectionPost.post_id)
+        .join(Article, Article.article_id == Post.article_id)
+        .where(
+            CollectionPost.collection_id.in_(collection_ids),
+            Article.preview.isnot(None),
+        )
+        .subquery()
+    )
+    rows = db.session.execute(
+        select(ranked)
+        .where(ranked.c.position <= PREVIEWS_MAX)
+        .order_by(ranked.c.collection_id, ranked.c.position)
+    ).all()
+
+    previews = {collection_id: [] for collection_id in collection_ids}
+    for row in rows:
+        previews[row.collection_id].append(
+            {"post_id": row.post_id, "title": row.title, "preview": row.preview}
+        )
+    return previews
+
+
+def collection_previews(collection_ids):
+    """Previews of collection_ids, from the cache or else loaded in one query."""
+    cache = get_cache()
+    previews = {}
+    for collection_id in collection_ids:
+        cached = cache.get(f"collection-previews:{collection_id}")
+        if cached is not MISSING:
+            previews[collection_id] = cached
+    missing = [c for c in collection_ids if c not in previews]
+    if missing:
+        loaded = load_previews(missing)
+        for collection_id, entries in loaded.items():
+            cache.set(
+                f"collection-previews:{collection_id}",
+                entries,
+                PREVIEWS_TTL,
+                tags=[f"collection:{collection_id}"]
+                + [f"post:{entry['post_id']}" for entry in entries],
+            )
+        previews.update(loaded)
+    return previews
+
+
+def serialize_collection(row):
+    collection = row.Collection
+    return {
+        "collection_id": collection.collection_id,
+        "title": collection.title,
+        "description": collection.description,
+        "emoji": collection.emoji,
+        "is_public": collection.is_public,
+        "created_at": collection.created_at.isoformat(),
+        "articles_count": row.articles_count,
+        "user_id": collection.user_id,
+    }
+
+
+def paginate_collections(filters, page, per_page):
+    """
+    Return (total, page, per_page, rows) for the collections matching filters,
+    newest first, with their number of posts. One grouped query: the page of
+    collections is picked first, so only its posts are counted.
+    """
+    page = page if page and page > 0 else 1
+    per_page = per_page if per_page and per_page > 0 else 50
+    order = (Collection.created_at.desc(), Collection.collection_id.desc())
+
+    page_ids = (
+        select(Collection.collection_id, func.count().over().label("total"))
+        .where(*filters)
+        .order_by(*order)
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+        .subquery()
+    )
+    rows = (
+        db.session.query(
+            Collection,
+            page_ids.c.total,
+            func.count(CollectionPost.post_id).label("articles_count"),
+        )
+        .join(page_ids, page_ids.c.collection_id == Collection.collection_id)
+        .outerjoin(
+            CollectionPost, CollectionPost.collection_id == Collection.collection_id
+        )
+        .group_by(Collection.collection_id, page_ids.c.total)
+        .order_by(*order)
+        .all()
+    )
+
+    if rows:
+        total = rows[0].total
+    else:
+        total = (
+            db.session.query(func.count(Collection.collection_id))
+            .filter(*filters)
+            .scalar()
+        )
+
+    return total, page, per_page, rows
+
+
+def collections_page(user_id, is_owner, page, per_page):
+    """
+    The cached page of user_id's collections as a dict with total, page,
+    per_page and the serialized collections, or None when the user doesn't
+    exist.
+    """
+    page = page if page and page > 0 else 1
+    per_page = per_page if per_page and per_page > 0 else 50
+    key = f"collections:{user_id}:{'owner' if is_owner else 'public'}:{page}:{per_page}"
+    cache = get_cache()
+    cached = cache.get(key)
+    if cached is not MISSING:
+        return cached
+
+    # Other users only see public collections
+    filters = [Collection.user_id == user_id]
+    if not is_owner:
+        filters.append(Collection.is_public.is_(True))
+    total, page, per_page, rows = paginate_collections(filters, page, per_page)
+
+    # Only an empty page needs to tell a user without collections apart
+    # from a missing user
+    if not rows and not db.session.get(User, user_id):
+        return None
+
+    result = {
+        "total": total,
+        "page": page,
+        "per_page": per_page,
+        "collections": [serialize_collection(row) for row in rows],
+    }
+    tags = [f"user:{user_id}"] + [
+        f"collection:{row.Collection.collection_id}" for row in rows
+    ]
+    cache.set(key, result, COLLECTIONS_TTL, tags)
+    return result
+
+
 # Get user's collections
 @api.route("/user/<int:user_id>")
 class GetUserCollections(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def get(self, user_id):
-        user = User.query.get(user_id)
-        if not user:
+        page = request.args.get("page", 1, type=int)
+        per_page = request.args.get("per_page", 50, type=int)
+        is_owner = int(get_jwt_identity()) == user_id
+
+        previews = request.args.get("previews", 0, type=int)
+        if not 0 <= previews <= PREVIEWS_MAX:
+            return create_error_response(
+                f"previews must be between 0 and {PREVIEWS_MAX}", status_code=400
+            )
+
+        result = collections_page(user_id, is_owner, page, per_page)
+        if result is None:
             return create_error_response("User not found", status_code=404)
+        collections = result["collections"]
+
+        if previews:
+            previews_by_collection = collection_previews(
+                [collection["collection_id"] for collection in collections]
+            )
 
-        # Fetch public and private collections
-        public_collections = [c for c in user.collections if c.is_public]
-        private_collections = [c for c in user.collections if not c.is_public]
-
-        public_collections_data = [
-            {
-                "collection_id": collection.collection_id,
-                "title": collection.title,
-                "description": collection.description,
-                "emoji": collection.emoji,
-                "is_public": collection.is_public,
-                "created_at": collection.created_at.isoformat(),
-                "articles_count": len(collection.posts),
-                "user_id": collection.user_id,
-            }
-            for collection in public_collections
-        ]
-
-        private_collections_data = [
-            {
-                "collection_id": collection.collection_id,
-                "title": collection.title,
-                "emoji": collection.emoji,
-                "description": collection.description,
-                "is_public": collection.is_public,
-                "created_at": collection.created_at.isoformat(),
-                "articles_count": len(collection.posts),
-                "user_id": collection.user_id,
-            }
-            for collection in private_collections
-        ]
-
-        if int(get_jwt_identity()) != user_id:
+        def serialize(collection):
+            if previews:
+                collection = dict(
+                    collection,
+                    previews=previews_by_collection[collection["collection_id"]][
+                        :previews
+                    ],
+                )
+            return collection
+
+        data = {
+            "public": [serialize(c) for c in collections if c["is_public"]],
+            "total": result["total"],
+            "page": result["page"],
+            "per_page": result["per_page"],
+        }
+
+        if not is_owner:
             return create_success_response(
                 "Public collections fetched successfully",
                 status_code=200,
-                data={"public": public_collections_data},
+                data=data,
             )
 
         else:
+            data["private"] = [serialize(c) for c in collections if not c["is_public"]]
             return create_success_response(
                 "Collections fetched successfully",
                 status_code=200,
-                data={
-                    "public": public_collections_data,
-                    "private": private_collections_data,
-                },
+                data=data,
             )
 
 
-# Get posts from a specific collection
+# Most posts a bulk add or remove accepts
+BULK_MAX = 100
+
+
+def owns_collection(collection_id, user_id):
+    return db.session.query(
+        select(Collection.collection_id)
+        .where(Collection.collection_id == collection_id, Collection.user_id == user_id)
+        .exists()
+    ).scalar()
+
+
+def add_posts(collection_id, post_ids, user_id):
+    """
+    Add the posts among post_ids that user_id can see and that aren't in the
+    collection yet, in a single INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    Returns the number of posts added.
+    """
+    added_at = datetime.now(timezone.utc)
+    statement = (
+        dialect_insert(CollectionPost)
+        .from_select(
+            ["collection_id", "post_id", "added_at"],
+            select(
+                literal(collection_id), Post.post_id, literal(added_at, DateTime(True))
+            ).where(Post.post_id.in_(post_ids), post_is_visible(user_id)),
+        )
+        .on_conflict_do_nothing()
+    )
+    return db.session.execute(statement).rowcount
+
+
+def remove_posts(collection_id, post_ids):
+    """Remove post_ids from the collection in one DELETE, returns the number removed."""
+    return db.session.execute(
+        delete(CollectionPost).where(
+            CollectionPost.collection_id == collection_id,
+            CollectionPost.post_id.in_(post_ids),
+        )
+    ).rowcount
+
+
+def bulk_post_ids(data):
+    """The post_ids list of a bulk request body, or None when it is invalid."""
+    post_ids = (data or {}).get("post_ids")
+    if (
+        not isinstance(post_ids, list)
+        or not 0 < len(post_ids) <= BULK_MAX
+        or not all(type(post_id) is int for post_id in post_ids)
+    ):
+        return None
+    return post_ids
+
+
+# Get, add or remove the posts of a collection
 @api.route("/<int:collection_id>/posts")
-class GetCollectionPosts(Resource):
+class CollectionPosts(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def get(self, collection_id):
+        current_user_id = int(get_jwt_identity())
+        # Saved posts stay visible after 24 hours, so there is no time filter.
+        # Other users only see public collections.
+        query = (
+            post_details_query(current_user_id)
+            .join(CollectionPost, CollectionPost.post_id == Post.post_id)
+            .join(Collection, Collection.collection_id == CollectionPost.collection_id)
+            .filter(
+                CollectionPost.collection_id == collection_id,
+                or_(
+                    Collection.is_public.is_(True),
+                    Collection.user_id == current_user_id,
+                ),
+            )
+            .order_by(CollectionPost.added_at.desc(), Post.post_id.desc())
+        )
 
-        collection_posts = CollectionPost.query.filter_by(
-            collection_id=collection_id
-        ).all()
+        # Every post unless a page is asked for, newest saved first
+        per_page = request.args.get("per_page", type=int)
+        if per_page:
+            page = max(request.args.get("page", 1, type=int), 1)
+            query = query.limit(per_page).offset((page - 1) * per_page)
+        rows = query.all()
 
         # If no posts in collection, return empty list
-        if not collection_posts:
+        if not rows:
             return create_success_response(
                 "No posts in collection", status_code=200, data=[]
             )
 
-        posts_data = []
+        return create_success_response(
+            "Posts fetched successfully",
+            status_code=200,
+            data=[serialize_post(row) for row in rows],
+        )
+
+    # Add many posts to a collection
+    @api.doc(security="Bearer Auth")
+    @api.expect(bulk_posts_model)
+    @jwt_required()
+    def post(self, collection_id):
+        post_ids = bulk_post_ids(request.get_json(silent=True))
+        if post_ids is None:
+            return create_error_response(
+                f"post_ids must be a list of 1 to {BULK_MAX} post IDs", status_code=400
+            )
+        current_user_id = int(get_jwt_identity())
+        if not owns_collection(collection_id, current_user_id):
+            return create_error_response("Collection not found", status_code=404)
+
+        # Posts that are missing or hidden (older than 24h) are skipped
+        added = add_posts(collection_id, post_ids, current_user_id)
+        db.session.commit()
+        get_cache().invalidate_tags(f"collection:{collection_id}")
+
+        return create_success_response(
+            "Posts added to collection successfully",
+            status_code=200,
+            data={"added": added},
+        )
 
-        for collection in collection_posts:
-            post_detail = SinglePostOperations()
-            response_object = post_detail.get(collection.post_id, check_24h=False)
-            response, status_code = (
-                response_object.response,
-                response_object.status_code,
+    # Remove many posts from a collection
+    @api.doc(security="Bearer Auth")
+    @api.expect(bulk_posts_model)
+    @jwt_required()
+    def delete(self, collection_id):
+        post_ids = bulk_post_ids(request.get_json(silent=True))
+        if post_ids is None:
+            return create_error_response(
+                f"post_ids must be a list of 1 to {BULK_MAX} post IDs", status_code=400
             )
+        if not owns_collection(collection_id, int(get_jwt_identity())):
+            return create_error_response("Collection not found", status_code=404)
 
-            # Check if post exists
-            if status_code == 200:
-                response = json.loads(response[0].decode("utf-8"))
-                posts_data.append(response["data"])
-            else:
-                return response, status_code
+        removed = remove_posts(collection_id, post_ids)
+        db.session.commit()
+        get_cache().invalidate_tags(f"collection:{collection_id}")
 
         return create_success_response(
-            "Posts fetched successfully", status_code=200, data=posts_data
+            "Posts removed from collection successfully",
+            status_code=200,
+            data={"removed": removed},
         )
 
 
@@ -192,20 +492,22 @@ class ModifyCollectionPosts(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def post(self, collection_id, post_id):
+        current_user_id = int(get_jwt_identity())
+        if not owns_collection(collection_id, current_user_id):
+            return create_error_response("Collection not found", status_code=404)
 
-        check_post = CollectionPost.query.filter_by(
-            collection_id=collection_id, post_id=post_id
-        ).first()
+        added = add_posts(collection_id, [post_id], current_user_id)
+        db.session.commit()
 
-        if check_post:
+        if not added:
+            # Hidden posts can't be saved, and are reported as missing
+            if not post_visibility(post_id, current_user_id):
+                return create_error_response("Post not found", status_code=404)
             return create_success_response(
                 "Post already in collection", status_code=200
             )
 
-        collection_post = CollectionPost(collection_id=collection_id, post_id=post_id)
-        db.session.add(collection_post)
-        db.session.commit()
-
+        get_cache().invalidate_tags(f"collection:{collection_id}")
         return create_success_response(
             "Post added to collection successfully", status_code=200
         )
@@ -215,20 +517,15 @@ class ModifyCollectionPosts(Resource):
     @jwt_required()
     def delete(self, collection_id, post_id):
         # Check if user owns the collection
-        if not (
-            Collection.query.filter_by(
-                collection_id=collection_id, user_id=int(get_jwt_identity())
-            ).first()
-        ):
+        if not owns_collection(collection_id, int(get_jwt_identity())):
             return create_error_response("Collection not found", status_code=404)
 
-        collection_post = CollectionPost.query.filter_by(
-            collection_id=collection_id, post_id=post_id
-        ).first_or_404()
-
-        db.session.delete(collection_post)
+        removed = remove_posts(collection_id, [post_id])
         db.session.commit()
+        if not removed:
+            return create_error_response("Post not in collection", status_code=404)
 
+        get_cache().invalidate_tags(f"collection:{collection_id}")
         return create_success_response(
             "Post removed from collection successfully", status_code=200
         )
@@ -252,6 +549,10 @@ class ModifyCollections(Resource):
         collection.is_public = data.get("is_public", collection.is_public)
 
         db.session.commit()
+        # Listings cached for the other pages count the collection too
+        get_cache().invalidate_tags(
+            f"collection:{collection_id}", f"user:{collection.user_id}"
+        )
 
         return create_success_response(
             "Collection updated successfully", status_code=200
@@ -265,8 +566,10 @@ class ModifyCollections(Resource):
             collection_id=collection_id, user_id=int(get_jwt_identity())
         ).first_or_404()
 
+        user_id = collection.user_id
         db.session.delete(collection)
         db.session.commit()
+        get_cache().invalidate_tags(f"collection:{collection_id}", f"user:{user_id}")
 
         return create_success_response(
             "Collection deleted successfully", status_code=200
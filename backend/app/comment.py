@@ -1,9 +1,18 @@
 from flask import request
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from flask_restx import Namespace, Resource, fields
+from sqlalchemy import select, union_all
 from . import db
-from .models import Post, Comment
-from .utils import check_post_24h, create_success_response, create_error_response
+from .cache import get_cache
+from .models import Post, Comment, ArchivedComment, User
+from .utils import (
+    post_is_visible,
+    post_visibility,
+    create_success_response,
+    create_error_response,
+)
+from .uploads import profile_picture_url
+from .archive import adjust_archive_counts
 
 api = Namespace("comments", description="Comments related operations")
 
@@ -18,6 +27,23 @@ comment_model = api.model(
 )
 
 
+def find_comment(comment_id, user_id):
+    """
+    The comment, hot or archived, and whether user_id can still see its
+    post. None when there is no such comment.
+    """
+    for model in (Comment, ArchivedComment):
+        row = (
+            db.session.query(model, post_is_visible(user_id))
+            .join(Post, Post.post_id == model.post_id)
+            .filter(model.comment_id == comment_id)
+            .first()
+        )
+        if row:
+            return row
+    return None
+
+
 # Comments on a post
 @api.route("/<int:post_id>")
 class Comments(Resource):
@@ -25,11 +51,11 @@ class Comments(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def get(self, post_id):
-        post = Post.query.get(post_id)
-        if not post:
+        is_visible = post_visibility(post_id, int(get_jwt_identity()))
+        if is_visible is None:
             return create_error_response("Post not found", status_code=404)
 
-        if check_post_24h(post):
+        if not is_visible:
             return create_error_response(
                 "You are not allowed to view comments on this post", status_code=403
             )
@@ -37,9 +63,28 @@ class Comments(Resource):
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 10, type=int)
 
+        # Comments of expired posts may have been moved to the archive table
+        columns = ("comment_id", "user_id", "content", "commented_at")
+        comments = union_all(
+            select(*(getattr(Comment, c) for c in columns)).where(
+                Comment.post_id == post_id
+            ),
+            select(*(getattr(ArchivedComment, c) for c in columns)).where(
+                ArchivedComment.post_id == post_id
+            ),
+        ).subquery()
+
         paginated_comments = (
-            Comment.query.filter_by(post_id=post_id)
-            .order_by(Comment.commented_at.desc())
+            db.session.query(
+                comments.c.comment_id,
+                comments.c.content,
+                comments.c.commented_at,
+                User.user_id,
+                User.username,
+                User.profile_picture,
+            )
+            .join(User, User.user_id == comments.c.user_id)
+            .order_by(comments.c.commented_at.desc())
             .paginate(page=page, per_page=per_page, error_out=False)
         )
 
@@ -47,9 +92,11 @@ class Comments(Resource):
             {
                 "comment_id": comment.comment_id,
                 "user": {
-                    "user_id": comment.user.user_id,
-                    "username": comment.user.username,
-                    "profile_picture": f"/user/uploads/{comment.user.profile_picture}",
+                    "user_id": comment.user_id,
+                    "username": comment.username,
+                    "profile_picture": profile_picture_url(
+                        comment.profile_picture, "small"
+                    ),
                 },
                 "comment": comment.content,
                 "commented_at": comment.commented_at,
@@ -73,11 +120,11 @@ class Comments(Resource):
     @api.expect(comment_model)
     @jwt_required()
     def post(self, post_id):
-        post = Post.query.get(post_id)
-        if not post:
+        is_visible = post_visibility(post_id, int(get_jwt_identity()))
+        if is_visible is None:
             return create_error_response("Post not found", status_code=404)
 
-        if check_post_24h(post):
+        if not is_visible:
             return create_error_response(
                 "You are not allowed to comment on this post", status_code=403
             )
@@ -92,6 +139,7 @@ class Comments(Resource):
         )
         db.session.add(post_comment)
         db.session.commit()
+        get_cache().invalidate_tags(f"post:{post_id}")
 
         return create_success_response(
             "Comment created successfully",
@@ -108,16 +156,19 @@ class ModifyComment(Resource):
     @api.expect(comment_model)
     @jwt_required()
     def put(self, comment_id):
-        post_comment = Comment.query.get(comment_id)
-        if not post_comment:
+        current_user_id = int(get_jwt_identity())
+        row = find_comment(comment_id, current_user_id)
+        if not row:
             return create_error_response("Comment not found", status_code=404)
 
-        if post_comment.user_id != int(get_jwt_identity()):
+        post_comment, is_visible = row
+
+        if post_comment.user_id != current_user_id:
             return create_error_response(
                 "You are not allowed to update this comment", status_code=403
             )
 
-        if check_post_24h(post_comment.post):
+        if not is_visible:
             return create_error_response(
                 "You are not allowed to update this comment", status_code=403
             )
@@ -128,7 +179,9 @@ class ModifyComment(Resource):
             return create_error_response("Comment is required", status_code=400)
 
         post_comment.content = comment
+        post_id = post_comment.post_id
         db.session.commit()
+        get_cache().invalidate_tags(f"post:{post_id}")
 
         return create_success_response("Comment updated successfully", status_code=200)
 
@@ -136,21 +189,28 @@ class ModifyComment(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def delete(self, comment_id):
-        post_comment = Comment.query.get(comment_id)
-        if not post_comment:
+        current_user_id = int(get_jwt_identity())
+        row = find_comment(comment_id, current_user_id)
+        if not row:
             return create_error_response("Comment not found", status_code=404)
 
-        if post_comment.user_id != int(get_jwt_identity()):
+        post_comment, is_visible = row
+
+        if post_comment.user_id != current_user_id:
             return create_error_response(
                 "You are not allowed to delete this comment", status_code=403
             )
 
-        if check_post_24h(post_comment.post):
+        if not is_visible:
             return create_error_response(
                 "You are not allowed to delete this comment", status_code=403
             )
 
+        post_id = post_comment.post_id
         db.session.delete(post_comment)
+        if isinstance(post_comment, ArchivedComment):
+            adjust_archive_counts(post_id, comments=-1)
         db.session.commit()
+        get_cache().invalidate_tags(f"post:{post_id}")
 
         return create_success_response("Comment deleted successfully", status_code=200)
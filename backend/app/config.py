@@ -5,6 +5,63 @@ class Config:
     BASE_DIR = os.path.abspath(os.path.dirname(__file__))
     UPLOAD_FOLDER = os.path.join(BASE_DIR, "uploads")
     ALLOWED_EXTENSIONS = {"png", "jpg", "jpeg", "gif"}
+    MAX_UPLOAD_SIZE = int(os.getenv("MAX_UPLOAD_SIZE", 5 * 1024 * 1024))
+    # Resized copies of profile pictures, (width, height) bounding boxes
+    THUMBNAIL_SIZES = {"small": (64, 64), "medium": (256, 256)}
+    UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", 2))
+    # "local" (UPLOAD_FOLDER), "s3", or "directory" (object store stand-in)
+    UPLOAD_STORAGE = os.getenv("UPLOAD_STORAGE", "local")
+    # How local uploads are sent: "app", "x-sendfile" or "x-accel-redirect"
+    UPLOAD_SERVE_MODE = os.getenv("UPLOAD_SERVE_MODE", "app")
+    UPLOAD_ACCEL_PREFIX = os.getenv("UPLOAD_ACCEL_PREFIX", "/protected-uploads/")
+    UPLOAD_PUBLIC_URL = os.getenv("UPLOAD_PUBLIC_URL")
+    UPLOAD_S3_BUCKET = os.getenv("UPLOAD_S3_BUCKET")
+    UPLOAD_S3_ENDPOINT_URL = os.getenv("UPLOAD_S3_ENDPOINT_URL")
+    UPLOAD_S3_PREFIX = os.getenv("UPLOAD_S3_PREFIX", "")
+
+    # Background threads deleting accounts, 0 deletes within the request
+    ACCOUNT_DELETION_WORKERS = int(os.getenv("ACCOUNT_DELETION_WORKERS", 1))
+    ACCOUNT_DELETION_BATCH_SIZE = int(os.getenv("ACCOUNT_DELETION_BATCH_SIZE", 1000))
+    # Seconds without progress after which an unfinished job is run again,
+    # checked by every gunicorn worker once per ACCOUNT_DELETION_RESUME_INTERVAL
+    ACCOUNT_DELETION_STALE_AFTER = int(os.getenv("ACCOUNT_DELETION_STALE_AFTER", 300))
+    ACCOUNT_DELETION_RESUME_INTERVAL = int(
+        os.getenv("ACCOUNT_DELETION_RESUME_INTERVAL", 60)
+    )
+
+    # Seconds to connect to and to read from pages fetched for OpenGraph tags
+    OG_FETCH_TIMEOUT = float(os.getenv("OG_FETCH_TIMEOUT", 5))
+
+    # "memory" (per worker only), "redis" (shared L2) or "local" (L2 stand-in)
+    CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+    CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL", "redis://localhost:6379/0")
+    CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 10000))
+    CACHE_DEFAULT_TTL = int(os.getenv("CACHE_DEFAULT_TTL", 60))
+    # Lifetime of the per-worker copies when there is a shared L2, and of
+    # the tagged ones without: other workers don't see invalidations
+    CACHE_L1_TTL = int(os.getenv("CACHE_L1_TTL", 5))
+    # Seconds workers wait for another worker loading the same entry into
+    # the shared L2, 0 lets every worker load it
+    CACHE_LOCK_TIMEOUT = int(os.getenv("CACHE_LOCK_TIMEOUT", 5))
+
+    # werkzeug method of new password hashes. Hashes made with another one
+    # are redone on the next login
+    PASSWORD_HASH_METHOD = os.getenv("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+    # Processes hashing passwords per worker, 0 hashes within the request
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", 1))
+    # Hashes waiting for a process, past that logins get a 503
+    PASSWORD_HASH_QUEUE_SIZE = int(os.getenv("PASSWORD_HASH_QUEUE_SIZE", 2))
+    # Added to the niceness of the hashing processes
+    PASSWORD_HASH_NICE = int(os.getenv("PASSWORD_HASH_NICE", 10))
+
+    # Level of the app's loggers, and per logger under the app, e.g.
+    # "access=WARNING,deletion=DEBUG" (access.<namespace> for one namespace)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_LEVELS = os.getenv("LOG_LEVELS", "")
+    # Share of the high-volume events kept, per logger, e.g. "access.auth=1"
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "access=0.01")
+    # Records waiting to be written, past that they are dropped
+    LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
 
     @staticmethod
     def ensure_upload_folder_exists():
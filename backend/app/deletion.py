@@ -0,0 +1,377 @@
+import logging
+import threading
+import time
+import uuid
+import click
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from flask.cli import with_appcontext
+from sqlalchemy import delete, exists, func, inspect, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from . import db
+from .cache import get_cache
+from .config import Config
+from .models import (
+    AccountDeletion,
+    ArchivedComment,
+    ArchivedLike,
+    Collection,
+    CollectionPost,
+    Comment,
+    Follow,
+    Like,
+    Post,
+    PostArchive,
+    PostCategory,
+    User,
+    UserStats,
+)
+from .stats import decrement_counts
+
+logger = logging.getLogger(__name__)
+
+# Jobs in these states still have data left to delete
+UNFINISHED = ("pending", "running", "failed")
+
+# Passes over the steps when rows are added while the job runs (e.g. someone
+# follows the user), the next pass deletes them
+PASSES = 3
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    # Created on first use so that forked workers don't share the threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config["ACCOUNT_DELETION_WORKERS"],
+                thread_name_prefix="account-deletion",
+            )
+        return _executor
+
+
+def is_disabled(user_id):
+    """SQL condition true when user_id has an account deletion under way."""
+    return exists().where(
+        AccountDeletion.user_id == user_id, AccountDeletion.status != "completed"
+    )
+
+
+def _tag(tags, prefix, column):
+    """on_batch hook adding the cache tag of each deleted row's column to tags."""
+
+    def on_batch(keys):
+        tags.update(f"{prefix}:{getattr(row, column)}" for row in keys)
+
+    return on_batch
+
+
+def _tag_posts_of(tags, model):
+    """on_batch hook adding the posts of the deleted comments to tags."""
+
+    def on_batch(keys):
+        post_ids = db.session.execute(
+            select(model.post_id).where(
+                model.comment_id.in_([row.comment_id for row in keys])
+            )
+        ).scalars()
+        tags.update(f"post:{post_id}" for post_id in post_ids)
+
+    return on_batch
+
+
+def _steps(user_id, tags):
+    """
+    (step, model, condition, on_batch) in the order the rows must go, children
+    before the rows they reference. The hooks add the cache tags of what the
+    deletion changes to tags.
+    """
+    own_posts = select(Post.post_id).where(Post.user_id == user_id)
+    own_collections = select(Collection.collection_id).where(
+        Collection.user_id == user_id
+    )
+
+    def following(keys):
+        decrement_counts([followed for followed, _ in keys], "followers_count")
+        tags.update(f"user:{followed}" for followed, _ in keys)
+
+    def followers(keys):
+        decrement_counts([follower for _, follower in keys], "following_count")
+        tags.update(f"user:{follower}" for _, follower in keys)
+
+    return [
+        ("likes", Like, Like.user_id == user_id, _tag(tags, "post", "post_id")),
+        ("comments", Comment, Comment.user_id == user_id, _tag_posts_of(tags, Comment)),
+        (
+            "archived likes",
+            ArchivedLike,
+            ArchivedLike.user_id == user_id,
+            _tag(tags, "post", "post_id"),
+        ),
+        (
+            "archived comments",
+            ArchivedComment,
+            ArchivedComment.user_id == user_id,
+            _tag_posts_of(tags, ArchivedComment),
+        ),
+        ("likes on posts", Like, Like.post_id.in_(own_posts), None),
+        ("comments on posts", Comment, Comment.post_id.in_(own_posts), None),
+        (
+            "archived likes on posts",
+            ArchivedLike,
+            ArchivedLike.post_id.in_(own_posts),
+            None,
+        ),
+        (
+            "archived comments on posts",
+            ArchivedComment,
+            ArchivedComment.post_id.in_(own_posts),
+            None,
+        ),
+        ("post archives", PostArchive, PostArchive.post_id.in_(own_posts), None),
+        ("post categories", PostCategory, PostCategory.post_id.in_(own_posts), None),
+        (
+            "saved posts",
+            CollectionPost,
+            CollectionPost.post_id.in_(own_posts),
+            _tag(tags, "collection", "collection_id"),
+        ),
+        (
+            "collection posts",
+            CollectionPost,
+            CollectionPost.collection_id.in_(own_collections),
+            None,
+        ),
+        (
+            "collections",
+            Collection,
+            Collection.user_id == user_id,
+            _tag(tags, "collection", "collection_id"),
+        ),
+        ("posts", Post, Post.user_id == user_id, _tag(tags, "post", "post_id")),
+        ("following", Follow, Follow.follower_id == user_id, following),
+        ("followers", Follow, Follow.user_id == user_id, followers),
+        ("stats", UserStats, UserStats.user_id == user_id, None),
+        ("user", User, User.user_id == user_id, None),
+    ]
+
+
+def _delete_in_batches(job, step, model, condition, on_batch, batch_size):
+    """
+    Delete the rows of model matching condition, batch_size rows per
+    committed transaction, and record the progress on job.
+    """
+    key = inspect(model).primary_key
+    while True:
+        keys = db.session.execute(select(*key).where(condition).limit(batch_size)).all()
+        if not keys:
+            return
+        if len(key) == 1:
+            matching = key[0].in_([row[0] for row in keys])
+        else:
+            matching = tuple_(*key).in_([tuple(row) for row in keys])
+        if on_batch:
+            on_batch(keys)
+        deleted = db.session.execute(
+            delete(model).where(matching).execution_options(synchronize_session=False)
+        ).rowcount
+        job.step = step
+        job.deleted_rows += deleted
+        job.heartbeat_at = datetime.now(timezone.utc)
+        db.session.commit()
+
+
+def _is_stale():
+    """SQL condition true for unfinished jobs that made no progress lately."""
+    cutoff = datetime.now(timezone.utc) - timedelta(
+        seconds=current_app.config["ACCOUNT_DELETION_STALE_AFTER"]
+    )
+    return AccountDeletion.status.in_(UNFINISHED) & (
+        func.coalesce(AccountDeletion.heartbeat_at, AccountDeletion.requested_at)
+        < cutoff
+    )
+
+
+def _claim(job_id, stale_only=False):
+    """
+    Mark the job running, unless another runner holds it. A running job is
+    only taken over once it is stale, its runner is then presumed dead.
+    Returns whether the job was claimed.
+    """
+    claimable = _is_stale()
+    if not stale_only:
+        claimable = or_(AccountDeletion.status.in_(("pending", "failed")), claimable)
+    claimed = db.session.execute(
+        update(AccountDeletion)
+        .where(AccountDeletion.job_id == job_id, claimable)
+        .values(status="running", error=None, heartbeat_at=datetime.now(timezone.utc))
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    db.session.commit()
+    return claimed == 1
+
+
+def _run(job_id, batch_size):
+    job = db.session.get(AccountDeletion, job_id)
+    # Cache tags of the posts, collections and users whose rows went
+    tags = {f"user:{job.user_id}"}
+    for attempt in range(1, PASSES + 1):
+        try:
+            for step, model, condition, on_batch in _steps(job.user_id, tags):
+                _delete_in_batches(job, step, model, condition, on_batch, batch_size)
+            break
+        except Exception as e:
+            db.session.rollback()
+            if isinstance(e, IntegrityError) and attempt < PASSES:
+                logger.warning(
+                    "Account deletion %s raced with a write, deleting again", job_id
+                )
+                continue
+            logger.exception("Account deletion %s failed", job_id)
+            job.status = "failed"
+            job.error = str(e)
+            db.session.commit()
+            # The batches committed before the error are gone all the same
+            get_cache().invalidate_tags(*tags)
+            return job
+
+    job.status = "completed"
+    job.step = None
+    job.finished_at = datetime.now(timezone.utc)
+    db.session.commit()
+    get_cache().invalidate_tags(*tags)
+    return job
+
+
+def run_account_deletion(job_id, batch_size=None):
+    """
+    Delete everything belonging to the job's user. Every batch is committed
+    with its progress, so a job that was interrupted can be run again and
+    carries on where it stopped. A job another runner is still working on
+    is returned as it is.
+    """
+    if batch_size is None:
+        batch_size = current_app.config["ACCOUNT_DELETION_BATCH_SIZE"]
+    if not _claim(job_id):
+        return db.session.get(AccountDeletion, job_id)
+    return _run(job_id, batch_size)
+
+
+def resume_stale_account_deletions():
+    """
+    Run the unfinished jobs nobody made progress on lately: interrupted by
+    a restart, failed, or never started. Returns the jobs run.
+    """
+    job_ids = (
+        db.session.execute(select(AccountDeletion.job_id).where(_is_stale()))
+        .scalars()
+        .all()
+    )
+    batch_size = current_app.config["ACCOUNT_DELETION_BATCH_SIZE"]
+    # Another worker may have claimed them since
+    return [
+        _run(job_id, batch_size)
+        for job_id in job_ids
+        if _claim(job_id, stale_only=True)
+    ]
+
+
+def _resume_forever(app):
+    interval = app.config["ACCOUNT_DELETION_RESUME_INTERVAL"]
+    while True:
+        with app.app_context():
+            try:
+                resume_stale_account_deletions()
+            except Exception:
+                db.session.rollback()
+                logger.exception("Resuming account deletions failed")
+            finally:
+                db.session.remove()
+        time.sleep(interval)
+
+
+def start_resuming(app):
+    """
+    Resume stale account deletions now and then in a background thread of
+    this process. Gunicorn starts one in every worker.
+    """
+    thread = threading.Thread(
+        target=_resume_forever,
+        args=(app,),
+        name="account-deletion-resume",
+        daemon=True,
+    )
+    thread.start()
+    return thread
+
+
+def _run_in_app(app, job_id):
+    with app.app_context():
+        run_account_deletion(job_id)
+
+
+def _unfinished_job(user_id):
+    return db.session.execute(
+        select(AccountDeletion).where(
+            AccountDeletion.user_id == user_id, AccountDeletion.status.in_(UNFINISHED)
+        )
+    ).scalar_one_or_none()
+
+
+def request_account_deletion(user_id):
+    """
+    Disable the account and schedule the deletion of its data. A user with
+    an unfinished deletion gets that job back, run again if it failed.
+    Returns the job and the future of the background run (None when it
+    already ran).
+    """
+    job = _unfinished_job(user_id)
+    if job is None:
+        job = AccountDeletion(job_id=str(uuid.uuid4()), user_id=user_id)
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Requested twice at once, the other request created the job
+            db.session.rollback()
+            job = _unfinished_job(user_id)
+    get_cache().invalidate_tags(f"user:{user_id}")
+
+    if current_app.config["ACCOUNT_DELETION_WORKERS"] == 0:
+        run_account_deletion(job.job_id)
+        return job, None
+    future = _get_executor().submit(
+        _run_in_app, current_app._get_current_object(), job.job_id
+    )
+    return job, future
+
+
+@click.command("resume-account-deletions")
+@with_appcontext
+def resume_account_deletions_command():
+    """Finish account deletions interrupted by a restart or an error."""
+    job_ids = (
+        db.session.execute(
+            select(AccountDeletion.job_id).where(AccountDeletion.status.in_(UNFINISHED))
+        )
+        .scalars()
+        .all()
+    )
+    for job_id in job_ids:
+        job = run_account_deletion(job_id)
+        click.echo(f"{job_id}: {job.status}, {job.deleted_rows} rows deleted")
+
+
+def init_app(app):
+    app.config.setdefault("ACCOUNT_DELETION_WORKERS", Config.ACCOUNT_DELETION_WORKERS)
+    for name in (
+        "ACCOUNT_DELETION_BATCH_SIZE",
+        "ACCOUNT_DELETION_STALE_AFTER",
+        "ACCOUNT_DELETION_RESUME_INTERVAL",
+    ):
+        app.config.setdefault(name, getattr(Config, name))
+    app.cli.add_command(resume_account_deletions_command)
@@ -1,13 +1,40 @@
 from flask import request
 from flask_restx import Namespace, Resource
+from sqlalchemy import select, union_all
 from . import db
-from .models import Post, Like
-from .utils import check_post_24h, create_success_response, create_error_response
+from .cache import get_cache
+from .models import Post, Like, ArchivedLike, User
+from .post import liked_by
+from .archive import adjust_archive_counts
+from .utils import (
+    post_is_visible,
+    post_visibility,
+    create_success_response,
+    create_error_response,
+)
+from .uploads import profile_picture_url
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 api = Namespace("likes", description="Likes related operations")
 
 
+def find_like(user_id, post_id):
+    """
+    The user's like on the post, hot or archived, and whether the user can
+    still see the post. None when there is no like.
+    """
+    for model in (Like, ArchivedLike):
+        row = (
+            db.session.query(model, post_is_visible(user_id))
+            .join(Post, Post.post_id == model.post_id)
+            .filter(model.user_id == user_id, model.post_id == post_id)
+            .first()
+        )
+        if row:
+            return row
+    return None
+
+
 # Likes on a post
 @api.route("/<int:post_id>")
 class Likes(Resource):
@@ -15,11 +42,11 @@ class Likes(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def get(self, post_id):
-        post = Post.query.get(post_id)
-        if not post:
+        is_visible = post_visibility(post_id, int(get_jwt_identity()))
+        if is_visible is None:
             return create_error_response("Post not found", status_code=404)
 
-        if check_post_24h(post):
+        if not is_visible:
             return create_error_response(
                 "You are not allowed to view likes on this post", status_code=403
             )
@@ -27,17 +54,26 @@ class Likes(Resource):
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 10, type=int)
 
+        # Likes of expired posts may have been moved to the archive table
+        likes = union_all(
+            select(Like.user_id, Like.liked_at).where(Like.post_id == post_id),
+            select(ArchivedLike.user_id, ArchivedLike.liked_at).where(
+                ArchivedLike.post_id == post_id
+            ),
+        ).subquery()
+
         paginated_likes = (
-            Like.query.filter_by(post_id=post_id)
-            .order_by(Like.liked_at.desc())
+            db.session.query(User.user_id, User.username, User.profile_picture)
+            .join(likes, likes.c.user_id == User.user_id)
+            .order_by(likes.c.liked_at.desc())
             .paginate(page=page, per_page=per_page, error_out=False)
         )
 
         likes_data = [
             {
                 "user_id": like.user_id,
-                "username": like.user.username,
-                "profile_picture": f"/user/uploads/{like.user.profile_picture}",
+                "username": like.username,
+                "profile_picture": profile_picture_url(like.profile_picture, "small"),
             }
             for like in paginated_likes.items
         ]
@@ -57,29 +93,37 @@ class Likes(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def post(self, post_id):
-        post = Post.query.get(post_id)
+        current_user_id = int(get_jwt_identity())
+
+        # Existence, visibility and the existing like in a single query
+        post = (
+            db.session.query(
+                post_is_visible(current_user_id).label("is_visible"),
+                liked_by(current_user_id).label("is_liked"),
+            )
+            .filter(Post.post_id == post_id)
+            .first()
+        )
         if not post:
             return create_error_response("Post not found", status_code=404)
 
-        existing_like = Like.query.filter_by(
-            user_id=get_jwt_identity(), post_id=post_id
-        ).first()
-        if existing_like:
+        if post.is_liked:
             return create_error_response(
                 "You have already liked this post", status_code=400
             )
 
-        if check_post_24h(post):
+        if not post.is_visible:
             return create_error_response(
                 "You are not allowed to like this post", status_code=403
             )
 
         post_like = Like(
-            user_id=get_jwt_identity(),
+            user_id=current_user_id,
             post_id=post_id,
         )
         db.session.add(post_like)
         db.session.commit()
+        get_cache().invalidate_tags(f"post:{post_id}")
 
         return create_success_response("Post liked successfully", status_code=201)
 
@@ -87,19 +131,21 @@ class Likes(Resource):
     @api.doc(security="Bearer Auth")
     @jwt_required()
     def delete(self, post_id):
-        post_like = Like.query.filter_by(
-            user_id=get_jwt_identity(),
-            post_id=post_id,
-        ).first()
-        if not post_like:
+        current_user_id = int(get_jwt_identity())
+        row = find_like(current_user_id, post_id)
+        if not row:
             return create_error_response("Like not found", status_code=404)
 
-        if check_post_24h(post_like.post):
+        post_like, is_visible = row
+        if not is_visible:
             return create_error_response(
                 "You are not allowed to remove like on this post", status_code=403
             )
 
         db.session.delete(post_like)
+        if isinstance(post_like, ArchivedLike):
+            adjust_archive_counts(post_id, likes=-1)
         db.session.commit()
+        get_cache().invalidate_tags(f"post:{post_id}")
 
         return create_success_response("Like removed successfully", status_code=200)
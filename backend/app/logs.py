@@ -0,0 +1,260 @@
+"""
+Structured logging. Records of the app's loggers are written to stdout as
+one JSON object per line by a background thread: request threads only put
+them on a bounded queue, and drop them when it is full rather than wait for
+stdout. High-volume events, such as the access log, are sampled before a
+record is even built. Levels and sample rates are set per logger, e.g. per
+namespace for the access log (app.access.<namespace>).
+"""
+
+import atexit
+import copy
+import functools
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from flask import g, has_request_context, request
+from .config import Config
+from .metrics import LOG_RECORDS_DROPPED
+
+# Attributes every LogRecord has, the others were passed in extra=
+_RECORD_ATTRIBUTES = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+# Set up once per process, create_app may run several times (tests)
+_handler = None
+_sampler = None
+
+
+class JsonFormatter(logging.Formatter):
+    """Format a record as a single line of JSON."""
+
+    def format(self, record):
+        document = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(
+                timespec="milliseconds"
+            ),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for name, value in vars(record).items():
+            if name not in _RECORD_ATTRIBUTES:
+                document[name] = value
+        if record.exc_info:
+            record.exc_text = record.exc_text or self.formatException(record.exc_info)
+        if record.exc_text:
+            document["exception"] = record.exc_text
+        return json.dumps(document, default=str)
+
+
+class _StdoutHandler(logging.StreamHandler):
+    """
+    Writes to the current sys.stdout, which may be replaced after startup.
+    The listener flushes it once the queue is empty, not after every line.
+    """
+
+    def emit(self, record):
+        try:
+            self.stream = sys.stdout
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+    def flush(self):
+        self.stream = sys.stdout
+        super().flush()
+
+
+class _Listener(QueueListener):
+    def handle(self, record):
+        super().handle(record)
+        if self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+
+    def enqueue_sentinel(self):
+        # Wait for room behind the records still queued when stopping
+        self.queue.put(self._sentinel)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Hands records to a listener thread. A full queue drops the record
+    instead of blocking the caller. The queue and the thread are created
+    again in a forked process (gunicorn workers of a preloaded app), where
+    the parent's thread doesn't exist.
+    """
+
+    def __init__(self, maxsize, handler):
+        super().__init__(None)
+        self.maxsize = maxsize
+        self.handler = handler
+        self.listener = None
+        self._pid = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._pid == os.getpid():
+                return
+            self.queue = queue.Queue(self.maxsize)
+            self.listener = _Listener(self.queue, self.handler)
+            self.listener.start()
+            self._pid = os.getpid()
+
+    def prepare(self, record):
+        # Merge the arguments and render the traceback on the calling
+        # thread, which still has them, and note which request it was
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if has_request_context() and not hasattr(record, "method"):
+            record.method = request.method
+            record.path = request.path
+        return record
+
+    def enqueue(self, record):
+        if self._pid != os.getpid():
+            self._ensure_started()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            LOG_RECORDS_DROPPED.inc()
+
+    def stop(self):
+        """Write out the queued records and stop the listener thread."""
+        if self.listener is not None and self._pid == os.getpid():
+            self.listener.stop()
+            self.handler.flush()
+            self._pid = None
+
+
+class Sampler:
+    """
+    Sample rate per logger: the rate of the logger's closest configured
+    ancestor, or 1 (keep everything).
+    """
+
+    def __init__(self, rates):
+        self.rates = rates
+        self._cache = {}
+
+    def rate(self, name):
+        rate = self._cache.get(name)
+        if rate is None:
+            prefix = name
+            while prefix not in self.rates and "." in prefix:
+                prefix = prefix.rsplit(".", 1)[0]
+            rate = self._cache[name] = self.rates.get(prefix, 1.0)
+        return rate
+
+    def sample(self, name):
+        rate = self.rate(name)
+        return rate >= 1 or random.random() < rate
+
+
+def parse_levels(value):
+    """Parse "access=WARNING,deletion=DEBUG" into {name: level}."""
+    levels = {}
+    for item in filter(None, (part.strip() for part in value.split(","))):
+        name, level = item.split("=", 1)
+        levels[name.strip()] = level.strip().upper()
+    return levels
+
+
+def parse_rates(value):
+    """Parse "access=0.01,access.auth=1" into {name: rate}."""
+    return {name: float(rate) for name, rate in parse_levels(value).items()}
+
+
+def is_logged(logger, level):
+    """
+    Whether to log an event of a high-volume logger, sampled at the rate
+    configured for it. Warnings and errors are always kept.
+    """
+    if not logger.isEnabledFor(level):
+        return False
+    return level >= logging.WARNING or not _sampler or _sampler.sample(logger.name)
+
+
+def log_event(logger, level, message, **fields):
+    """Log a high-volume event, fields become keys of the JSON line."""
+    if is_logged(logger, level):
+        logger.log(level, message, extra=fields)
+
+
+@functools.lru_cache(maxsize=None)
+def _access_logger(namespace):
+    # getLogger takes logging's global lock
+    return logging.getLogger(f"{__package__}.access.{namespace}")
+
+
+def _log_request(response):
+    namespace = g.get("metrics_namespace")
+    if namespace is None:
+        return response
+
+    # Decided before building the fields, most requests aren't logged
+    logger = _access_logger(namespace)
+    status = response.status_code
+    level = logging.WARNING if status >= 500 else logging.INFO
+    if is_logged(logger, level):
+        logger.log(
+            level,
+            "request",
+            extra={
+                "method": request.method,
+                "route": request.url_rule.rule if request.url_rule else "unmatched",
+                "path": request.path,
+                "status": status,
+                "duration_ms": round((time.perf_counter() - g.metrics_start) * 1000, 3),
+            },
+        )
+    return response
+
+
+def install_handler(logger, maxsize):
+    """Send the records of logger and its children to the JSON queue handler."""
+    global _handler
+    if _handler is None:
+        stdout = _StdoutHandler()
+        stdout.setFormatter(JsonFormatter())
+        _handler = NonBlockingQueueHandler(maxsize, stdout)
+        atexit.register(_handler.stop)
+    if _handler not in logger.handlers:
+        logger.addHandler(_handler)
+    # Don't also go to the root logger's handlers (gunicorn's, plain text)
+    logger.propagate = False
+    return _handler
+
+
+def init_app(app):
+    """Configure the app's loggers. Call before anything uses app.logger."""
+    global _sampler
+    for name in ("LOG_LEVEL", "LOG_LEVELS", "LOG_SAMPLE_RATES", "LOG_QUEUE_SIZE"):
+        app.config.setdefault(name, getattr(Config, name))
+
+    # app.logger is the package logger, the modules' loggers are children
+    logger = logging.getLogger(app.import_name)
+    install_handler(logger, app.config["LOG_QUEUE_SIZE"])
+    logger.setLevel(app.config["LOG_LEVEL"].upper())
+    for name, level in parse_levels(app.config["LOG_LEVELS"]).items():
+        logging.getLogger(f"{app.import_name}.{name}").setLevel(level)
+
+    _sampler = Sampler(
+        {
+            f"{app.import_name}.{name}": rate
+            for name, rate in parse_rates(app.config["LOG_SAMPLE_RATES"]).items()
+        }
+    )
+    app.after_request(_log_request)
@@ -0,0 +1,149 @@
+import os
+import time
+from flask import Response, g, has_request_context, request
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+    REGISTRY,
+)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Namespaces registered in create_app. flask-restx names its endpoints
+# "<namespace>_<resource>", so the namespace is the endpoint prefix.
+NAMESPACES = {"auth", "users", "posts", "comments", "likes", "collections", "opengraph"}
+
+# Under gunicorn every worker writes its samples to its own mmap file in
+# PROMETHEUS_MULTIPROC_DIR and /metrics merges them at scrape time, so the
+# hot path never coordinates with other processes.
+MULTIPROCESS = bool(os.getenv("PROMETHEUS_MULTIPROC_DIR"))
+
+REQUEST_LATENCY = Histogram(
+    "flashnews_http_request_duration_seconds",
+    "Request latency by route",
+    ["namespace", "method", "route"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+REQUEST_COUNT = Counter(
+    "flashnews_http_requests_total",
+    "Requests by route and status code",
+    ["namespace", "method", "route", "status"],
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "flashnews_http_requests_in_progress",
+    "Requests currently being served",
+    ["namespace"],
+    multiprocess_mode="livesum",
+)
+DB_QUERIES = Counter(
+    "flashnews_db_queries_total",
+    "SQL statements executed, by the namespace of the request that issued them",
+    ["namespace"],
+)
+OG_FETCH_LATENCY = Histogram(
+    "flashnews_og_fetch_duration_seconds",
+    "Time spent fetching and parsing OpenGraph tags",
+    ["outcome"],
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+CACHE_REQUESTS = Counter(
+    "flashnews_cache_requests_total",
+    "Application cache lookups by layer and result (hit or miss)",
+    ["layer", "result"],
+)
+CACHE_EVICTIONS = Counter(
+    "flashnews_cache_evictions_total",
+    "Entries dropped from the application cache, by reason",
+    ["layer", "reason"],
+)
+COALESCED_CALLS = Counter(
+    "flashnews_coalesced_calls_total",
+    "Calls served by an identical call in flight instead of running",
+    ["group"],
+)
+PASSWORD_HASH_LATENCY = Histogram(
+    "flashnews_password_hash_duration_seconds",
+    "Time to hash or check a password, waiting for a process included",
+    ["operation"],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+PASSWORD_HASHES_REJECTED = Counter(
+    "flashnews_password_hashes_rejected_total",
+    "Password hashes refused because the hashing pool and its queue were full",
+    ["operation"],
+)
+LOG_RECORDS_DROPPED = Counter(
+    "flashnews_log_records_dropped_total",
+    "Log records dropped because the queue to stdout was full",
+)
+
+
+def request_namespace():
+    """Return the restx namespace of the current request, or "other"."""
+    endpoint = request.endpoint or ""
+    namespace = endpoint.split("_", 1)[0]
+    return namespace if namespace in NAMESPACES else "other"
+
+
+def _before_request():
+    g.metrics_start = time.perf_counter()
+    g.metrics_namespace = request_namespace()
+    g.metrics_db_queries = 0
+    REQUESTS_IN_PROGRESS.labels(g.metrics_namespace).inc()
+
+
+def _after_request(response):
+    namespace = g.get("metrics_namespace")
+    if namespace is None:
+        return response
+
+    # Use the rule template rather than the path to keep label cardinality bounded
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    REQUEST_LATENCY.labels(namespace, request.method, route).observe(
+        time.perf_counter() - g.metrics_start
+    )
+    REQUEST_COUNT.labels(namespace, request.method, route, response.status_code).inc()
+    return response
+
+
+def _teardown_request(exc):
+    namespace = g.pop("metrics_namespace", None)
+    if namespace is None:
+        return
+
+    REQUESTS_IN_PROGRESS.labels(namespace).dec()
+    # Queries are tallied on g and flushed once per request
+    queries = g.pop("metrics_db_queries", 0)
+    if queries:
+        DB_QUERIES.labels(namespace).inc(queries)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context() and "metrics_db_queries" in g:
+        g.metrics_db_queries += 1
+
+
+def metrics_view():
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), mimetype=CONTENT_TYPE_LATEST)
+
+
+def init_app(app):
+    """Instrument the app and expose the metrics at /metrics."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    if not event.contains(Engine, "before_cursor_execute", _count_query):
+        event.listen(Engine, "before_cursor_execute", _count_query)
+
+    app.add_url_rule("/metrics", "metrics", metrics_view, methods=["GET"])
@@ -12,7 +12,7 @@ class User(db.Model):  # Removed UserMixin
     email = db.Column(db.String, unique=True, nullable=False)
     password = db.Column(db.String, nullable=False)
     created_at = db.Column(
-        db.DateTime(timezone=True), default=datetime.now(timezone.utc)
+        db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
     bio_description = db.Column(db.Text)
     profile_picture = db.Column(db.String(255))
@@ -40,6 +40,12 @@ class User(db.Model):  # Removed UserMixin
     likes = db.relationship(
         "Like", backref="user", lazy=True, cascade="all, delete-orphan"
     )
+    archived_comments = db.relationship(
+        "ArchivedComment", backref="user", lazy=True, cascade="all, delete-orphan"
+    )
+    archived_likes = db.relationship(
+        "ArchivedLike", backref="user", lazy=True, cascade="all, delete-orphan"
+    )
     followers = db.relationship(
         "Follow",
         foreign_keys="[Follow.user_id]",
@@ -54,6 +60,13 @@ class User(db.Model):  # Removed UserMixin
         lazy=True,
         cascade="all, delete-orphan",
     )
+    stats = db.relationship(
+        "UserStats",
+        backref="user",
+        uselist=False,
+        lazy=True,
+        cascade="all, delete-orphan",
+    )
 
 
 @dataclass
@@ -83,20 +96,62 @@ class Post(db.Model):
     )
     description = db.Column(db.Text)
     posted_at = db.Column(
-        db.DateTime(timezone=True), default=datetime.now(timezone.utc), nullable=False
+        db.DateTime(timezone=True),
+        default=lambda: datetime.now(timezone.utc),
+        nullable=False,
     )
 
+    # The database deletes these with the post (ON DELETE CASCADE), deleting a
+    # post is a single statement whatever its number of likes and comments
     categories = db.relationship(
-        "PostCategory", backref="post", lazy=True, cascade="all, delete-orphan"
+        "PostCategory",
+        backref="post",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     collections = db.relationship(
-        "CollectionPost", backref="post", lazy=True, cascade="all, delete-orphan"
+        "CollectionPost",
+        backref="post",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     comments = db.relationship(
-        "Comment", backref="post", lazy=True, cascade="all, delete-orphan"
+        "Comment",
+        backref="post",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
     likes = db.relationship(
-        "Like", backref="post", lazy=True, cascade="all, delete-orphan"
+        "Like",
+        backref="post",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    archive = db.relationship(
+        "PostArchive",
+        backref="post",
+        lazy=True,
+        uselist=False,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    archived_comments = db.relationship(
+        "ArchivedComment",
+        backref="post",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
+    )
+    archived_likes = db.relationship(
+        "ArchivedLike",
+        backref="post",
+        lazy=True,
+        cascade="all, delete-orphan",
+        passive_deletes=True,
     )
 
 
@@ -113,7 +168,9 @@ class CategoryEnum(enum.Enum):
 
 @dataclass
 class PostCategory(db.Model):  # Many to Many relationship between posts and categories
-    post_id = db.Column(db.Integer, db.ForeignKey("post.post_id"), primary_key=True)
+    post_id = db.Column(
+        db.Integer, db.ForeignKey("post.post_id", ondelete="CASCADE"), primary_key=True
+    )
     category = db.Column(Enum(CategoryEnum), primary_key=True)
 
 
@@ -128,7 +185,7 @@ class Collection(db.Model):
     description = db.Column(db.Text)
     is_public = db.Column(db.Boolean, default=True)
     created_at = db.Column(
-        db.DateTime(timezone=True), default=datetime.now(timezone.utc)
+        db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
 
     posts = db.relationship(
@@ -150,28 +207,50 @@ class Collection(db.Model):
 class CollectionPost(
     db.Model
 ):  # Many to Many relationship between posts and collections
-    post_id = db.Column(db.Integer, db.ForeignKey("post.post_id"), primary_key=True)
+    post_id = db.Column(
+        db.Integer, db.ForeignKey("post.post_id", ondelete="CASCADE"), primary_key=True
+    )
     collection_id = db.Column(
         db.Integer, db.ForeignKey("collection.collection_id"), primary_key=True
     )
+    added_at = db.Column(
+        db.DateTime(timezone=True),
+        nullable=False,
+        default=lambda: datetime.now(timezone.utc),
+        server_default=db.func.now(),
+    )
+
+    # The primary key starts with post_id, this one serves per-collection
+    # counts and the posts of a collection in saved order
+    __table_args__ = (
+        db.Index(
+            "ix_collection_post_collection_id_added_at", "collection_id", "added_at"
+        ),
+    )
 
 
 @dataclass
 class Comment(db.Model):  # Cannot have nested comments
     comment_id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), nullable=False)
-    post_id = db.Column(db.Integer, db.ForeignKey("post.post_id"), nullable=False)
+    post_id = db.Column(
+        db.Integer, db.ForeignKey("post.post_id", ondelete="CASCADE"), nullable=False
+    )
     content = db.Column(db.Text, nullable=False)
     commented_at = db.Column(
-        db.DateTime(timezone=True), default=datetime.now(timezone.utc)
+        db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
 
 
 @dataclass
 class Like(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), primary_key=True)
-    post_id = db.Column(db.Integer, db.ForeignKey("post.post_id"), primary_key=True)
-    liked_at = db.Column(db.DateTime(timezone=True), default=datetime.now(timezone.utc))
+    post_id = db.Column(
+        db.Integer, db.ForeignKey("post.post_id", ondelete="CASCADE"), primary_key=True
+    )
+    liked_at = db.Column(
+        db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
 
 
 @dataclass
@@ -182,11 +261,98 @@ class Follow(db.Model):
     follower_id = db.Column(
         db.Integer, db.ForeignKey("user.user_id"), primary_key=True
     )  # User following
-    followed_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    followed_at = db.Column(
+        db.DateTime, nullable=False, default=lambda: datetime.now(timezone.utc)
+    )  # Required by migration 0010, the follow pages' cursors need it
+
+    # Newest-first pages of a user's followers and followings. Added to
+    # existing databases by migration 0008, change them with a new revision
+    __table_args__ = (
+        db.Index("ix_follow_user_id_followed_at", "user_id", "followed_at"),
+        db.Index("ix_follow_follower_id_followed_at", "follower_id", "followed_at"),
+    )
+
+
+# Denormalized follow counts, kept in step with Follow by stats.py. A separate
+# table so that follows never lock (or rewrite) the user row.
+@dataclass
+class UserStats(db.Model):
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), primary_key=True)
+    followers_count = db.Column(db.Integer, nullable=False, default=0)
+    following_count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# Archive tables. Likes and comments of posts older than 24h are moved here by
+# the archival worker (see archive.py) so the hot tables only hold about a day
+# of interactions. Archived rows are only changed by their authors.
+@dataclass
+class PostArchive(db.Model):  # One row per post whose interactions were archived
+    post_id = db.Column(
+        db.Integer, db.ForeignKey("post.post_id", ondelete="CASCADE"), primary_key=True
+    )
+    likes_count = db.Column(db.Integer, nullable=False, default=0)
+    comments_count = db.Column(db.Integer, nullable=False, default=0)
+    archived_at = db.Column(
+        db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+
+@dataclass
+class ArchivedLike(db.Model):
+    # post_id first: archived likes are only ever read per post
+    post_id = db.Column(
+        db.Integer, db.ForeignKey("post.post_id", ondelete="CASCADE"), primary_key=True
+    )
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), primary_key=True)
+    liked_at = db.Column(db.DateTime(timezone=True))
+
+
+@dataclass
+class ArchivedComment(db.Model):
+    comment_id = db.Column(db.Integer, primary_key=True)  # Kept from Comment
+    user_id = db.Column(db.Integer, db.ForeignKey("user.user_id"), nullable=False)
+    post_id = db.Column(
+        db.Integer,
+        db.ForeignKey("post.post_id", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    content = db.Column(db.Text, nullable=False)
+    commented_at = db.Column(db.DateTime(timezone=True))
+
+
+# One row per account deletion request. The account is disabled as soon as the
+# row exists, its data is then removed in batches by deletion.py. No foreign
+# key: the row outlives the user to report the outcome.
+@dataclass
+class AccountDeletion(db.Model):
+    job_id = db.Column(db.String(36), primary_key=True)
+    user_id = db.Column(db.Integer, nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default="pending")
+    step = db.Column(db.String(50))  # Table being emptied
+    deleted_rows = db.Column(db.Integer, nullable=False, default=0)
+    requested_at = db.Column(
+        db.DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+    finished_at = db.Column(db.DateTime(timezone=True))
+    error = db.Column(db.Text)
+    # Set by the runner with every batch, a job whose runner died goes stale
+    heartbeat_at = db.Column(db.DateTime(timezone=True))
+
+    # One unfinished job per user, a repeated request gets the existing one
+    __table_args__ = (
+        db.Index(
+            "ix_account_deletion_user_id_unfinished",
+            "user_id",
+            unique=True,
+            postgresql_where=db.text("status IN ('pending', 'running', 'failed')"),
+            sqlite_where=db.text("status IN ('pending', 'running', 'failed')"),
+        ),
+    )
 
 
 @dataclass
 class RevokedToken(db.Model):  # For JWT token revocation
     id = db.Column(db.Integer, primary_key=True, autoincrement=True)
     jti = db.Column(db.String(120), index=True)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, default=lambda: datetime.now(timezone.utc))
@@ -1,9 +1,30 @@
-from flask import request
+import time
+from flask import current_app, request
 from flask_restx import Namespace, Resource
+from .cache import get_cache
+from .config import Config
+from .metrics import OG_FETCH_LATENCY
 from .utils import parse_opengraph_tags, create_success_response, create_error_response
 
 api = Namespace("opengraph", description="OpenGraph related operations")
 
+# Pages rarely change their OpenGraph tags, and the same link is often
+# previewed by many users at once
+OG_TTL = 600
+
+
+def fetch_opengraph_tags(url):
+    start = time.perf_counter()
+    try:
+        og_data = parse_opengraph_tags(
+            url, timeout=current_app.config["OG_FETCH_TIMEOUT"]
+        )
+    except Exception:
+        OG_FETCH_LATENCY.labels("error").observe(time.perf_counter() - start)
+        raise
+    OG_FETCH_LATENCY.labels("success").observe(time.perf_counter() - start)
+    return og_data
+
 
 # Scrape the URL's opengraph tags
 @api.route("/")
@@ -17,7 +38,10 @@ class OpenGraph(Resource):
             return create_error_response("No URL provided", status_code=400)
 
         try:
-            og_data = parse_opengraph_tags(url)
+            # Concurrent requests for the same link share one fetch
+            og_data = get_cache().get_or_set(
+                f"og:{url}", lambda: fetch_opengraph_tags(url), OG_TTL
+            )
 
             if og_data:
                 return create_success_response(
@@ -31,3 +55,7 @@ class OpenGraph(Resource):
             return create_error_response(
                 "Could not parse OpenGraph link", status_code=403
             )
+
+
+def init_app(app):
+    app.config.setdefault("OG_FETCH_TIMEOUT", Config.OG_FETCH_TIMEOUT)
@@ -0,0 +1,251 @@
+import re
+import click
+from datetime import datetime, time, timedelta, timezone
+from flask.cli import AppGroup
+from sqlalchemy import column, delete, select, table, text
+from . import db
+
+# Daily range partitions of the post table on posted_at. Postgres only: the
+# models are unchanged, so SQLite (local development) keeps a plain table.
+#
+#   post_history    MINVALUE .. the first daily partition, rows from before the conversion
+#   post_pYYYYMMDD  one per UTC day
+#   post_default    safety net for rows outside every range (e.g. clock skew)
+#
+# Feed and GetUserPosts filter posted_at >= now - 24h, so they only scan the
+# last two daily partitions.
+
+PARTITION_NAME = re.compile(r"^post_p(\d{8})$")
+
+partitions_cli = AppGroup("partitions", help="Manage the partitioned post table.")
+
+
+def _require_postgres():
+    if db.engine.dialect.name != "postgresql":
+        raise click.ClickException("Post partitioning is only supported on Postgres")
+
+
+def _day_start(day):
+    return datetime.combine(day, time.min, tzinfo=timezone.utc)
+
+
+def is_partitioned():
+    return (
+        db.session.execute(
+            text("SELECT relkind FROM pg_class WHERE oid = to_regclass('post')")
+        ).scalar()
+        == "p"
+    )
+
+
+def daily_partitions():
+    """Return {day: table name} for the attached daily partitions."""
+    names = db.session.execute(
+        text(
+            "SELECT child.relname FROM pg_inherits "
+            "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+            "WHERE pg_inherits.inhparent = 'post'::regclass"
+        )
+    ).scalars()
+
+    partitions = {}
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime.strptime(match.group(1), "%Y%m%d").date()] = name
+    return partitions
+
+
+def create_daily_partition(day):
+    name = f"post_p{day:%Y%m%d}"
+    db.session.execute(
+        text(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF post "
+            f"FOR VALUES FROM ('{_day_start(day).isoformat()}') "
+            f"TO ('{_day_start(day + timedelta(days=1)).isoformat()}')"
+        )
+    )
+    return name
+
+
+def _install_delete_cascade(children):
+    """
+    Foreign keys can't reference post_id alone once the primary key includes
+    posted_at, so deletes are cascaded to the referencing tables by a trigger.
+    """
+    statements = "\n".join(
+        f"DELETE FROM {table} WHERE {column} = OLD.post_id;"
+        for table, column in children
+    )
+    db.session.execute(
+        text(
+            "CREATE OR REPLACE FUNCTION post_delete_cascade() RETURNS trigger AS $$\n"
+            f"BEGIN\n{statements}\nRETURN OLD;\nEND;\n$$ LANGUAGE plpgsql"
+        )
+    )
+    db.session.execute(
+        text(
+            "CREATE TRIGGER post_delete_cascade BEFORE DELETE ON post "
+            "FOR EACH ROW EXECUTE FUNCTION post_delete_cascade()"
+        )
+    )
+
+
+def convert_post_table(days_ahead=7):
+    """
+    Rebuild post as a table partitioned by day on posted_at, keeping its rows,
+    ids and sequence. Runs in one transaction under an exclusive lock.
+    """
+    db.session.execute(text("LOCK TABLE post IN ACCESS EXCLUSIVE MODE"))
+
+    # Foreign keys from other tables to post can't be kept (see above)
+    foreign_keys = db.session.execute(
+        text(
+            "SELECT quote_ident(con.conname), con.conrelid::regclass::text, "
+            "quote_ident(att.attname) "
+            "FROM pg_constraint con "
+            "JOIN pg_attribute att "
+            "ON att.attrelid = con.conrelid AND att.attnum = con.conkey[1] "
+            "WHERE con.contype = 'f' AND con.confrelid = 'post'::regclass"
+        )
+    ).all()
+    for name, table, _ in foreign_keys:
+        db.session.execute(text(f"ALTER TABLE {table} DROP CONSTRAINT {name}"))
+
+    sequence = db.session.execute(
+        text("SELECT pg_get_serial_sequence('post', 'post_id')")
+    ).scalar()
+
+    db.session.execute(text("ALTER TABLE post RENAME TO post_unpartitioned"))
+    # Detach the sequence so it survives dropping the old table
+    db.session.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY NONE"))
+    db.session.execute(
+        text(
+            "CREATE TABLE post (LIKE post_unpartitioned INCLUDING DEFAULTS) "
+            "PARTITION BY RANGE (posted_at)"
+        )
+    )
+    db.session.execute(text("ALTER TABLE post ADD PRIMARY KEY (post_id, posted_at)"))
+    db.session.execute(
+        text('ALTER TABLE post ADD FOREIGN KEY (user_id) REFERENCES "user" (user_id)')
+    )
+    db.session.execute(
+        text(
+            "ALTER TABLE post ADD FOREIGN KEY (article_id) "
+            "REFERENCES article (article_id)"
+        )
+    )
+    db.session.execute(
+        text("CREATE INDEX ix_post_user_id_posted_at ON post (user_id, posted_at)")
+    )
+
+    # Existing rows go to one history partition, new ones to daily partitions
+    today = datetime.now(timezone.utc).date()
+    first_day = today - timedelta(days=1)
+    db.session.execute(
+        text(
+            "CREATE TABLE post_history PARTITION OF post "
+            f"FOR VALUES FROM (MINVALUE) TO ('{_day_start(first_day).isoformat()}')"
+        )
+    )
+    for offset in range(days_ahead + 2):
+        create_daily_partition(first_day + timedelta(days=offset))
+    db.session.execute(text("CREATE TABLE post_default PARTITION OF post DEFAULT"))
+
+    db.session.execute(text("INSERT INTO post SELECT * FROM post_unpartitioned"))
+    db.session.execute(text("DROP TABLE post_unpartitioned"))
+    db.session.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY post.post_id"))
+
+    _install_delete_cascade([(table, column) for _, table, column in foreign_keys])
+    db.session.commit()
+
+
+def _delete_references(partition):
+    """
+    Delete the rows that reference the posts of partition, as the delete
+    trigger would. Dropping a partition deletes its posts without firing it.
+    """
+    posts = select(table(partition, column("post_id")).c.post_id)
+    for referencing in db.metadata.sorted_tables:
+        for foreign_key in referencing.foreign_keys:
+            if foreign_key.column.table.name == "post":
+                db.session.execute(
+                    delete(referencing).where(foreign_key.parent.in_(posts))
+                )
+
+
+def maintain_partitions(days_ahead=7, detach_older_than=None, drop=False):
+    """
+    Create the daily partitions for the next days_ahead days and optionally
+    detach (and drop) the ones older than detach_older_than days. Dropping
+    also deletes the likes, comments, categories, collection entries and
+    archive rows of the dropped posts. Detached partitions keep theirs, so
+    that they can be attached again.
+
+    Returns the names of the created, detached and dropped partitions.
+    """
+    today = datetime.now(timezone.utc).date()
+    existing = daily_partitions()
+    result = {"created": [], "detached": [], "dropped": []}
+
+    for offset in range(days_ahead + 1):
+        day = today + timedelta(days=offset)
+        if day not in existing:
+            result["created"].append(create_daily_partition(day))
+
+    if detach_older_than is not None:
+        cutoff = today - timedelta(days=detach_older_than)
+        for day, name in sorted(existing.items()):
+            if day >= cutoff:
+                continue
+            if drop:
+                _delete_references(name)
+            db.session.execute(text(f"ALTER TABLE post DETACH PARTITION {name}"))
+            result["detached"].append(name)
+            if drop:
+                db.session.execute(text(f"DROP TABLE {name}"))
+                result["dropped"].append(name)
+
+    db.session.commit()
+    return result
+
+
+@partitions_cli.command("setup")
+@click.option("--days-ahead", default=7, show_default=True)
+def setup_command(days_ahead):
+    """Convert the post table to daily range partitions (one-off)."""
+    _require_postgres()
+    if is_partitioned():
+        click.echo("post is already partitioned")
+        return
+    convert_post_table(days_ahead=days_ahead)
+    click.echo("post is now partitioned by day on posted_at")
+
+
+@partitions_cli.command("maintain")
+@click.option("--days-ahead", default=7, show_default=True)
+@click.option(
+    "--detach-older-than",
+    type=int,
+    default=None,
+    help="Detach daily partitions older than this many days. Owners lose "
+    "access to the posts in them, so leave unset to keep all history.",
+)
+@click.option(
+    "--drop",
+    is_flag=True,
+    help="Drop the partitions after detaching, with the rows referencing their posts",
+)
+def maintain_command(days_ahead, detach_older_than, drop):
+    """Create upcoming daily partitions and retire old ones."""
+    _require_postgres()
+    if not is_partitioned():
+        raise click.ClickException("Run 'flask partitions setup' first")
+    result = maintain_partitions(days_ahead, detach_older_than, drop)
+    for action, names in result.items():
+        if names:
+            click.echo(f"{action.capitalize()}: {', '.join(names)}")
+
+
+def init_app(app):
+    app.cli.add_command(partitions_cli)
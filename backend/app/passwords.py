@@ -0,0 +1,109 @@
+"""
+Password hashing off the request threads. Hashes are computed by a small
+pool of processes running at a lower CPU priority, so that a burst of
+logins can't take the CPU from the other endpoints. When the pool and its
+queue are full, logins are turned away at once instead of piling up.
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+from .config import Config
+from .metrics import PASSWORD_HASH_LATENCY, PASSWORD_HASHES_REJECTED
+
+_executor = None
+_slots = None  # Hashes running or queued
+_executor_lock = threading.Lock()
+
+
+class HashingBusy(Exception):
+    """Every hashing process is busy and the queue is full."""
+
+
+def _lower_priority(niceness):
+    os.nice(niceness)
+
+
+def _get_executor(config):
+    # Created on first use so that forked workers don't share the processes
+    global _executor, _slots
+    with _executor_lock:
+        if _executor is None:
+            workers = config["PASSWORD_HASH_WORKERS"]
+            # Forking a threaded worker would copy locks other threads hold
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context(
+                "forkserver" if "forkserver" in methods else "spawn"
+            )
+            _executor = ProcessPoolExecutor(
+                workers,
+                mp_context=context,
+                initializer=_lower_priority,
+                initargs=(config["PASSWORD_HASH_NICE"],),
+            )
+            _slots = threading.BoundedSemaphore(
+                workers + config["PASSWORD_HASH_QUEUE_SIZE"]
+            )
+        return _executor, _slots
+
+
+def _discard_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False)
+
+
+def _run(operation, fn, *args):
+    config = current_app.config
+    start = time.perf_counter()
+    if not config["PASSWORD_HASH_WORKERS"]:
+        result = fn(*args)
+    else:
+        executor, slots = _get_executor(config)
+        if not slots.acquire(blocking=False):
+            PASSWORD_HASHES_REJECTED.labels(operation).inc()
+            raise HashingBusy()
+        try:
+            result = executor.submit(fn, *args).result()
+        except BrokenProcessPool:
+            # A hashing process died (e.g. killed for memory), start over
+            _discard_executor(executor)
+            raise HashingBusy()
+        finally:
+            slots.release()
+    PASSWORD_HASH_LATENCY.labels(operation).observe(time.perf_counter() - start)
+    return result
+
+
+def hash_password(password):
+    """Hash password with the configured method. Raises HashingBusy."""
+    method = current_app.config["PASSWORD_HASH_METHOD"]
+    return _run("hash", generate_password_hash, password, method)
+
+
+def check_password(password_hash, password):
+    """Check password against a stored hash. Raises HashingBusy."""
+    return _run("check", check_password_hash, password_hash, password)
+
+
+def needs_rehash(password_hash):
+    """Whether the hash was made with other parameters than the configured ones."""
+    method = password_hash.split("$", 1)[0]
+    return method != current_app.config["PASSWORD_HASH_METHOD"]
+
+
+def init_app(app):
+    for name in (
+        "PASSWORD_HASH_METHOD",
+        "PASSWORD_HASH_WORKERS",
+        "PASSWORD_HASH_QUEUE_SIZE",
+        "PASSWORD_HASH_NICE",
+    ):
+        app.config.setdefault(name, getattr(Config, name))
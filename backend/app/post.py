@@ -1,13 +1,36 @@
+import logging
 from flask import request
 from datetime import datetime, timedelta, timezone
 from flask_restx import Namespace, Resource, fields
+from sqlalchemy import exists, func, or_, select
+from sqlalchemy.orm import joinedload, selectinload
 from . import db
-from .models import Post, Article, PostCategory, CategoryEnum, User
-from .utils import check_post_24h, create_success_response, create_error_response
+from .cache import get_cache
+from .models import (
+    Post,
+    Article,
+    PostCategory,
+    CategoryEnum,
+    Follow,
+    Like,
+    Comment,
+    ArchivedLike,
+    CollectionPost,
+    PostArchive,
+)
+from .utils import (
+    PrecomputedResponse,
+    post_is_visible,
+    create_success_response,
+    create_error_response,
+)
+from .uploads import profile_picture_url
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
 api = Namespace("posts", description="Posts related operations")
 
+logger = logging.getLogger(__name__)
+
 MAX_CATEGORIES = 5  # Maximum number of categories a post can have
 
 post_model = api.model(
@@ -53,6 +76,116 @@ post_update_model = api.model(
 )
 
 
+def liked_by(viewer_id):
+    """SQL predicate true when viewer_id liked the post, archived likes included."""
+    return or_(
+        exists().where(Like.post_id == Post.post_id, Like.user_id == viewer_id),
+        exists().where(
+            ArchivedLike.post_id == Post.post_id, ArchivedLike.user_id == viewer_id
+        ),
+    )
+
+
+def post_details_query(viewer_id):
+    """
+    Query posts together with everything serialize_post needs.
+
+    The author and article are joined and the counts are correlated subqueries,
+    so a page of posts costs one SELECT plus one SELECT ... IN for categories,
+    whatever the page size.
+    """
+    likes_count = (
+        select(func.count())
+        .where(Like.post_id == Post.post_id)
+        .correlate(Post)
+        .scalar_subquery()
+    )
+    comments_count = (
+        select(func.count())
+        .where(Comment.post_id == Post.post_id)
+        .correlate(Post)
+        .scalar_subquery()
+    )
+    # Interactions of expired posts live in the archive tables
+    return (
+        db.session.query(
+            Post,
+            (likes_count + func.coalesce(PostArchive.likes_count, 0)).label(
+                "likes_count"
+            ),
+            (comments_count + func.coalesce(PostArchive.comments_count, 0)).label(
+                "comments_count"
+            ),
+            liked_by(viewer_id).label("is_liked"),
+        )
+        .outerjoin(PostArchive, PostArchive.post_id == Post.post_id)
+        .options(
+            joinedload(Post.user),
+            joinedload(Post.article),
+            selectinload(Post.categories),
+        )
+    )
+
+
+def serialize_post(row):
+    """Build the post payload from a post_details_query row."""
+    post = row.Post
+    return {
+        "post_id": post.post_id,
+        "user": {
+            "user_id": post.user.user_id,
+            "username": post.user.username,
+            "bio_description": post.user.bio_description,
+            "profile_picture": profile_picture_url(post.user.profile_picture, "small"),
+        },
+        "user_id": post.user_id,
+        "description": post.description,
+        "posted_at": post.posted_at,
+        "article": {
+            "article_id": post.article.article_id,
+            "link": post.article.link,
+            "source": post.article.source,
+            "title": post.article.title,
+            "caption": post.article.caption,
+            "preview": post.article.preview,
+        },
+        "categories": [category.category.value for category in post.categories],
+        "comments_count": row.comments_count,
+        "likes_count": row.likes_count,
+        "is_liked": bool(row.is_liked),
+    }
+
+
+def paginate_posts(viewer_id, filters, page, per_page):
+    """
+    Return (total, page, per_page, rows) for the posts matching filters, newest
+    first. Mirrors Flask-SQLAlchemy's paginate(error_out=False), but the total
+    comes from a COUNT(*) OVER () column of the page query itself.
+    """
+    page = page if page and page > 0 else 1
+    per_page = per_page if per_page and per_page > 0 else 20
+
+    rows = (
+        post_details_query(viewer_id)
+        .add_columns(func.count().over().label("total"))
+        .filter(*filters)
+        .order_by(Post.posted_at.desc())
+        .limit(per_page)
+        .offset((page - 1) * per_page)
+        .all()
+    )
+
+    if rows:
+        total = rows[0].total
+    elif page == 1:
+        total = 0
+    else:
+        # Past the last page there is no row to read the total from
+        total = db.session.query(func.count(Post.post_id)).filter(*filters).scalar()
+
+    return total, page, per_page, rows
+
+
 # Create a post
 @api.route("/")
 class Posts(Resource):
@@ -112,51 +245,64 @@ class Posts(Resource):
         )
 
 
+# Posts are cached without the viewer's like, and invalidated by edits, likes
+# and comments. The TTL bounds how stale counts changed elsewhere can be.
+HOT_POST_TTL = 30
+
+
 @api.route("/<int:post_id>")
 class SinglePostOperations(Resource):
     # Get a single post
     @api.doc(security="Bearer Auth")
     @jwt_required()
-    def get(self, post_id, check_24h=True):
-        post = Post.query.get(post_id)
-        if not post:
-            return create_error_response("Post not found", status_code=404)
+    def get(self, post_id):
+        current_user_id = int(get_jwt_identity())
+        loaded = {}
+
+        def load():
+            # The 24h rule is a column of the same query, to tell 403 from 404
+            row = (
+                post_details_query(current_user_id)
+                .add_columns(post_is_visible(current_user_id).label("is_visible"))
+                .filter(Post.post_id == post_id)
+                .first()
+            )
+            loaded["row"] = row
+            if row is None:
+                return None
+            return {k: v for k, v in serialize_post(row).items() if k != "is_liked"}
+
+        post = get_cache().get_or_set(
+            f"post-details:{post_id}",
+            load,
+            HOT_POST_TTL,
+            tags=lambda post: [f"post:{post_id}", f"user:{post['user_id']}"],
+        )
 
-        if check_24h:
-            if check_post_24h(post=post):
-                return create_error_response(
-                    "You are not allowed to view this post", status_code=403
+        # The viewer's side comes with the post when this request loaded it,
+        # else from the primary keys of the post and the viewer's likes
+        row = loaded.get("row")
+        if row is None and post is not None:
+            row = (
+                db.session.query(
+                    post_is_visible(current_user_id).label("is_visible"),
+                    liked_by(current_user_id).label("is_liked"),
                 )
+                .filter(Post.post_id == post_id)
+                .first()
+            )
+        if post is None or row is None:
+            return create_error_response("Post not found", status_code=404)
 
-        current_user_id = get_jwt_identity()
-        is_liked = any(like.user_id == current_user_id for like in post.likes)
-
-        post_data = {
-            "post_id": post.post_id,
-            "user": {
-                "user_id": post.user.user_id,
-                "username": post.user.username,
-                "bio_description": post.user.bio_description,
-                "profile_picture": f"/user/uploads/{post.user.profile_picture}",
-            },
-            "description": post.description,
-            "posted_at": post.posted_at,
-            "article": {
-                "article_id": post.article.article_id,
-                "link": post.article.link,
-                "source": post.article.source,
-                "title": post.article.title,
-                "caption": post.article.caption,
-                "preview": post.article.preview,
-            },
-            "categories": [category.category.value for category in post.categories],
-            "comments_count": len(post.comments),
-            "likes_count": len(post.likes),
-            "is_liked": is_liked,
-        }
+        if not row.is_visible:
+            return create_error_response(
+                "You are not allowed to view this post", status_code=403
+            )
 
         return create_success_response(
-            "Post retrieved successfully", status_code=200, data=post_data
+            "Post retrieved successfully",
+            status_code=200,
+            data=dict(post, is_liked=bool(row.is_liked)),
         )
 
     # Delete a post
@@ -172,8 +318,21 @@ class SinglePostOperations(Resource):
                 "You are not allowed to delete this post", status_code=403
             )
 
+        # Collections listing the post show its count and maybe its preview
+        collection_ids = (
+            db.session.execute(
+                select(CollectionPost.collection_id).where(
+                    CollectionPost.post_id == post_id
+                )
+            )
+            .scalars()
+            .all()
+        )
         db.session.delete(post)
         db.session.commit()
+        get_cache().invalidate_tags(
+            f"post:{post_id}", *[f"collection:{c}" for c in collection_ids]
+        )
 
         return create_success_response("Post deleted successfully", status_code=200)
 
@@ -221,13 +380,11 @@ class SinglePostOperations(Resource):
                         category=CategoryEnum[category_key],
                     )
                     db.session.add(post_category)
-                    print(f"post_category being added: {post_category.category.name}")
                 else:
-                    print(
-                        f"Category not added because it's not in enum: {category_name}"
-                    )
+                    logger.debug("Ignoring unknown category %r", category_name)
 
         db.session.commit()
+        get_cache().invalidate_tags(f"post:{post_id}")
 
         return create_success_response("Post updated successfully", status_code=200)
 
@@ -243,65 +400,35 @@ class Feed(Resource):
         per_page = request.args.get("per_page", 10, type=int)
 
         time_threshold = datetime.now(timezone.utc) - timedelta(hours=24)
-        current_user = User.query.get(get_jwt_identity())
+        current_user_id = int(get_jwt_identity())
 
-        followed_users = [
-            current_user.user_id,
-            *[follow.user_id for follow in current_user.followings],
-        ]
+        # Followed users are resolved in the same statement as the posts
+        followed_users = select(Follow.user_id).where(
+            Follow.follower_id == current_user_id
+        )
 
         # Query posts by followed users from the last 24 hours
-        posts_query = Post.query.filter(
-            Post.user_id.in_(followed_users), Post.posted_at >= time_threshold
-        ).order_by(Post.posted_at.desc())
-
-        # Apply pagination
-        paginated_posts = posts_query.paginate(
-            page=page, per_page=per_page, error_out=False
+        total, page, per_page, rows = paginate_posts(
+            current_user_id,
+            [
+                or_(
+                    Post.user_id == current_user_id,
+                    Post.user_id.in_(followed_users),
+                ),
+                Post.posted_at >= time_threshold,
+            ],
+            page,
+            per_page,
         )
 
-        posts_data = []
-        for post in paginated_posts.items:
-            is_liked = any(
-                like.user_id == int(get_jwt_identity()) for like in post.likes
-            )
-            posts_data.append(
-                {
-                    "post_id": post.post_id,
-                    "user": {
-                        "user_id": post.user.user_id,
-                        "username": post.user.username,
-                        "bio_description": post.user.bio_description,
-                        "profile_picture": f"/user/uploads/{post.user.profile_picture}",
-                    },
-                    "user_id": post.user_id,
-                    "description": post.description,
-                    "posted_at": post.posted_at,
-                    "article": {
-                        "article_id": post.article.article_id,
-                        "link": post.article.link,
-                        "source": post.article.source,
-                        "title": post.article.title,
-                        "caption": post.article.caption,
-                        "preview": post.article.preview,
-                    },
-                    "categories": [
-                        category.category.value for category in post.categories
-                    ],
-                    "comments_count": len(post.comments),
-                    "likes_count": len(post.likes),
-                    "is_liked": is_liked,
-                }
-            )
-
         return create_success_response(
             "Posts fetched successfully",
             status_code=200,
             data={
-                "total_posts": paginated_posts.total,
-                "page": paginated_posts.page,
-                "per_page": paginated_posts.per_page,
-                "posts": posts_data,
+                "total_posts": total,
+                "page": page,
+                "per_page": per_page,
+                "posts": [serialize_post(row) for row in rows],
             },
         )
 
@@ -315,79 +442,38 @@ class GetUserPosts(Resource):
         page = request.args.get("page", 1, type=int)
         per_page = request.args.get("per_page", 10, type=int)
 
-        # Check if the requested user_id is the current user's
-        if user_id == int(get_jwt_identity()):
-            # Fetch all posts by the user
-            posts_query = Post.query.filter_by(user_id=user_id)
-        else:
-            # Fetch only posts within the last 24 hours if not the current user's posts
-            time_threshold = datetime.now(timezone.utc) - timedelta(hours=24)
-            posts_query = Post.query.filter_by(user_id=user_id).filter(
-                Post.posted_at >= time_threshold
-            )
+        current_user_id = int(get_jwt_identity())
 
-        # Apply pagination
-        paginated_posts = posts_query.paginate(
-            page=page, per_page=per_page, error_out=False
+        # Only the user's own posts are listed past 24 hours
+        total, page, per_page, rows = paginate_posts(
+            current_user_id,
+            [Post.user_id == user_id, post_is_visible(current_user_id)],
+            page,
+            per_page,
         )
 
-        posts_data = []
-        for post in paginated_posts.items:
-            is_liked = any(
-                like.user_id == int(get_jwt_identity()) for like in post.likes
-            )
-            posts_data.append(
-                {
-                    "post_id": post.post_id,
-                    "description": post.description,
-                    "posted_at": post.posted_at,
-                    "user": {
-                        "user_id": post.user.user_id,
-                        "username": post.user.username,
-                        "bio_description": post.user.bio_description,
-                        "profile_picture": f"/user/uploads/{post.user.profile_picture}",
-                    },
-                    "article": {
-                        "article_id": post.article.article_id,
-                        "link": post.article.link,
-                        "source": post.article.source,
-                        "title": post.article.title,
-                        "caption": post.article.caption,
-                        "preview": post.article.preview,
-                    },
-                    "categories": [
-                        category.category.value for category in post.categories
-                    ],
-                    "comments_count": len(post.comments),
-                    "likes_count": len(post.likes),
-                    "is_liked": is_liked,
-                }
-            )
-
         return create_success_response(
             "Posts fetched successfully",
             200,
             data={
-                "total_posts": paginated_posts.total,
-                "page": paginated_posts.page,
-                "per_page": paginated_posts.per_page,
-                "posts": posts_data,
+                "total_posts": total,
+                "page": page,
+                "per_page": per_page,
+                "posts": [serialize_post(row) for row in rows],
             },
         )
 
 
+# Available categories, built once at startup as they only change with the code
+CATEGORIES_RESPONSE = PrecomputedResponse(
+    "Categories fetched successfully",
+    {"categories": [{"category_id": category.value} for category in CategoryEnum]},
+)
+
+
 # Get available categories
 @api.route("/categories")
 class GetCategories(Resource):
-    @api.doc(security="Bearer Auth")
-    @jwt_required()
+    # Public reference data, so no JWT check and its blocklist query
     def get(self):
-        categories_data = [{"category_id": category.value} for category in CategoryEnum]
-
-        return create_success_response(
-            "Categories fetched successfully",
-            200,
-            data={
-                "categories": categories_data,
-            },
-        )
+        return CATEGORIES_RESPONSE.response()
@@ -0,0 +1,55 @@
+"""
+Request coalescing. Concurrent calls for the same key share one run of the
+work instead of each of them querying the database or fetching the network.
+"""
+
+import threading
+from .metrics import COALESCED_CALLS
+
+
+class _Call:
+    """A call in flight, that the calls for the same key wait for."""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+    def wait(self):
+        self.done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.value
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time within the process. The calls
+    made while it runs wait for it, and get its result or its exception.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._calls = {}  # key -> _Call in flight
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            COALESCED_CALLS.labels(self.name).inc()
+            return call.wait()
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value
@@ -0,0 +1,117 @@
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import func, or_, select, update
+from . import db
+from .models import Follow, User, UserStats
+from .utils import dialect_insert
+
+# Column of UserStats counting the rows of Follow where the column matches
+COUNTED_BY = {
+    "followers_count": Follow.user_id,
+    "following_count": Follow.follower_id,
+}
+
+
+def _count_follows(user_id, counter):
+    return (
+        select(func.count())
+        .select_from(Follow)
+        .where(COUNTED_BY[counter] == user_id)
+        .scalar_subquery()
+    )
+
+
+def adjust_follow_counts(follower_id, user_id, delta):
+    """
+    Add delta to the follow counts of both users, in the caller's transaction
+    and after the Follow row was flushed. The increment is a single atomic
+    statement, concurrent follows can't lose updates. A missing row is
+    created from the Follow table instead.
+    """
+    for user, counter in (
+        (user_id, "followers_count"),
+        (follower_id, "following_count"),
+    ):
+        statement = dialect_insert(UserStats).values(
+            user_id=user,
+            followers_count=_count_follows(user, "followers_count"),
+            following_count=_count_follows(user, "following_count"),
+        )
+        db.session.execute(
+            statement.on_conflict_do_update(
+                index_elements=[UserStats.user_id],
+                set_={counter: getattr(UserStats, counter) + delta},
+            )
+        )
+
+
+def decrement_counts(user_ids, counter):
+    """Subtract one from counter for each of user_ids, set-based."""
+    db.session.execute(
+        update(UserStats)
+        .where(UserStats.user_id.in_(user_ids))
+        .values({counter: getattr(UserStats, counter) - 1})
+        .execution_options(synchronize_session=False)
+    )
+
+
+def repair_user_stats(batch_size=1000):
+    """
+    Recount the follow counts of every user from the Follow table, one
+    committed range of user ids at a time. Returns the number of rows fixed.
+    """
+    fixed = 0
+    last_id = 0
+    while True:
+        user_ids = (
+            db.session.execute(
+                select(User.user_id)
+                .where(User.user_id > last_id)
+                .order_by(User.user_id)
+                .limit(batch_size)
+            )
+            .scalars()
+            .all()
+        )
+        if not user_ids:
+            return fixed
+        last_id = user_ids[-1]
+
+        # Users that never had a follow have no row yet
+        db.session.execute(
+            dialect_insert(UserStats)
+            .from_select(
+                ["user_id"],
+                select(User.user_id).where(User.user_id.in_(user_ids)),
+            )
+            .on_conflict_do_nothing(index_elements=[UserStats.user_id])
+        )
+
+        followers = _count_follows(UserStats.user_id, "followers_count")
+        following = _count_follows(UserStats.user_id, "following_count")
+        fixed += db.session.execute(
+            update(UserStats)
+            .where(
+                UserStats.user_id.in_(user_ids),
+                or_(
+                    UserStats.followers_count != followers,
+                    UserStats.following_count != following,
+                ),
+            )
+            .values(followers_count=followers, following_count=following)
+            .execution_options(synchronize_session=False)
+        ).rowcount
+        db.session.commit()
+
+
+@click.command("repair-user-stats")
+@click.option("--batch-size", default=1000, show_default=True, help="Users per batch")
+@with_appcontext
+def repair_user_stats_command(batch_size):
+    """Recount follower and following counts from the follow table."""
+    fixed = repair_user_stats(batch_size=batch_size)
+    click.echo(f"Fixed the counts of {fixed} users")
+
+
+def init_app(app):
+    app.cli.add_command(repair_user_stats_command)
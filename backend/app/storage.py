@@ -0,0 +1,261 @@
+import io
+import mimetypes
+import os
+import shutil
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from flask import current_app, redirect, send_from_directory
+from werkzeug.exceptions import NotFound
+from werkzeug.security import safe_join
+
+try:
+    import boto3
+except ImportError:  # Only needed with UPLOAD_STORAGE=s3
+    boto3 = None
+
+# Uploaded files are named after their content, so a URL always returns the
+# same bytes and can be cached forever
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+class KnownKeys:
+    """
+    Bounded, thread-safe set of keys known to be stored. Files are never
+    changed or deleted once stored, so a key seen once stays valid.
+    """
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        with self._lock:
+            if key not in self._keys:
+                return False
+            self._keys.move_to_end(key)
+            return True
+
+    def add(self, key):
+        with self._lock:
+            self._keys[key] = None
+            self._keys.move_to_end(key)
+            if len(self._keys) > self.maxsize:
+                self._keys.popitem(last=False)
+
+
+class Storage:
+    """
+    Where uploaded files are kept, by key (file name). Remembers the keys it
+    has seen so that serving a picture doesn't stat the file (or HEAD the
+    object) on every request.
+    """
+
+    def __init__(self):
+        self.known_keys = KnownKeys()
+
+    def exists(self, key):
+        if key in self.known_keys:
+            return True
+        if self._exists(key):
+            self.known_keys.add(key)
+            return True
+        return False
+
+    def save_file(self, key, path):
+        """Move the file at path into the storage under key."""
+        self._save_file(key, path)
+        self.known_keys.add(key)
+
+    def save(self, key, fileobj):
+        self._save(key, fileobj)
+        self.known_keys.add(key)
+
+
+def set_cache_headers(response, max_age, immutable=False):
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable or None
+    return response
+
+
+class LocalStorage(Storage):
+    """
+    Uploads kept in a folder on the server. Served by the app, or by a front
+    proxy with X-Sendfile (Apache, lighttpd) or X-Accel-Redirect (nginx).
+    """
+
+    def __init__(self, folder, serve_mode="app", accel_prefix="/protected-uploads/"):
+        super().__init__()
+        self.folder = folder
+        self.serve_mode = serve_mode
+        self.accel_prefix = accel_prefix
+
+    @property
+    def staging_dir(self):
+        # Same filesystem as the uploads, moving a staged file is a rename.
+        # Hidden names are never served, partial files can't be read.
+        return os.path.join(self.folder, ".staging")
+
+    def path(self, key):
+        path = safe_join(self.folder, key)
+        if path is None:
+            raise NotFound()
+        return path
+
+    def _exists(self, key):
+        path = safe_join(self.folder, key)
+        return path is not None and os.path.isfile(path)
+
+    def open(self, key):
+        return open(self.path(key), "rb")
+
+    def _save_file(self, key, path):
+        os.replace(path, self.path(key))
+
+    def _save(self, key, fileobj):
+        os.makedirs(self.staging_dir, exist_ok=True)
+        # Write then rename, readers never see a partial file
+        with tempfile.NamedTemporaryFile(
+            dir=self.staging_dir, prefix=".upload-", delete=False
+        ) as temp:
+            shutil.copyfileobj(fileobj, temp)
+        os.replace(temp.name, self.path(key))
+
+    def send(self, key, max_age, immutable=False):
+        if self.serve_mode == "x-accel-redirect":
+            response = current_app.response_class(
+                mimetype=mimetypes.guess_type(key)[0] or "application/octet-stream"
+            )
+            response.headers["X-Accel-Redirect"] = f"{self.accel_prefix}{key}"
+        else:
+            # ETag, conditional and Range requests are handled by send_file,
+            # and X-Sendfile when USE_X_SENDFILE is set
+            response = send_from_directory(
+                self.folder, key, etag=os.path.splitext(key)[0], max_age=max_age
+            )
+        return set_cache_headers(response, max_age, immutable)
+
+
+class ObjectStorage(Storage, ABC):
+    """
+    Base for object stores with a public URL (bucket website, CDN). Files are
+    served by redirecting to that URL, the app never streams the bytes.
+    """
+
+    def __init__(self, public_url):
+        super().__init__()
+        self.public_url = public_url.rstrip("/")
+
+    @property
+    def staging_dir(self):
+        return tempfile.gettempdir()
+
+    def url(self, key):
+        return f"{self.public_url}/{key}"
+
+    def _save_file(self, key, path):
+        with open(path, "rb") as f:
+            self._save(key, f)
+        os.remove(path)
+
+    def send(self, key, max_age, immutable=False):
+        return set_cache_headers(redirect(self.url(key)), max_age, immutable)
+
+    @abstractmethod
+    def _exists(self, key):
+        pass
+
+    @abstractmethod
+    def open(self, key):
+        pass
+
+    @abstractmethod
+    def _save(self, key, fileobj):
+        pass
+
+
+class S3Storage(ObjectStorage):
+    """Uploads in an S3 (or S3-compatible) bucket."""
+
+    def __init__(self, bucket, public_url, endpoint_url=None, prefix=""):
+        if boto3 is None:
+            raise RuntimeError("UPLOAD_STORAGE=s3 requires boto3 to be installed")
+        super().__init__(public_url)
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def _exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+                return False
+            raise
+        return True
+
+    def open(self, key):
+        response = self.client.get_object(Bucket=self.bucket, Key=self.prefix + key)
+        # Pillow needs a seekable file
+        return io.BytesIO(response["Body"].read())
+
+    def _save(self, key, fileobj):
+        self.client.upload_fileobj(
+            fileobj,
+            self.bucket,
+            self.prefix + key,
+            ExtraArgs={
+                "ContentType": mimetypes.guess_type(key)[0]
+                or "application/octet-stream",
+                "CacheControl": f"public, max-age={IMMUTABLE_MAX_AGE}, immutable",
+            },
+        )
+
+
+class DirectoryObjectStorage(ObjectStorage):
+    """
+    Object store stand-in backed by a local folder, for tests and local
+    development of the object store path. public_url should serve the folder.
+    """
+
+    def __init__(self, folder, public_url):
+        super().__init__(public_url)
+        self.local = LocalStorage(folder)
+
+    def _exists(self, key):
+        return self.local.exists(key)
+
+    def open(self, key):
+        return self.local.open(key)
+
+    def _save(self, key, fileobj):
+        self.local.save(key, fileobj)
+
+
+def create_storage(config):
+    backend = config["UPLOAD_STORAGE"]
+    if backend == "local":
+        return LocalStorage(
+            config["UPLOAD_FOLDER"],
+            serve_mode=config["UPLOAD_SERVE_MODE"],
+            accel_prefix=config["UPLOAD_ACCEL_PREFIX"],
+        )
+    if backend == "s3":
+        return S3Storage(
+            config["UPLOAD_S3_BUCKET"],
+            config["UPLOAD_PUBLIC_URL"],
+            endpoint_url=config["UPLOAD_S3_ENDPOINT_URL"],
+            prefix=config["UPLOAD_S3_PREFIX"],
+        )
+    if backend == "directory":
+        return DirectoryObjectStorage(
+            config["UPLOAD_FOLDER"], config["UPLOAD_PUBLIC_URL"]
+        )
+    raise ValueError(f"Unknown UPLOAD_STORAGE {backend!r}")
+
+
+def get_storage():
+    return current_app.extensions["upload_storage"]
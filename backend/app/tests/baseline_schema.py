@@ -0,0 +1,133 @@
+"""
+The schema db.create_all() made before the migrations were added, written
+out so that tests can build the databases deployed at the time.
+"""
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Enum,
+    ForeignKey,
+    Index,
+    Integer,
+    MetaData,
+    String,
+    Table,
+    Text,
+    UniqueConstraint,
+)
+
+CATEGORIES = (
+    "POLITICS",
+    "TECHNOLOGY",
+    "HEALTH",
+    "SPORTS",
+    "ENTERTAINMENT",
+    "SCIENCE",
+    "BUSINESS",
+    "ENVIRONMENT",
+)
+
+metadata = MetaData()
+
+Table(
+    "user",
+    metadata,
+    Column("user_id", Integer, primary_key=True, autoincrement=True),
+    Column("username", String(50), unique=True, nullable=False),
+    Column("email", String, unique=True, nullable=False),
+    Column("password", String, nullable=False),
+    Column("created_at", DateTime(timezone=True)),
+    Column("bio_description", Text),
+    Column("profile_picture", String(255)),
+    Column("tags", Text, nullable=True),
+)
+
+Table(
+    "article",
+    metadata,
+    Column("article_id", Integer, primary_key=True, autoincrement=True),
+    Column("link", String, nullable=False),
+    Column("source", String),
+    Column("title", String),
+    Column("caption", Text),
+    Column("preview", String),
+    Index("ix_article_link", "link"),
+)
+
+Table(
+    "post",
+    metadata,
+    Column("post_id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("user.user_id"), nullable=False),
+    Column("article_id", Integer, ForeignKey("article.article_id"), nullable=False),
+    Column("description", Text),
+    Column("posted_at", DateTime(timezone=True), nullable=False),
+)
+
+Table(
+    "post_category",
+    metadata,
+    Column("post_id", Integer, ForeignKey("post.post_id"), primary_key=True),
+    Column("category", Enum(*CATEGORIES, name="categoryenum"), primary_key=True),
+)
+
+Table(
+    "collection",
+    metadata,
+    Column("collection_id", Integer, primary_key=True),
+    Column("user_id", Integer, ForeignKey("user.user_id"), nullable=False),
+    Column("title", String(100), nullable=False),
+    Column("emoji", String(10)),
+    Column("description", Text),
+    Column("is_public", Boolean),
+    Column("created_at", DateTime(timezone=True)),
+    UniqueConstraint("user_id", "title", name="unique_user_collection_title"),
+)
+
+Table(
+    "collection_post",
+    metadata,
+    Column("post_id", Integer, ForeignKey("post.post_id"), primary_key=True),
+    Column(
+        "collection_id",
+        Integer,
+        ForeignKey("collection.collection_id"),
+        primary_key=True,
+    ),
+)
+
+Table(
+    "comment",
+    metadata,
+    Column("comment_id", Integer, primary_key=True, autoincrement=True),
+    Column("user_id", Integer, ForeignKey("user.user_id"), nullable=False),
+    Column("post_id", Integer, ForeignKey("post.post_id"), nullable=False),
+    Column("content", Text, nullable=False),
+    Column("commented_at", DateTime(timezone=True)),
+)
+
+Table(
+    "like",
+    metadata,
+    Column("user_id", Integer, ForeignKey("user.user_id"), primary_key=True),
+    Column("post_id", Integer, ForeignKey("post.post_id"), primary_key=True),
+    Column("liked_at", DateTime(timezone=True)),
+)
+
+Table(
+    "follow",
+    metadata,
+    Column("user_id", Integer, ForeignKey("user.user_id"), primary_key=True),
+    Column("follower_id", Integer, ForeignKey("user.user_id"), primary_key=True),
+    Column("followed_at", DateTime),
+)
+
+Table(
+    "revoked_token",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=True),
+    Column("jti", String(120), index=True),
+    Column("created_at", DateTime),
+)
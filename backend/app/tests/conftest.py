@@ -1,4 +1,6 @@
 import pytest
+from contextlib import contextmanager
+from sqlalchemy import event
 from backend.app import create_app, db
 from backend.app.models import User
 from werkzeug.security import generate_password_hash
@@ -28,6 +30,8 @@ def setup_db(app_dict):
         # Clear all tables
         db.drop_all()
         db.create_all()
+        # Ids are reused once the tables are recreated
+        app_dict["app"].extensions["cache"].clear()
 
 
 @pytest.fixture
@@ -96,3 +100,29 @@ def create_test_user(app_dict):
         db.session.commit()
         return user
     return _create_user
+
+
+@pytest.fixture
+def record_queries(app_dict):
+    """
+    Return a context manager that collects the SQL statements executed inside
+    it, e.g. ``with record_queries() as statements: client.get(...)``.
+    """
+    engine = app_dict["db"].engine
+
+    @contextmanager
+    def _record_queries():
+        statements = []
+
+        def _before_cursor_execute(
+            conn, cursor, statement, parameters, context, executemany
+        ):
+            statements.append(statement)
+
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        try:
+            yield statements
+        finally:
+            event.remove(engine, "before_cursor_execute", _before_cursor_execute)
+
+    return _record_queries
@@ -0,0 +1,146 @@
+import pytest
+from .. import db
+from ..archive import archive_expired_interactions
+from ..models import (
+    Article,
+    ArchivedComment,
+    ArchivedLike,
+    Comment,
+    Like,
+    Post,
+    PostArchive,
+    User,
+)
+from datetime import datetime, timedelta, timezone
+
+
+# Helper: a post by the test user with likes and comments from other users
+def create_post_with_interactions(hours_ago, likers=3):
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.commit()
+
+    post = Post(
+        user_id=1,
+        article_id=article.article_id,
+        description="Test post",
+        posted_at=datetime.now(timezone.utc) - timedelta(hours=hours_ago),
+    )
+    db.session.add(post)
+    db.session.commit()
+
+    for i in range(likers):
+        user = User(
+            username=f"liker{hours_ago}_{i}",
+            email=f"liker{hours_ago}_{i}@test.com",
+            password="password123",
+        )
+        db.session.add(user)
+        db.session.flush()
+        db.session.add(Like(user_id=user.user_id, post_id=post.post_id))
+        db.session.add(
+            Comment(user_id=user.user_id, post_id=post.post_id, content=f"Hi {i}")
+        )
+    db.session.commit()
+    return post
+
+
+# Test that only interactions of posts older than 24h are moved
+def test_archive_expired_interactions(client):
+    old_post = create_post_with_interactions(hours_ago=30)
+    recent_post = create_post_with_interactions(hours_ago=1)
+
+    totals = archive_expired_interactions(batch_size=1)
+    assert totals == {"posts": 1, "likes": 3, "comments": 3}
+
+    assert Like.query.filter_by(post_id=old_post.post_id).count() == 0
+    assert Comment.query.filter_by(post_id=old_post.post_id).count() == 0
+    assert ArchivedLike.query.filter_by(post_id=old_post.post_id).count() == 3
+    assert ArchivedComment.query.filter_by(post_id=old_post.post_id).count() == 3
+
+    summary = PostArchive.query.get(old_post.post_id)
+    assert summary.likes_count == 3
+    assert summary.comments_count == 3
+
+    # Recent posts keep their interactions in the hot tables
+    assert Like.query.filter_by(post_id=recent_post.post_id).count() == 3
+    assert PostArchive.query.get(recent_post.post_id) is None
+
+    # Nothing left to do on a second run
+    assert archive_expired_interactions() == {"posts": 0, "likes": 0, "comments": 0}
+
+
+# Test that owners still see the full history of their archived posts
+def test_archived_post_stays_readable_for_owner(client):
+    post = create_post_with_interactions(hours_ago=30)
+    archive_expired_interactions()
+
+    response = client.get(f"/api/posts/{post.post_id}")
+    assert response.status_code == 200
+    assert response.json["data"]["likes_count"] == 3
+    assert response.json["data"]["comments_count"] == 3
+
+    response = client.get(f"/api/likes/{post.post_id}")
+    assert response.json["data"]["total_likes"] == 3
+
+    response = client.get(f"/api/comments/{post.post_id}")
+    assert response.json["data"]["total_comments"] == 3
+    assert response.json["data"]["comments"][0]["user"]["username"].startswith(
+        "liker"
+    )
+
+
+# Test that interactions added after archival are archived by the next run
+def test_archive_again_after_new_interactions(client):
+    post = create_post_with_interactions(hours_ago=30)
+    archive_expired_interactions()
+
+    # The owner can still interact with their own old post
+    response = client.post(f"/api/likes/{post.post_id}")
+    assert response.status_code == 201
+    response = client.get(f"/api/posts/{post.post_id}")
+    assert response.json["data"]["likes_count"] == 4
+    assert response.json["data"]["is_liked"] is True
+
+    assert archive_expired_interactions()["likes"] == 1
+    assert PostArchive.query.get(post.post_id).likes_count == 4
+
+    # An archived like still counts as liked
+    response = client.post(f"/api/likes/{post.post_id}")
+    assert response.status_code == 400
+
+
+# Test that authors can still remove their archived likes and change their
+# archived comments, and that the totals follow
+def test_change_archived_interactions(client):
+    post = create_post_with_interactions(hours_ago=30)
+    client.post(f"/api/likes/{post.post_id}")
+    client.post(f"/api/comments/{post.post_id}", json={"comment": "Mine"})
+    archive_expired_interactions()
+    [comment] = ArchivedComment.query.filter_by(user_id=1).all()
+
+    response = client.delete(f"/api/likes/{post.post_id}")
+    assert response.status_code == 200
+    response = client.put(
+        f"/api/comments/{comment.comment_id}", json={"comment": "Edited"}
+    )
+    assert response.status_code == 200
+    assert db.session.get(ArchivedComment, comment.comment_id).content == "Edited"
+    response = client.delete(f"/api/comments/{comment.comment_id}")
+    assert response.status_code == 200
+
+    response = client.get(f"/api/posts/{post.post_id}")
+    assert response.json["data"]["is_liked"] is False
+    assert response.json["data"]["likes_count"] == 3
+    assert response.json["data"]["comments_count"] == 3
+    assert ArchivedLike.query.filter_by(user_id=1).count() == 0
+
+
+# Test the CLI command used by the scheduled worker
+def test_archive_command(app_dict, client):
+    create_post_with_interactions(hours_ago=30)
+
+    runner = app_dict["app"].test_cli_runner()
+    result = runner.invoke(args=["archive-interactions", "--batch-size", "10"])
+    assert result.exit_code == 0
+    assert "Archived 3 likes and 3 comments from 1 posts" in result.output
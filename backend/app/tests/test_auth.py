@@ -1,5 +1,7 @@
 import pytest
 from flask_jwt_extended import decode_token
+from werkzeug.security import generate_password_hash
+from .. import db, passwords
 from ..models import User, RevokedToken
 from datetime import timedelta
 from unittest.mock import patch
@@ -219,3 +221,48 @@ def test_refresh_token_expiration(client, registered_user):
         assert response.status_code == 401
         assert "token has expired" in response.json["msg"].lower() 
         
+
+
+# Test that hashes made with older parameters are redone on login
+def test_login_rehashes_password(client, app_dict):
+    user = User(
+        username="legacy",
+        email="legacy@example.com",
+        password=generate_password_hash("password123", method="pbkdf2:sha256:1000"),
+    )
+    db.session.add(user)
+    db.session.commit()
+    credentials = {"email": "legacy@example.com", "password": "password123"}
+
+    response = client.post("/api/login", json=credentials)
+    assert response.status_code == 200
+    db.session.refresh(user)
+    method = app_dict["app"].config["PASSWORD_HASH_METHOD"]
+    assert user.password.startswith(f"{method}$")
+
+    response = client.post("/api/login", json=credentials)
+    assert response.status_code == 200
+
+
+# Test that logins are turned away while the hashing pool is full
+def test_login_when_hashing_busy(client, app_dict, registered_user):
+    _, slots = passwords._get_executor(app_dict["app"].config)
+    taken = 0
+    while slots.acquire(blocking=False):
+        taken += 1
+    try:
+        response = client.post(
+            "/api/login",
+            json={
+                "email": registered_user["email"],
+                "password": registered_user["password"],
+            },
+        )
+    finally:
+        for _ in range(taken):
+            slots.release()
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    body = client.get("/metrics").get_data(as_text=True)
+    assert 'flashnews_password_hashes_rejected_total{operation="check"}' in body
@@ -0,0 +1,214 @@
+import threading
+import time
+from datetime import datetime, timezone
+from .. import db
+from ..cache import MISSING, Cache, LocalBackend, MemoryCache
+from ..models import User
+from ..singleflight import SingleFlight
+from flask_jwt_extended import create_access_token
+
+
+def test_memory_cache_evicts_least_recently_used():
+    cache = MemoryCache(maxsize=2)
+    cache.set("a", 1, ttl=60)
+    cache.set("b", 2, ttl=60)
+    assert cache.get("a") == 1
+    cache.set("c", 3, ttl=60)
+
+    assert cache.get("b") is MISSING
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_memory_cache_expires_entries():
+    cache = MemoryCache()
+    cache.set("a", 1, ttl=0)
+    assert cache.get("a") is MISSING
+    assert len(cache) == 0
+
+
+def test_invalidate_tags():
+    cache = Cache()
+    cache.set("profile:alice", {"user_id": 1}, tags=["user:1"])
+    cache.set("collections:1", [], tags=["user:1", "collection:5"])
+    cache.set("collections:2", [], tags=["user:2", "collection:5"])
+
+    cache.invalidate_tags("collection:5")
+    assert cache.get("profile:alice") == {"user_id": 1}
+    assert cache.get("collections:1") is MISSING
+    assert cache.get("collections:2") is MISSING
+
+    cache.invalidate_tags("user:1")
+    assert cache.get("profile:alice") is MISSING
+
+
+# Test that without an L2, tagged entries only live l1_ttl seconds since
+# other workers don't see their invalidations
+def test_memory_cache_bounds_tagged_entries():
+    cache = Cache(l1_ttl=0)
+    cache.set("profile:alice", {"user_id": 1}, tags=["user:1"])
+    cache.set("og:link", {"title": "Article"})
+    assert cache.get("profile:alice") is MISSING
+    assert cache.get("og:link") == {"title": "Article"}
+
+
+def test_get_or_set_computes_once():
+    cache = Cache()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return [1, 2]
+
+    assert cache.get_or_set("key", compute, tags=lambda value: ["post:1"]) == [1, 2]
+    assert cache.get_or_set("key", compute) == [1, 2]
+    assert len(calls) == 1
+
+
+# Test that a value computed while its tags were invalidated isn't stored
+def test_invalidation_during_compute_drops_value(app_dict):
+    json = app_dict["app"].json
+    for backend in (None, LocalBackend):
+        for tags in (["post:1"], lambda value: ["post:1"]):
+            cache = Cache(backend=backend and backend(), json=json)
+
+            def compute():
+                cache.invalidate_tags("post:1")
+                return "old"
+
+            assert cache.get_or_set("post", compute, tags=tags) == "old"
+            assert cache.get("post") is MISSING
+            assert cache.get_or_set("post", lambda: "new", tags=tags) == "new"
+            assert cache.get("post") == "new"
+
+
+def test_get_or_set_coalesces_concurrent_misses():
+    cache = Cache()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return "value"
+
+    results = []
+    leader = threading.Thread(
+        target=lambda: results.append(cache.get_or_set("key", compute))
+    )
+    leader.start()
+    started.wait(5)
+    waiters = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_set("key", compute))
+        )
+        for _ in range(3)
+    ]
+    for waiter in waiters:
+        waiter.start()
+    # Let the waiters reach the flight before the leader finishes
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader, *waiters]:
+        thread.join(5)
+
+    assert results == ["value"] * 4
+    assert len(calls) == 1
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight("test")
+    started, release = threading.Event(), threading.Event()
+    errors = []
+
+    def fail():
+        started.set()
+        release.wait(5)
+        raise ValueError("upstream down")
+
+    def call():
+        try:
+            flight.do("key", fail)
+        except ValueError as e:
+            errors.append(e)
+
+    leader = threading.Thread(target=call)
+    leader.start()
+    started.wait(5)
+    waiter = threading.Thread(target=call)
+    waiter.start()
+    time.sleep(0.05)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert len(errors) == 2
+    assert errors[0] is errors[1]
+
+
+def test_lock_coalesces_misses_across_workers(app_dict):
+    json = app_dict["app"].json
+    shared = LocalBackend()
+    first = Cache(backend=shared, json=json, lock_timeout=5)
+    second = Cache(backend=shared, json=json, lock_timeout=5)
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"title": "Article"}
+
+    results = []
+    worker = threading.Thread(
+        target=lambda: results.append(first.get_or_set("og:link", compute))
+    )
+    worker.start()
+    started.wait(5)
+    # The second worker waits for the first one to store the value
+    threading.Timer(0.1, release.set).start()
+    results.append(second.get_or_set("og:link", compute))
+    worker.join(5)
+
+    assert results == [{"title": "Article"}] * 2
+    assert len(calls) == 1
+
+
+def test_shared_backend_invalidates_other_workers(app_dict):
+    json = app_dict["app"].json
+    shared = LocalBackend()
+    # Two workers sharing the L2, with copies in their L1 for 0 seconds
+    first = Cache(backend=shared, l1_ttl=0, json=json)
+    second = Cache(backend=shared, l1_ttl=0, json=json)
+
+    created_at = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    first.set("profile:alice", {"created_at": created_at}, tags=["user:1"])
+    assert second.get("profile:alice") == {
+        "created_at": "Mon, 01 Jan 2024 00:00:00 GMT"
+    }
+
+    second.invalidate_tags("user:1")
+    assert first.get("profile:alice") is MISSING
+
+
+def test_follow_invalidates_cached_profile(client):
+    other = User(username="other", email="other@test.com", password="password")
+    db.session.add(other)
+    db.session.commit()
+    token = create_access_token(identity=str(other.user_id))
+    headers = {"Authorization": f"Bearer {token}"}
+    test_user = User.query.filter_by(username="testuser").first()
+
+    response = client.get("/api/user/testuser", headers=headers)
+    assert response.json["data"]["followers_count"] == 0
+    assert response.json["data"]["is_owner"] is False
+
+    client.post(f"/api/user/follow/{test_user.user_id}", headers=headers)
+
+    response = client.get("/api/user/testuser", headers=headers)
+    assert response.json["data"]["followers_count"] == 1
+    # The cached profile is shared, is_owner depends on the viewer
+    response = client.get("/api/user/testuser")
+    assert response.json["data"]["is_owner"] is True
@@ -2,6 +2,8 @@ import pytest
 from .. import db
 from ..models import Collection, CollectionPost, Post, User, Article
 from flask_jwt_extended import create_access_token
+from datetime import datetime, timedelta, timezone
+from ..collection import PREVIEWS_MAX
 
 
 def test_create_collection_all_fields(client):
@@ -77,6 +79,100 @@ def test_get_other_user_collections(client):
     assert "private" not in response.json["data"]
 
 
+# Test that collections are paginated, newest first, with their post counts
+def test_get_collections_pages(client, test_user):
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.flush()
+    post = Post(user_id=test_user.user_id, article_id=article.article_id)
+    db.session.add(post)
+    now = datetime.now(timezone.utc)
+    collections = [
+        Collection(
+            title=f"Collection {index}",
+            user_id=test_user.user_id,
+            is_public=index != 1,
+            created_at=now - timedelta(minutes=index),
+        )
+        for index in range(3)
+    ]
+    db.session.add_all(collections)
+    db.session.flush()
+    db.session.add(
+        CollectionPost(collection_id=collections[0].collection_id, post_id=post.post_id)
+    )
+    db.session.commit()
+
+    response = client.get(f"/api/collections/user/{test_user.user_id}?per_page=2")
+    data = response.json["data"]
+    assert data["total"] == 3
+    assert [c["title"] for c in data["public"]] == ["Collection 0"]
+    assert [c["title"] for c in data["private"]] == ["Collection 1"]
+    assert data["public"][0]["articles_count"] == 1
+    assert data["private"][0]["articles_count"] == 0
+
+    response = client.get(
+        f"/api/collections/user/{test_user.user_id}?per_page=2&page=2"
+    )
+    data = response.json["data"]
+    assert [c["title"] for c in data["public"]] == ["Collection 2"]
+    assert data["private"] == []
+
+
+# Test that collections can be listed with the previews of their latest saved
+# posts
+def test_get_collections_with_previews(client, test_user, record_queries):
+    collection = Collection(title="Saved", user_id=test_user.user_id)
+    empty = Collection(title="Empty", user_id=test_user.user_id)
+    db.session.add_all([collection, empty])
+    db.session.flush()
+    now = datetime.now(timezone.utc)
+    for index in range(PREVIEWS_MAX + 1):
+        article = Article(
+            link=f"http://example.com/{index}",
+            preview=f"http://example.com/{index}.png" if index != 2 else None,
+        )
+        db.session.add(article)
+        db.session.flush()
+        post = Post(user_id=test_user.user_id, article_id=article.article_id)
+        db.session.add(post)
+        db.session.flush()
+        db.session.add(
+            CollectionPost(
+                collection_id=collection.collection_id,
+                post_id=post.post_id,
+                added_at=now - timedelta(minutes=index),
+            )
+        )
+    db.session.commit()
+
+    url = f"/api/collections/user/{test_user.user_id}"
+    response = client.get(f"{url}?previews=3")
+    assert response.status_code == 200
+    by_title = {c["title"]: c for c in response.json["data"]["public"]}
+    assert [p["preview"] for p in by_title["Saved"]["previews"]] == [
+        "http://example.com/0.png",
+        "http://example.com/1.png",
+        "http://example.com/3.png",
+    ]
+    assert by_title["Empty"]["previews"] == []
+    assert "previews" not in client.get(url).json["data"]["public"][0]
+
+    # Cached: the listing alone runs, without the preview query
+    with record_queries() as statements:
+        client.get(f"{url}?previews=3")
+    assert not any("row_number" in s.lower() for s in statements)
+
+    # Removing a post invalidates the collection's previews
+    first_post = by_title["Saved"]["previews"][0]["post_id"]
+    client.delete(f"/api/collections/{collection.collection_id}/posts/{first_post}")
+    response = client.get(f"{url}?previews=1")
+    by_title = {c["title"]: c for c in response.json["data"]["public"]}
+    assert by_title["Saved"]["previews"][0]["preview"] == "http://example.com/1.png"
+
+    assert client.get(f"{url}?previews={PREVIEWS_MAX + 1}").status_code == 400
+
+
 def test_get_nonexistent_user_collections(client):
     response = client.get("/api/collections/user/99999")
     assert response.status_code == 404
@@ -165,6 +261,102 @@ def test_add_post_to_collection(client):
     assert response.status_code == 200
 
 
+# Test adding and removing many posts at once, each in one statement
+def test_bulk_add_and_remove_posts(client, test_user, record_queries):
+    collection = Collection(title="Test", user_id=test_user.user_id)
+    article = Article(link="http://example.com/article")
+    db.session.add_all([collection, article])
+    db.session.flush()
+    posts = [
+        Post(user_id=test_user.user_id, article_id=article.article_id)
+        for _ in range(3)
+    ]
+    db.session.add_all(posts)
+    db.session.commit()
+    post_ids = [post.post_id for post in posts]
+    url = f"/api/collections/{collection.collection_id}/posts"
+
+    client.post(f"{url}/{post_ids[0]}")
+    with record_queries() as statements:
+        response = client.post(url, json={"post_ids": post_ids + [99999]})
+    assert response.status_code == 200
+    # The saved post and the missing one are skipped
+    assert response.json["data"]["added"] == 2
+    assert len([s for s in statements if s.startswith("INSERT")]) == 1
+
+    # Newest saved first, and pages in that order
+    response = client.get(f"{url}?per_page=2")
+    assert [p["post_id"] for p in response.json["data"]] == post_ids[:0:-1]
+    response = client.get(f"{url}?per_page=2&page=2")
+    assert [p["post_id"] for p in response.json["data"]] == [post_ids[0]]
+
+    response = client.delete(url, json={"post_ids": post_ids[:2]})
+    assert response.json["data"]["removed"] == 2
+    assert CollectionPost.query.count() == 1
+
+    assert client.post(url, json={"post_ids": []}).status_code == 400
+    assert client.post(url, json={"post_ids": ["1"]}).status_code == 400
+
+
+# Test that posts can only be added to your own collections
+def test_add_post_to_other_users_collection(client):
+    other_user = User(email="other@test.com", password="test123", username="other")
+    db.session.add(other_user)
+    db.session.commit()
+    collection = Collection(title="Theirs", user_id=other_user.user_id)
+    article = Article(link="http://example.com/article")
+    db.session.add_all([collection, article])
+    db.session.flush()
+    post = Post(user_id=other_user.user_id, article_id=article.article_id)
+    db.session.add(post)
+    db.session.commit()
+
+    url = f"/api/collections/{collection.collection_id}/posts"
+    assert client.post(f"{url}/{post.post_id}").status_code == 404
+    assert client.post(url, json={"post_ids": [post.post_id]}).status_code == 404
+    assert CollectionPost.query.count() == 0
+
+
+# Test that other users' expired posts can't be saved, and private
+# collections can't be read by other users
+def test_collection_posts_respect_visibility(app_dict, client, test_user):
+    other_user = User(email="other@test.com", password="test123", username="other")
+    article = Article(link="http://example.com/article")
+    db.session.add_all([other_user, article])
+    db.session.flush()
+    expired = Post(
+        user_id=other_user.user_id,
+        article_id=article.article_id,
+        posted_at=datetime.now(timezone.utc) - timedelta(hours=25),
+    )
+    own = Post(user_id=test_user.user_id, article_id=article.article_id)
+    mine = Collection(title="Mine", user_id=test_user.user_id)
+    private = Collection(title="Private", user_id=other_user.user_id, is_public=False)
+    db.session.add_all([expired, own, mine, private])
+    db.session.flush()
+    db.session.add(
+        CollectionPost(collection_id=private.collection_id, post_id=own.post_id)
+    )
+    db.session.commit()
+
+    url = f"/api/collections/{mine.collection_id}/posts"
+    assert client.post(f"{url}/{expired.post_id}").status_code == 404
+    response = client.post(url, json={"post_ids": [expired.post_id, own.post_id]})
+    assert response.json["data"]["added"] == 1
+
+    response = client.get(f"/api/collections/{private.collection_id}/posts")
+    assert response.status_code == 200
+    assert response.json["data"] == []
+
+    with app_dict["app"].app_context():
+        token = create_access_token(identity=str(other_user.user_id))
+    response = client.get(
+        f"/api/collections/{private.collection_id}/posts",
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    assert [post["post_id"] for post in response.json["data"]] == [own.post_id]
+
+
 def test_update_collection(client):
     collection = Collection(title="Old Title", user_id=1)
     db.session.add(collection)
@@ -196,6 +388,29 @@ def test_delete_collection(client):
     assert Collection.query.get(collection.collection_id) is None
 
 
+# Test that deleting a collection updates the cached listing of the other
+# pages
+def test_delete_collection_updates_other_pages(client, test_user):
+    now = datetime.now(timezone.utc)
+    collections = [
+        Collection(
+            title=f"Collection {index}",
+            user_id=test_user.user_id,
+            created_at=now - timedelta(minutes=index),
+        )
+        for index in range(2)
+    ]
+    db.session.add_all(collections)
+    db.session.commit()
+    url = f"/api/collections/user/{test_user.user_id}?per_page=1&page=2"
+    assert client.get(url).json["data"]["total"] == 2
+
+    client.delete(f"/api/collections/{collections[0].collection_id}")
+    data = client.get(url).json["data"]
+    assert data["total"] == 1
+    assert data["public"] == []
+
+
 def test_remove_post_from_collection(client):
     collection = Collection(title="Test", user_id=1)
     # Create a post
@@ -0,0 +1,251 @@
+import pytest
+from datetime import datetime, timedelta, timezone
+from sqlalchemy.exc import IntegrityError
+from .. import db, deletion
+from ..cache import get_cache
+from ..deletion import (
+    request_account_deletion,
+    resume_stale_account_deletions,
+    run_account_deletion,
+)
+from ..models import (
+    AccountDeletion,
+    Article,
+    Collection,
+    CollectionPost,
+    Comment,
+    Follow,
+    Like,
+    Post,
+    User,
+    UserStats,
+)
+
+
+def add_user_data(user_id, other_id):
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.flush()
+    own = Post(user_id=user_id, article_id=article.article_id)
+    other = Post(user_id=other_id, article_id=article.article_id)
+    collection = Collection(user_id=user_id, title="Saved")
+    db.session.add_all([own, other, collection])
+    db.session.flush()
+    db.session.add_all(
+        [
+            Like(user_id=user_id, post_id=other.post_id),
+            Like(user_id=other_id, post_id=own.post_id),
+            Comment(user_id=user_id, post_id=other.post_id, content="Nice"),
+            Comment(user_id=other_id, post_id=own.post_id, content="Thanks"),
+            CollectionPost(
+                collection_id=collection.collection_id, post_id=other.post_id
+            ),
+            Follow(user_id=other_id, follower_id=user_id),
+            Follow(user_id=user_id, follower_id=other_id),
+            UserStats(user_id=user_id, followers_count=1, following_count=1),
+            UserStats(user_id=other_id, followers_count=1, following_count=1),
+        ]
+    )
+    db.session.commit()
+    return other.post_id
+
+
+def make_other_user():
+    other = User(email="other@test.com", password="test123", username="other_user")
+    db.session.add(other)
+    db.session.commit()
+    return other.user_id
+
+
+# Test that the account is disabled as soon as the deletion is requested
+def test_deletion_disables_account(client, test_user):
+    job = AccountDeletion(job_id="pending-job", user_id=test_user.user_id)
+    db.session.add(job)
+    db.session.commit()
+
+    assert client.get("/api/user/following").status_code == 401
+    response = client.post(
+        "/api/login", json={"email": "test@test.com", "password": "password123"}
+    )
+    assert response.status_code == 401
+
+    response = client.get("/api/user/deletions/pending-job")
+    assert response.json["data"]["status"] == "pending"
+
+
+# Test that the batched deletion removes every dependant row, in batches
+def test_run_account_deletion(client, test_user):
+    other_id = make_other_user()
+    other_post_id = add_user_data(test_user.user_id, other_id)
+    db.session.add(AccountDeletion(job_id="job", user_id=test_user.user_id))
+    db.session.commit()
+
+    job = run_account_deletion("job", batch_size=1)
+    assert job.status == "completed"
+    # 2 likes, 2 comments, 1 saved post, 1 collection, 1 post, 2 follows,
+    # 1 stats row and the user
+    assert job.deleted_rows == 11
+
+    db.session.expire_all()
+    assert User.query.get(test_user.user_id) is None
+    assert Post.query.filter_by(user_id=test_user.user_id).count() == 0
+    assert Like.query.count() == 0
+    assert Comment.query.count() == 0
+    assert Collection.query.count() == 0
+    assert Follow.query.count() == 0
+    assert Post.query.get(other_post_id) is not None
+    stats = UserStats.query.get(other_id)
+    assert (stats.followers_count, stats.following_count) == (0, 0)
+
+
+# Test that the cached posts, collections and profiles the deletion changed
+# are invalidated
+def test_deletion_invalidates_cache(client, test_user, monkeypatch):
+    other_id = make_other_user()
+    other_post_id = add_user_data(test_user.user_id, other_id)
+    own_post_id = Post.query.filter_by(user_id=test_user.user_id).one().post_id
+    collection_id = Collection.query.one().collection_id
+    other_collection = Collection(user_id=other_id, title="Other")
+    db.session.add(other_collection)
+    db.session.flush()
+    db.session.add(
+        CollectionPost(
+            collection_id=other_collection.collection_id, post_id=own_post_id
+        )
+    )
+    db.session.add(AccountDeletion(job_id="job", user_id=test_user.user_id))
+    db.session.commit()
+
+    invalidated = set()
+    monkeypatch.setattr(
+        get_cache(), "invalidate_tags", lambda *tags: invalidated.update(tags)
+    )
+    run_account_deletion("job")
+    assert invalidated == {
+        f"user:{test_user.user_id}",
+        f"user:{other_id}",
+        f"post:{own_post_id}",
+        f"post:{other_post_id}",
+        f"collection:{collection_id}",
+        f"collection:{other_collection.collection_id}",
+    }
+
+
+# Test that the endpoint answers before the data is deleted, in the background
+def test_delete_account_in_background(app_dict, client, test_user):
+    add_user_data(test_user.user_id, make_other_user())
+
+    with app_dict["app"].test_request_context():
+        job, future = request_account_deletion(test_user.user_id)
+    assert job.status == "pending"
+    db.session.rollback()
+    future.result(timeout=10)
+
+    response = client.get(f"/api/user/deletions/{job.job_id}")
+    assert response.status_code == 200
+    data = response.json["data"]
+    assert data["status"] == "completed"
+    assert data["deleted_rows"] == 11
+    assert data["finished_at"] is not None
+
+    assert client.get("/api/user/deletions/unknown").status_code == 404
+
+
+# Test that an interrupted deletion can be finished from the CLI
+def test_resume_account_deletions(app_dict, client, test_user):
+    # Interrupted by a restart ten minutes ago
+    db.session.add(
+        AccountDeletion(
+            job_id="job",
+            user_id=test_user.user_id,
+            status="running",
+            heartbeat_at=datetime.now(timezone.utc) - timedelta(minutes=10),
+        )
+    )
+    db.session.commit()
+
+    runner = app_dict["app"].test_cli_runner()
+    result = runner.invoke(args=["resume-account-deletions"])
+    assert "job: completed, 1 rows deleted" in result.output
+    db.session.expire_all()
+    assert User.query.get(test_user.user_id) is None
+
+
+# Test that a repeated request gets the unfinished job back, and runs it again
+def test_repeated_request_returns_job(app_dict, client, test_user):
+    db.session.add(
+        AccountDeletion(job_id="failed-job", user_id=test_user.user_id, status="failed")
+    )
+    db.session.commit()
+
+    with app_dict["app"].test_request_context():
+        job, future = request_account_deletion(test_user.user_id)
+    assert job.job_id == "failed-job"
+    db.session.rollback()
+    future.result(timeout=10)
+
+    db.session.expire_all()
+    assert AccountDeletion.query.count() == 1
+    assert AccountDeletion.query.get("failed-job").status == "completed"
+
+
+# Test that a user can't have two unfinished jobs
+def test_one_unfinished_job_per_user(client, test_user):
+    db.session.add(AccountDeletion(job_id="first", user_id=test_user.user_id))
+    db.session.commit()
+    db.session.add(AccountDeletion(job_id="second", user_id=test_user.user_id))
+    with pytest.raises(IntegrityError):
+        db.session.commit()
+    db.session.rollback()
+
+
+# Test that only jobs without progress for a while are resumed automatically
+def test_resume_stale_account_deletions(client, test_user):
+    other_id = make_other_user()
+    long_ago = datetime.now(timezone.utc) - timedelta(minutes=10)
+    db.session.add_all(
+        [
+            AccountDeletion(
+                job_id="stale",
+                user_id=test_user.user_id,
+                status="running",
+                heartbeat_at=long_ago,
+            ),
+            # Its runner is still at work
+            AccountDeletion(
+                job_id="running",
+                user_id=other_id,
+                status="running",
+                requested_at=long_ago,
+                heartbeat_at=datetime.now(timezone.utc),
+            ),
+        ]
+    )
+    db.session.commit()
+
+    jobs = resume_stale_account_deletions()
+    assert [(job.job_id, job.status) for job in jobs] == [("stale", "completed")]
+    assert run_account_deletion("running").status == "running"
+    assert User.query.get(other_id) is not None
+
+
+# Test that rows added while the job runs are deleted by another pass
+def test_deletion_retries_after_race(client, test_user, monkeypatch):
+    other_id = make_other_user()
+    db.session.add(AccountDeletion(job_id="job", user_id=test_user.user_id))
+    db.session.commit()
+
+    delete_in_batches = deletion._delete_in_batches
+    raced = []
+
+    def follow_before_user_is_deleted(job, step, *args):
+        if step == "user" and not raced:
+            raced.append(step)
+            db.session.add(Follow(user_id=test_user.user_id, follower_id=other_id))
+            db.session.commit()
+        delete_in_batches(job, step, *args)
+
+    monkeypatch.setattr(deletion, "_delete_in_batches", follow_before_user_is_deleted)
+    job = run_account_deletion("job")
+    assert job.status == "completed", job.error
+    assert Follow.query.count() == 0
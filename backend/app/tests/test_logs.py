@@ -0,0 +1,86 @@
+import json
+import logging
+import threading
+import time
+from .. import logs
+from ..logs import NonBlockingQueueHandler, Sampler, log_event
+
+
+def written_lines(capsys):
+    # Stopping the listener writes out the queued records
+    logs._handler.stop()
+    return [json.loads(line) for line in capsys.readouterr().out.splitlines()]
+
+
+# Test that the app's records are written as JSON with their extra fields
+def test_records_are_json(app_dict, capsys):
+    app = app_dict["app"]
+    with app.test_request_context("/api/posts/feed"):
+        app.logger.warning("Feed is slow", extra={"duration_ms": 1200})
+
+    [line] = written_lines(capsys)
+    assert line["level"] == "WARNING"
+    assert line["message"] == "Feed is slow"
+    assert line["duration_ms"] == 1200
+    assert line["path"] == "/api/posts/feed"
+
+
+# Test that requests are logged per namespace, at the sample rate configured
+def test_access_log(client, capsys, monkeypatch):
+    monkeypatch.setattr(logs, "_sampler", Sampler({}))
+    client.get("/api/posts/categories")
+
+    [line] = written_lines(capsys)
+    assert line["logger"].endswith(".access.posts")
+    assert line["route"] == "/api/posts/categories"
+    assert line["status"] == 200
+
+    monkeypatch.setattr(logs, "_sampler", Sampler({"backend.app.access": 0}))
+    client.get("/api/posts/categories")
+    assert written_lines(capsys) == []
+
+
+def test_sampler_uses_closest_ancestor():
+    sampler = Sampler({"app.access": 0.01, "app.access.auth": 1})
+    assert sampler.rate("app.access.posts") == 0.01
+    assert sampler.rate("app.access.auth") == 1
+    assert sampler.rate("app.deletion") == 1.0
+
+
+# Test that warnings are kept whatever the sample rate
+def test_sampling_keeps_warnings(monkeypatch):
+    monkeypatch.setattr(logs, "_sampler", Sampler({"sampled": 0}))
+    logger = logging.getLogger("sampled")
+    records = []
+    handler = logging.Handler()
+    handler.emit = records.append
+    logger.addHandler(handler)
+    try:
+        log_event(logger, logging.WARNING, "kept")
+        log_event(logger, logging.INFO, "dropped")
+    finally:
+        logger.removeHandler(handler)
+    assert [record.getMessage() for record in records] == ["kept"]
+
+
+# Test that a stalled stdout drops records instead of blocking the caller
+def test_full_queue_drops_records():
+    release = threading.Event()
+    written = []
+
+    class StalledHandler(logging.Handler):
+        def emit(self, record):
+            release.wait(5)
+            written.append(record.getMessage())
+
+    handler = NonBlockingQueueHandler(2, StalledHandler())
+    start = time.perf_counter()
+    for i in range(100):
+        handler.handle(logging.makeLogRecord({"msg": f"record {i}"}))
+    elapsed = time.perf_counter() - start
+    release.set()
+    handler.stop()
+
+    assert elapsed < 1
+    # The two in the queue, and the one being written if it was taken
+    assert 2 <= len(written) <= 3
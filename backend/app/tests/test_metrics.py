@@ -0,0 +1,39 @@
+import pytest
+from .. import db
+from ..models import Article, Post
+
+
+# Test that the metrics endpoint is public and in the Prometheus text format
+def test_metrics_endpoint(client):
+    client.environ_base.pop("HTTP_AUTHORIZATION", None)
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.content_type.startswith("text/plain")
+
+
+# Test that requests are recorded per namespace and route template
+def test_metrics_record_requests(client):
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.commit()
+
+    post = Post(user_id=1, article_id=article.article_id, description="Test post")
+    db.session.add(post)
+    db.session.commit()
+
+    client.get(f"/api/posts/{post.post_id}")
+    client.get("/api/posts/99999")
+
+    body = client.get("/metrics").get_data(as_text=True)
+
+    assert (
+        'flashnews_http_request_duration_seconds_count{method="GET",'
+        'namespace="posts",route="/api/posts/<int:post_id>"}' in body
+    )
+    assert (
+        'flashnews_http_requests_total{method="GET",namespace="posts",'
+        'route="/api/posts/<int:post_id>",status="404"}' in body
+    )
+    assert 'flashnews_db_queries_total{namespace="posts"}' in body
+    assert "flashnews_http_requests_in_progress" in body
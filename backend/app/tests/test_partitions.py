@@ -0,0 +1,145 @@
+import pytest
+from .. import db
+from ..partitions import daily_partitions, is_partitioned
+from ..models import (
+    ArchivedComment,
+    ArchivedLike,
+    Article,
+    CategoryEnum,
+    Collection,
+    CollectionPost,
+    Comment,
+    Like,
+    Post,
+    PostArchive,
+    PostCategory,
+)
+from datetime import datetime, timedelta, timezone
+
+
+@pytest.fixture
+def postgres(app_dict):
+    if db.engine.dialect.name != "postgresql":
+        pytest.skip("Post partitioning is only supported on Postgres")
+
+
+def create_post(days_ago):
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.flush()
+    post = Post(
+        user_id=1,
+        article_id=article.article_id,
+        description=f"{days_ago} days ago",
+        posted_at=datetime.now(timezone.utc) - timedelta(days=days_ago),
+    )
+    db.session.add(post)
+    db.session.flush()
+    db.session.add(Like(user_id=1, post_id=post.post_id))
+    db.session.commit()
+    return post.post_id
+
+
+# Test that the commands refuse to run on SQLite
+def test_partitions_require_postgres(app_dict, client):
+    if db.engine.dialect.name == "postgresql":
+        pytest.skip("Only relevant outside Postgres")
+
+    runner = app_dict["app"].test_cli_runner()
+    result = runner.invoke(args=["partitions", "setup"])
+    assert result.exit_code != 0
+    assert "only supported on Postgres" in result.output
+
+
+# Test that converting the post table keeps its rows and the API working
+def test_partition_post_table(app_dict, client, postgres):
+    old_post_id = create_post(days_ago=30)
+    create_post(days_ago=0)
+    runner = app_dict["app"].test_cli_runner()
+
+    result = runner.invoke(args=["partitions", "setup", "--days-ahead", "2"])
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+    assert is_partitioned()
+    assert Post.query.count() == 2
+
+    # New posts get ids from the same sequence and land in today's partition
+    response = client.post(
+        "/api/posts/", json={"article_link": "http://example.com/new"}
+    )
+    assert response.status_code == 201
+    assert response.json["data"]["post_id"] == old_post_id + 2
+
+    response = client.get("/api/posts/feed")
+    assert response.json["data"]["total_posts"] == 2
+
+    # Deletes still cascade to the tables that referenced post
+    db.session.execute(db.delete(Post).where(Post.post_id == old_post_id))
+    db.session.commit()
+    assert Like.query.filter_by(post_id=old_post_id).count() == 0
+
+    # A second setup is a no-op
+    result = runner.invoke(args=["partitions", "setup"])
+    assert "already partitioned" in result.output
+
+
+# Test that maintenance creates future partitions and retires old ones
+def test_maintain_partitions(app_dict, client, postgres):
+    runner = app_dict["app"].test_cli_runner()
+    runner.invoke(args=["partitions", "setup", "--days-ahead", "1"])
+    today = datetime.now(timezone.utc).date()
+
+    result = runner.invoke(args=["partitions", "maintain", "--days-ahead", "3"])
+    assert result.exit_code == 0, result.output
+    assert today + timedelta(days=3) in daily_partitions()
+
+    result = runner.invoke(
+        args=["partitions", "maintain", "--detach-older-than", "0", "--drop"]
+    )
+    assert result.exit_code == 0, result.output
+    assert f"post_p{today - timedelta(days=1):%Y%m%d}" in result.output
+    assert min(daily_partitions()) == today
+
+
+# Test that dropping a partition deletes what referenced its posts
+def test_drop_partition_deletes_references(app_dict, client, test_user, postgres):
+    runner = app_dict["app"].test_cli_runner()
+    runner.invoke(args=["partitions", "setup", "--days-ahead", "1"])
+    # Lands in yesterday's daily partition
+    old_post_id = create_post(days_ago=1)
+    new_post_id = create_post(days_ago=0)
+
+    collection = Collection(user_id=1, title="Saved")
+    db.session.add(collection)
+    db.session.flush()
+    for post_id in (old_post_id, new_post_id):
+        db.session.add_all(
+            [
+                Comment(user_id=1, post_id=post_id, content="Nice"),
+                PostCategory(post_id=post_id, category=CategoryEnum.SCIENCE),
+                CollectionPost(post_id=post_id, collection_id=collection.collection_id),
+                PostArchive(post_id=post_id, likes_count=1),
+                ArchivedLike(user_id=1, post_id=post_id),
+                ArchivedComment(
+                    comment_id=1000 + post_id, user_id=1, post_id=post_id, content="Hi"
+                ),
+            ]
+        )
+    db.session.commit()
+
+    result = runner.invoke(
+        args=["partitions", "maintain", "--detach-older-than", "0", "--drop"]
+    )
+    assert result.exit_code == 0, result.output
+    db.session.expire_all()
+    for model in (
+        Like,
+        Comment,
+        PostCategory,
+        CollectionPost,
+        PostArchive,
+        ArchivedLike,
+        ArchivedComment,
+    ):
+        assert model.query.filter_by(post_id=old_post_id).count() == 0, model
+        assert model.query.filter_by(post_id=new_post_id).count() == 1, model
@@ -1,6 +1,6 @@
 import pytest
 from .. import db
-from ..models import Post, Article, User, CategoryEnum, Follow
+from ..models import Post, Article, User, CategoryEnum, Follow, Like, Comment, PostCategory
 from datetime import datetime, timedelta, timezone
 
 
@@ -65,6 +65,36 @@ def test_get_post_success(client):
     assert "article" in response.json["data"]
 
 
+# Test that a cached post is served with the viewer's like from one query,
+# and that likes and comments refresh it
+def test_get_post_cached(client, create_test_user, record_queries):
+    other_user = create_test_user(2, "other@test.com", "other_user")
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.commit()
+    post = Post(user_id=other_user.user_id, article_id=article.article_id)
+    db.session.add(post)
+    db.session.commit()
+    post_id = post.post_id
+
+    response = client.get(f"/api/posts/{post_id}")
+    assert response.json["data"]["likes_count"] == 0
+    assert response.json["data"]["is_liked"] is False
+
+    # Blocklist, user and the viewer's like
+    with record_queries() as statements:
+        response = client.get(f"/api/posts/{post_id}")
+    assert response.status_code == 200
+    assert len(statements) == 3
+
+    client.post(f"/api/likes/{post_id}")
+    client.post(f"/api/comments/{post_id}", json={"comment": "Nice"})
+    response = client.get(f"/api/posts/{post_id}")
+    assert response.json["data"]["likes_count"] == 1
+    assert response.json["data"]["comments_count"] == 1
+    assert response.json["data"]["is_liked"] is True
+
+
 # Test that retrieving a non-existent posts returns an error
 def test_get_post_nonexistent(client):
     response = client.get("/api/posts/99999")
@@ -91,6 +121,38 @@ def test_delete_post_success(client):
     assert Post.query.get(post.post_id) is None
 
 
+# Test that the database deletes a post's likes, comments and categories,
+# with a single DELETE whatever their number
+def test_delete_post_cascades(client, test_user, record_queries):
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.commit()
+    post = Post(user_id=test_user.user_id, article_id=article.article_id)
+    db.session.add(post)
+    db.session.commit()
+    post_id = post.post_id
+
+    for index in range(5):
+        liker = User(email=f"{index}@test.com", password="x", username=f"u{index}")
+        db.session.add(liker)
+        db.session.flush()
+        db.session.add(Like(user_id=liker.user_id, post_id=post_id))
+        db.session.add(Comment(user_id=liker.user_id, post_id=post_id, content="Hi"))
+    db.session.add(PostCategory(post_id=post_id, category=CategoryEnum.SCIENCE))
+    db.session.commit()
+    db.session.expire_all()
+
+    with record_queries() as statements:
+        response = client.delete(f"/api/posts/{post_id}")
+    assert response.status_code == 200
+    deletes = [s for s in statements if s.lstrip().upper().startswith("DELETE")]
+    assert len(deletes) == 1
+
+    assert Like.query.filter_by(post_id=post_id).count() == 0
+    assert Comment.query.filter_by(post_id=post_id).count() == 0
+    assert PostCategory.query.filter_by(post_id=post_id).count() == 0
+
+
 # Test that you can't delete another user's post
 def test_delete_post_unauthorized(client):
     # Create another user
@@ -152,6 +214,30 @@ def test_get_feed(client):
     assert "page" in response.json["data"]
 
 
+# Test that the total is still reported past the last page
+def test_get_feed_past_last_page(client):
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.commit()
+
+    db.session.add_all(
+        [
+            Post(user_id=1, article_id=article.article_id, description=f"Post {i}")
+            for i in range(3)
+        ]
+    )
+    db.session.commit()
+
+    response = client.get("/api/posts/feed?page=1&per_page=2")
+    assert response.json["data"]["total_posts"] == 3
+    assert len(response.json["data"]["posts"]) == 2
+
+    response = client.get("/api/posts/feed?page=5&per_page=2")
+    assert response.status_code == 200
+    assert response.json["data"]["total_posts"] == 3
+    assert response.json["data"]["posts"] == []
+
+
 # Test getting user's posts
 def test_get_user_posts(client):
     # Create test posts
@@ -189,6 +275,21 @@ def test_get_categories(client):
     assert len(categories) == len(CategoryEnum)
 
 
+# Test that categories are served without a token, a query or re-encoding
+def test_get_categories_precomputed(app_dict, record_queries):
+    client = app_dict["app"].test_client()
+    with record_queries() as statements:
+        response = client.get("/api/posts/categories")
+    assert response.status_code == 200
+    assert statements == []
+    assert "max-age=86400" in response.headers["Cache-Control"]
+
+    etag = response.headers["ETag"]
+    response = client.get("/api/posts/categories", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.data == b""
+
+
 # Test that you can't view a post 24hrs after it has been created
 def test_view_post_after_24h(client, create_test_user):
     other_user = create_test_user(2, "other@test.com", "other_user")
@@ -205,3 +306,44 @@ def test_view_post_after_24h(client, create_test_user):
 
     response = client.get(f"/api/posts/{post.post_id}")
     assert response.status_code == 403
+
+
+# Test that other users' posts older than 24h are filtered out of their post list
+def test_get_user_posts_hides_expired(client, create_test_user):
+    other_user = create_test_user(2, "other@test.com", "other_user")
+    article = Article(link="http://example.com/article")
+    db.session.add(article)
+    db.session.commit()
+
+    db.session.add_all(
+        [
+            Post(
+                user_id=other_user.user_id,
+                article_id=article.article_id,
+                description="Recent post",
+                posted_at=datetime.now(timezone.utc),
+            ),
+            Post(
+                user_id=other_user.user_id,
+                article_id=article.article_id,
+                description="Old post",
+                posted_at=datetime.now(timezone.utc) - timedelta(hours=25),
+            ),
+            Post(
+                user_id=1,
+                article_id=article.article_id,
+                description="Own old post",
+                posted_at=datetime.now(timezone.utc) - timedelta(hours=25),
+            ),
+        ]
+    )
+    db.session.commit()
+
+    response = client.get(f"/api/posts/user/{other_user.user_id}")
+    assert response.json["data"]["total_posts"] == 1
+    assert response.json["data"]["posts"][0]["description"] == "Recent post"
+
+    # Users always see their own posts
+    response = client.get("/api/posts/user/1")
+    assert response.json["data"]["total_posts"] == 1
+    assert response.json["data"]["posts"][0]["description"] == "Own old post"
@@ -0,0 +1,168 @@
+import json
+import os
+import re
+import pytest
+from collections import Counter
+from datetime import datetime, timezone
+from flask import current_app
+from .. import db
+from ..models import (
+    Article,
+    CategoryEnum,
+    Collection,
+    CollectionPost,
+    Comment,
+    Follow,
+    Like,
+    Post,
+    PostCategory,
+    User,
+)
+
+# Maximum number of SQL statements per request, including the JWT blocklist
+# lookup. Every endpoint is measured at two data sizes and must stay the same,
+# so a new lazy load (N+1) fails here even when it is still within budget.
+with open(os.path.join(os.path.dirname(__file__), "query_budgets.json")) as f:
+    QUERY_BUDGETS = json.load(f)
+
+SMALL, LARGE = 2, 12
+
+
+def create_graph(size):
+    """
+    A post by the test user that every followed user likes and comments on,
+    plus one post per followed user with its own likes, comments and categories.
+    """
+    article = Article(link="http://example.com/article", title="Test Article")
+    db.session.add(article)
+    db.session.commit()
+
+    own_post = Post(
+        user_id=1,
+        article_id=article.article_id,
+        description="Own post",
+        posted_at=datetime.now(timezone.utc),
+    )
+    db.session.add(own_post)
+    db.session.flush()
+    db.session.add(PostCategory(post_id=own_post.post_id, category=CategoryEnum.SCIENCE))
+
+    posts = []
+    for i in range(size):
+        user = User(
+            username=f"author{i}",
+            email=f"author{i}@test.com",
+            password="password123",
+        )
+        db.session.add(user)
+        db.session.flush()
+
+        db.session.add(Follow(follower_id=1, user_id=user.user_id))
+        post = Post(
+            user_id=user.user_id,
+            article_id=article.article_id,
+            description=f"Post {i}",
+            posted_at=datetime.now(timezone.utc),
+        )
+        db.session.add(post)
+        db.session.flush()
+        posts.append(post)
+
+        db.session.add_all(
+            [
+                PostCategory(post_id=post.post_id, category=CategoryEnum.SCIENCE),
+                PostCategory(post_id=post.post_id, category=CategoryEnum.HEALTH),
+                Like(user_id=user.user_id, post_id=post.post_id),
+                Comment(user_id=user.user_id, post_id=post.post_id, content="Hi"),
+            ]
+        )
+
+        db.session.add(Like(user_id=user.user_id, post_id=own_post.post_id))
+        db.session.add(
+            Comment(user_id=user.user_id, post_id=own_post.post_id, content="Hi")
+        )
+
+    collection = Collection(user_id=1, title="Saved")
+    db.session.add(collection)
+    db.session.flush()
+    db.session.add_all(
+        [
+            CollectionPost(collection_id=collection.collection_id, post_id=post.post_id)
+            for post in posts
+        ]
+    )
+    db.session.commit()
+
+    return {"post_id": own_post.post_id, "collection_id": collection.collection_id}
+
+
+ENDPOINTS = {
+    "feed": lambda ids: f"/api/posts/feed?per_page={LARGE}",
+    "user_posts": lambda ids: "/api/posts/user/1",
+    "single_post": lambda ids: f"/api/posts/{ids['post_id']}",
+    "collection_posts": lambda ids: f"/api/collections/{ids['collection_id']}/posts",
+    "collections": lambda ids: "/api/collections/user/1",
+    "likes": lambda ids: f"/api/likes/{ids['post_id']}?per_page={LARGE}",
+    "comments": lambda ids: f"/api/comments/{ids['post_id']}?per_page={LARGE}",
+    "following": lambda ids: f"/api/user/1/following?limit={LARGE}",
+    "profile": lambda ids: "/api/user/testuser",
+}
+
+
+def record_request(client, record_queries, url):
+    with record_queries() as statements:
+        response = client.get(url)
+    assert response.status_code == 200, response.json
+    return statements
+
+
+def normalize(statement):
+    """Collapse whitespace and IN lists, whose length follows the data size."""
+    statement = " ".join(statement.split())
+    # Postgres placeholders look like %(name)s, hence the nested parentheses
+    return re.sub(r"IN \((?:[^()]|\([^()]*\))*\)", "IN (...)", statement)
+
+
+def describe_statements(statements):
+    return "\n".join(f"  {statement}" for statement in statements)
+
+
+def assert_within_budget(name, small, large):
+    budget = QUERY_BUDGETS[name]
+    small, large = [normalize(s) for s in small], [normalize(s) for s in large]
+    added = list((Counter(large) - Counter(small)).elements())
+
+    assert not added, (
+        f"{name}: {len(small)} queries with {SMALL} rows but {len(large)} with "
+        f"{LARGE} rows. Statements added:\n{describe_statements(added)}"
+    )
+    assert len(large) <= budget, (
+        f"{name}: {len(large)} queries exceed the budget of {budget}. "
+        f"Statements beyond the budget:\n{describe_statements(large[budget:])}"
+    )
+
+
+# Test that endpoints stay within their query budget whatever the data size
+@pytest.mark.parametrize("name", sorted(ENDPOINTS))
+def test_query_budget(client, record_queries, name):
+    ids = create_graph(SMALL)
+    small = record_request(client, record_queries, ENDPOINTS[name](ids))
+
+    # Rebuild the data with more rows and measure again. End the session's
+    # transaction first, Postgres would otherwise block the DROPs on its locks.
+    db.session.rollback()
+    db.drop_all()
+    db.create_all()
+    # Ids are reused, so nothing cached from the small graph can be served
+    current_app.extensions["cache"].clear()
+    db.session.add(User(email="test@test.com", username="testuser", password="x"))
+    db.session.commit()
+    ids = create_graph(LARGE)
+    large = record_request(client, record_queries, ENDPOINTS[name](ids))
+
+    assert_within_budget(name, small, large)
+
+
+# Test that every budgeted endpoint is measured
+def test_query_budgets_cover_endpoints():
+    assert set(QUERY_BUDGETS) == set(ENDPOINTS)
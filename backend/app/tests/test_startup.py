@@ -0,0 +1,135 @@
+import os
+import subprocess
+import sys
+from alembic.autogenerate import compare_metadata
+from alembic.migration import MigrationContext
+from flask_migrate import stamp, upgrade
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from backend.app import create_app, db
+from . import baseline_schema
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+
+
+def schema_differences(metadata):
+    with db.engine.connect() as connection:
+        return compare_metadata(MigrationContext.configure(connection), metadata)
+
+
+# Test that creating the app runs no SQL, the schema comes from the migrations
+def test_create_app_runs_no_sql():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(Engine, "before_cursor_execute", record)
+    try:
+        create_app({"SQLALCHEMY_DATABASE_URI": "sqlite://"})
+    finally:
+        event.remove(Engine, "before_cursor_execute", record)
+    assert statements == []
+
+
+# Test that the OpenGraph parser's dependencies aren't imported with the app
+def test_opengraph_dependencies_are_lazy():
+    from backend.app import utils
+
+    assert not hasattr(utils, "requests")
+    assert not hasattr(utils, "BeautifulSoup")
+
+
+# Test that the migrations build the schema the models describe
+def test_migrations_match_models(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'm.db'}"})
+    with app.app_context():
+        upgrade()
+        assert schema_differences(db.metadata) == []
+        db.engine.dispose()
+
+
+# Test that the baseline revision is the schema the app created before the
+# migrations, and nothing more
+def test_baseline_is_the_schema_before_migrations(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'b.db'}"})
+    with app.app_context():
+        upgrade(revision="0001")
+        assert schema_differences(baseline_schema.metadata) == []
+        db.engine.dispose()
+
+
+# Test that a database the app created before the migrations, stamped at the
+# baseline, is upgraded to the schema of the models
+def test_stamped_database_gets_new_schema(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'old.db'}"})
+    with app.app_context():
+        baseline_schema.metadata.create_all(db.engine)
+        stamp(revision="0001")
+        upgrade()
+        assert schema_differences(db.metadata) == []
+        db.engine.dispose()
+
+
+# Test that upgrading a database the app created before the migrations, as
+# deploys do, keeps its rows and serves them
+def test_upgrade_database_from_before_migrations(tmp_path):
+    app = create_app({"SQLALCHEMY_DATABASE_URI": f"sqlite:///{tmp_path / 'old.db'}"})
+    tables = baseline_schema.metadata.tables
+    with app.app_context():
+        baseline_schema.metadata.create_all(db.engine)
+        with db.engine.begin() as connection:
+            connection.execute(
+                tables["user"].insert(),
+                [
+                    {"username": "old", "email": "old@test.com", "password": "test"},
+                    {"username": "fan", "email": "fan@test.com", "password": "test"},
+                    {"username": "fan2", "email": "fan2@test.com", "password": "test"},
+                ],
+            )
+            connection.execute(
+                tables["follow"].insert(),
+                [{"user_id": 1, "follower_id": 2}, {"user_id": 1, "follower_id": 3}],
+            )
+
+        upgrade()
+        assert schema_differences(db.metadata) == []
+
+        client = app.test_client()
+        token = create_access_token(identity="2")
+        response = client.get(
+            "/api/user/old", headers={"Authorization": f"Bearer {token}"}
+        )
+        assert response.status_code == 200
+        assert response.json["data"]["followers_count"] == 2
+        # The follows were made without a followed_at
+        response = client.get(
+            "/api/user/1/followers?limit=1",
+            headers={"Authorization": f"Bearer {token}"},
+        )
+        assert response.status_code == 200
+        assert response.json["data"]["next_cursor"]
+        db.engine.dispose()
+
+
+# Test that the app imports under gunicorn.conf.py on a fresh container,
+# where the metrics directory doesn't exist yet
+def test_gunicorn_config_creates_metrics_dir(tmp_path):
+    metrics_dir = tmp_path / "metrics"
+    env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": str(metrics_dir)}
+    env.pop("FLASHNEWS_METRICS_DIR_READY", None)
+    subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "import runpy; runpy.run_path('gunicorn.conf.py')\n"
+            "from app import create_app\n"
+            "create_app({'SQLALCHEMY_DATABASE_URI': 'sqlite://'})",
+        ],
+        cwd=BACKEND_DIR,
+        env=env,
+        check=True,
+        capture_output=True,
+    )
+    assert metrics_dir.is_dir()
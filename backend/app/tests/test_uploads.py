@@ -0,0 +1,304 @@
+import hashlib
+import io
+import os
+import pytest
+from PIL import Image
+from werkzeug.datastructures import FileStorage
+from .. import db
+from ..models import User
+from ..storage import DirectoryObjectStorage, IMMUTABLE_MAX_AGE, LocalStorage
+from ..uploads import VARIANT_PENDING_MAX_AGE, save_profile_picture
+
+
+def make_image(size=(400, 300), color="red", format="PNG"):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, color).save(buffer, format=format)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def upload_folder(app_dict, tmp_path):
+    app = app_dict["app"]
+    previous = app.extensions["upload_storage"]
+    app.extensions["upload_storage"] = LocalStorage(str(tmp_path))
+    yield tmp_path
+    app.extensions["upload_storage"] = previous
+
+
+def upload(client, content, filename="avatar.png"):
+    return client.put(
+        "/api/user/",
+        data={"profile_picture": (io.BytesIO(content), filename)},
+        content_type="multipart/form-data",
+    )
+
+
+# Test that pictures are stored under the hash of their content
+def test_upload_profile_picture(client, test_user, upload_folder):
+    content = make_image()
+    response = upload(client, content)
+    assert response.status_code == 200
+
+    key = f"{hashlib.sha256(content).hexdigest()}.png"
+    assert User.query.get(test_user.user_id).profile_picture == key
+    assert response.json["data"]["profile_picture"] == (
+        f"/user/uploads/{key.replace('.png', '_medium.png')}"
+    )
+    assert (upload_folder / key).read_bytes() == content
+
+
+# Test that pictures with the same file name don't overwrite each other,
+# and that identical pictures are stored once
+def test_upload_names_by_content(client, test_user, upload_folder):
+    upload(client, make_image(color="red"))
+    upload(client, make_image(color="blue"))
+    upload(client, make_image(color="blue"), filename="other.png")
+
+    pictures = [
+        name
+        for name in os.listdir(upload_folder)
+        if "_" not in name and not name.startswith(".")
+    ]
+    assert len(pictures) == 2
+
+
+# Test that oversized and non-image uploads are refused
+def test_upload_rejects_invalid_files(app_dict, client, test_user, upload_folder):
+    response = upload(client, b"not an image")
+    assert response.status_code == 400
+
+    app_dict["app"].config["MAX_UPLOAD_SIZE"] = 1024
+    try:
+        response = upload(client, make_image(size=(2000, 2000)))
+    finally:
+        app_dict["app"].config["MAX_UPLOAD_SIZE"] = 5 * 1024 * 1024
+    assert response.status_code == 413
+
+    assert os.listdir(upload_folder) == [".staging"]
+    assert os.listdir(upload_folder / ".staging") == []
+    assert User.query.get(test_user.user_id).profile_picture is None
+
+
+# Test that the resized variants are generated off the request thread
+def test_generate_variants(app_dict, upload_folder):
+    content = make_image(size=(800, 600), format="JPEG")
+    file = FileStorage(io.BytesIO(content), filename="avatar.jpg")
+
+    with app_dict["app"].test_request_context():
+        key, future = save_profile_picture(file)
+    future.result(timeout=10)
+
+    root = key.rsplit(".", 1)[0]
+    with Image.open(upload_folder / f"{root}_small.jpg") as image:
+        assert image.size == (64, 48)
+    with Image.open(upload_folder / f"{root}_medium.jpg") as image:
+        assert image.size == (256, 192)
+
+    # Uploading the same picture again reuses the stored files
+    file = FileStorage(io.BytesIO(content), filename="copy.jpg")
+    with app_dict["app"].test_request_context():
+        assert save_profile_picture(file) == (key, None)
+
+
+# Test that responses reference the small variant, which falls back to the
+# original until it is generated
+def test_small_variant_url(client, test_user, upload_folder):
+    content = make_image()
+    key = f"{hashlib.sha256(content).hexdigest()}.png"
+    (upload_folder / key).write_bytes(content)
+    User.query.get(test_user.user_id).profile_picture = key
+    db.session.commit()
+
+    client.post("/api/posts/", json={"article_link": "http://example.com/article"})
+    response = client.get("/api/posts/feed")
+    url = response.json["data"]["posts"][0]["user"]["profile_picture"]
+    assert url == f"/user/uploads/{key.replace('.png', '_small.png')}"
+
+    response = client.get(f"/api{url}")
+    assert response.status_code == 200
+    assert response.data == content
+    assert response.cache_control.max_age == VARIANT_PENDING_MAX_AGE
+    assert not response.cache_control.immutable
+
+    response = client.get("/api/user/uploads/missing_small.png")
+    assert response.status_code == 404
+
+
+# Test that pictures stored under their uploaded name, before they were
+# hashed and resized, keep working
+def test_legacy_picture_url(client, test_user, upload_folder):
+    content = make_image()
+    (upload_folder / "avatar.png").write_bytes(content)
+    User.query.get(test_user.user_id).profile_picture = "avatar.png"
+    db.session.commit()
+
+    client.post("/api/posts/", json={"article_link": "http://example.com/article"})
+    response = client.get("/api/posts/feed")
+    url = response.json["data"]["posts"][0]["user"]["profile_picture"]
+    assert url == "/user/uploads/avatar.png"
+    response = client.get("/api/user/testuser")
+    assert response.json["data"]["profile_picture"] == url
+
+    response = client.get(f"/api{url}")
+    assert response.status_code == 200
+    assert response.data == content
+
+
+# Test that content-addressed pictures are cacheable forever, with ETag and
+# Range support
+def test_uploads_cache_headers(client, test_user, upload_folder):
+    content = make_image()
+    upload(client, content)
+    digest = hashlib.sha256(content).hexdigest()
+    url = f"/api/user/uploads/{digest}.png"
+
+    response = client.get(url)
+    assert response.status_code == 200
+    assert response.cache_control.max_age == IMMUTABLE_MAX_AGE
+    assert response.cache_control.immutable
+    assert response.cache_control.public
+    assert response.get_etag() == (digest, False)
+
+    response = client.get(url, headers={"If-None-Match": f'"{digest}"'})
+    assert response.status_code == 304
+
+    response = client.get(url, headers={"Range": "bytes=0-9"})
+    assert response.status_code == 206
+    assert response.data == content[:10]
+
+
+# Test that uploads are staged out of the served names, and that hidden files
+# aren't served
+def test_staged_uploads_not_served(client, test_user, upload_folder):
+    storage = LocalStorage(str(upload_folder))
+    assert os.path.dirname(storage.staging_dir) == str(upload_folder)
+    upload(client, make_image())
+    assert os.listdir(storage.staging_dir) == []
+
+    (upload_folder / ".upload-partial").write_bytes(b"partial")
+    (upload_folder / ".staging" / ".upload-partial").write_bytes(b"partial")
+    for name in (".upload-partial", ".staging/.upload-partial"):
+        response = client.get(f"/api/user/uploads/{name}")
+        assert response.status_code == 404
+
+
+# Test that a proxy can be asked to send the bytes with X-Accel-Redirect
+def test_uploads_accel_redirect(app_dict, client, tmp_path):
+    content = make_image()
+    key = f"{hashlib.sha256(content).hexdigest()}.png"
+    (tmp_path / key).write_bytes(content)
+
+    app = app_dict["app"]
+    previous = app.extensions["upload_storage"]
+    app.extensions["upload_storage"] = LocalStorage(
+        str(tmp_path), serve_mode="x-accel-redirect"
+    )
+    try:
+        response = client.get(f"/api/user/uploads/{key}")
+    finally:
+        app.extensions["upload_storage"] = previous
+
+    assert response.headers["X-Accel-Redirect"] == f"/protected-uploads/{key}"
+    assert response.mimetype == "image/png"
+    assert response.data == b""
+    assert response.cache_control.immutable
+
+
+# Test the object store path with its local stand-in
+def test_object_storage(app_dict, client, test_user, tmp_path):
+    app = app_dict["app"]
+    previous = app.extensions["upload_storage"]
+    app.extensions["upload_storage"] = DirectoryObjectStorage(
+        str(tmp_path), "https://cdn.example.com/avatars/"
+    )
+    try:
+        content = make_image()
+        assert upload(client, content).status_code == 200
+        key = f"{hashlib.sha256(content).hexdigest()}.png"
+        assert (tmp_path / key).read_bytes() == content
+
+        response = client.get(f"/api/user/uploads/{key}")
+        assert response.status_code == 302
+        assert response.location == f"https://cdn.example.com/avatars/{key}"
+        assert response.cache_control.immutable
+    finally:
+        app.extensions["upload_storage"] = previous
+
+
+# Test that profile reads build the URL from the DB without touching the disk
+def test_profile_does_no_filesystem_io(client, test_user, monkeypatch):
+    User.query.get(test_user.user_id).profile_picture = f"{'a' * 64}.png"
+    db.session.commit()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("filesystem access")
+
+    monkeypatch.setattr(os.path, "exists", fail)
+    monkeypatch.setattr(os.path, "isfile", fail)
+    response = client.get("/api/user/testuser")
+    monkeypatch.undo()
+
+    assert response.json["data"]["profile_picture"] == (
+        f"/user/uploads/{'a' * 64}_medium.png"
+    )
+
+
+# Test that users without a picture get null everywhere instead of a broken URL
+def test_missing_profile_picture_is_null(client, test_user):
+    response = client.get("/api/user/testuser")
+    assert response.json["data"]["profile_picture"] is None
+
+    response = client.get("/api/user/search?q=test")
+    assert response.json["data"][0]["profile_picture"] is None
+
+    response = client.post(
+        "/api/login", json={"email": "test@test.com", "password": "password123"}
+    )
+    assert response.json["data"]["profile_picture"] is None
+
+
+# Test that the profile form can clear the picture but not point it elsewhere
+def test_profile_picture_form_field(client, test_user):
+    User.query.get(test_user.user_id).profile_picture = f"{'a' * 64}.png"
+    db.session.commit()
+
+    client.put("/api/user/", data={"profile_picture": "../../etc/passwd"})
+    assert User.query.get(test_user.user_id).profile_picture == f"{'a' * 64}.png"
+
+    client.put("/api/user/", data={"profile_picture": ""})
+    assert User.query.get(test_user.user_id).profile_picture is None
+
+
+# Test that serving a picture only checks the storage the first time
+def test_known_keys(app_dict, client, upload_folder, monkeypatch):
+    content = make_image()
+    key = f"{hashlib.sha256(content).hexdigest()}.png"
+    (upload_folder / key).write_bytes(content)
+
+    storage = app_dict["app"].extensions["upload_storage"]
+    checks = []
+    _exists = storage._exists
+    monkeypatch.setattr(storage, "_exists", lambda k: checks.append(k) or _exists(k))
+
+    for _ in range(3):
+        assert client.get(f"/api/user/uploads/{key}").status_code == 200
+    assert checks == [key]
+
+
+# Test the command clearing pictures that were never stored
+def test_check_profile_pictures_command(app_dict, client, test_user, upload_folder):
+    content = make_image()
+    key = f"{hashlib.sha256(content).hexdigest()}.png"
+    (upload_folder / key).write_bytes(content)
+
+    other = User(email="o@test.com", username="other", password="x")
+    other.profile_picture = "base64_encoded_image"
+    User.query.get(test_user.user_id).profile_picture = key
+    db.session.add(other)
+    db.session.commit()
+
+    runner = app_dict["app"].test_cli_runner()
+    result = runner.invoke(args=["uploads", "check-profile-pictures"])
+    assert "Cleared 1 missing profile pictures" in result.output
+    assert User.query.get(test_user.user_id).profile_picture == key
+    assert User.query.get(other.user_id).profile_picture is None
@@ -1,6 +1,8 @@
 import pytest
 from .. import db
-from ..models import User, Follow
+from ..models import User, Follow, UserStats
+from ..stats import repair_user_stats
+from datetime import datetime, timedelta
 
 
 def test_get_profile_authenticated(client):
@@ -33,9 +35,11 @@ def test_update_profile(client, test_user):
     assert updated_user.bio_description == "New bio description"
 
 
-def test_delete_account(client, test_user):
+def test_delete_account(app_dict, client, test_user, monkeypatch):
+    monkeypatch.setitem(app_dict["app"].config, "ACCOUNT_DELETION_WORKERS", 0)
     response = client.delete("/api/user/")
-    assert response.status_code == 200
+    assert response.status_code == 202
+    assert response.json["data"]["status"] == "completed"
 
     # Verify user is deleted
     deleted_user = User.query.get(test_user.user_id)
@@ -183,3 +187,106 @@ def test_search_users(client, test_user):
 
     assert response2.status_code == 200
     assert len(response2.json["data"]) == 1
+
+
+# Test that follower lists are paginated with a cursor, newest first
+def test_get_followers_pages(client, test_user):
+    users = [
+        User(email=f"fan{i}@test.com", password="test123", username=f"fan{i}")
+        for i in range(5)
+    ]
+    db.session.add_all(users)
+    db.session.commit()
+    for i, user in enumerate(users):
+        db.session.add(
+            Follow(
+                follower_id=user.user_id,
+                user_id=test_user.user_id,
+                followed_at=datetime(2024, 1, 1) + timedelta(minutes=i),
+            )
+        )
+    db.session.commit()
+    # The follows bypassed the endpoints, recount
+    repair_user_stats()
+
+    usernames = []
+    cursor = None
+    while True:
+        url = f"/api/user/{test_user.user_id}/followers?limit=2"
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        assert response.status_code == 200
+        assert response.json["data"]["total"] == 5
+        usernames += [user["username"] for user in response.json["data"]["followers"]]
+        cursor = response.json["data"]["next_cursor"]
+        if cursor is None:
+            break
+
+    assert usernames == ["fan4", "fan3", "fan2", "fan1", "fan0"]
+
+    response = client.get(f"/api/user/{users[0].user_id}/following")
+    assert response.json["data"]["following"][0]["username"] == "testuser"
+    assert response.json["data"]["total"] == 1
+
+
+# Test follower lists of unknown users and with a bad cursor
+def test_get_followers_errors(client, test_user):
+    response = client.get("/api/user/99999/followers")
+    assert response.status_code == 404
+
+    response = client.get(f"/api/user/{test_user.user_id}/followers")
+    assert response.status_code == 200
+    assert response.json["data"] == {"followers": [], "total": 0, "next_cursor": None}
+
+    response = client.get(f"/api/user/{test_user.user_id}/followers?cursor=garbage")
+    assert response.status_code == 400
+
+
+# Test that following and unfollowing keep the counts on the profile in step
+def test_follow_counts(client, test_user):
+    other_user = User(email="other@test.com", password="test123", username="other_user")
+    db.session.add(other_user)
+    db.session.commit()
+
+    client.post(f"/api/user/follow/{other_user.user_id}")
+    response = client.get("/api/user/other_user")
+    assert response.json["data"]["followers_count"] == 1
+    assert response.json["data"]["following_count"] == 0
+    response = client.get("/api/user/testuser")
+    assert response.json["data"]["following_count"] == 1
+
+    client.post(f"/api/user/unfollow/{other_user.user_id}")
+    response = client.get("/api/user/other_user")
+    assert response.json["data"]["followers_count"] == 0
+
+
+# Test that deleting an account removes it from the counts of others
+def test_delete_account_updates_counts(app_dict, client, test_user, monkeypatch):
+    monkeypatch.setitem(app_dict["app"].config, "ACCOUNT_DELETION_WORKERS", 0)
+    other_user = User(email="other@test.com", password="test123", username="other_user")
+    db.session.add(other_user)
+    db.session.commit()
+    client.post(f"/api/user/follow/{other_user.user_id}")
+
+    client.delete("/api/user/")
+    assert UserStats.query.get(other_user.user_id).followers_count == 0
+    assert UserStats.query.get(test_user.user_id) is None
+
+
+# Test that the repair job recounts drifted counts
+def test_repair_user_stats(app_dict, client, test_user):
+    other_user = User(email="other@test.com", password="test123", username="other_user")
+    db.session.add(other_user)
+    db.session.commit()
+    db.session.add(Follow(follower_id=other_user.user_id, user_id=test_user.user_id))
+    db.session.add(UserStats(user_id=other_user.user_id, followers_count=7))
+    db.session.commit()
+
+    runner = app_dict["app"].test_cli_runner()
+    result = runner.invoke(args=["repair-user-stats", "--batch-size", "1"])
+    assert "Fixed the counts of 2 users" in result.output
+
+    db.session.expire_all()
+    assert UserStats.query.get(test_user.user_id).followers_count == 1
+    assert UserStats.query.get(other_user.user_id).followers_count == 0
+    assert UserStats.query.get(other_user.user_id).following_count == 1
+    assert repair_user_stats() == 0
@@ -0,0 +1,202 @@
+import hashlib
+import io
+import logging
+import os
+import re
+import tempfile
+import threading
+import click
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from flask.cli import AppGroup
+from PIL import Image, UnidentifiedImageError
+from sqlalchemy import select
+from . import db
+from .config import Config
+from .models import User
+from .storage import create_storage, get_storage
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 64 * 1024
+
+# Cache lifetime of an original served in place of a variant not resized yet
+VARIANT_PENDING_MAX_AGE = 60
+
+# Pillow format -> extension of the stored file
+IMAGE_FORMATS = {"PNG": "png", "JPEG": "jpg", "GIF": "gif"}
+
+# <sha256>_<variant>.<ext>, the name of a resized copy
+VARIANT_NAME = re.compile(
+    r"^(?P<root>[0-9a-f]{64})_(?P<variant>[a-z]+)(?P<ext>\.[a-z]+)$"
+)
+
+# <sha256>.<ext>, the name of an original stored since pictures are hashed.
+# Older pictures kept their uploaded name and have no resized copies.
+HASHED_NAME = re.compile(r"^[0-9a-f]{64}\.[a-z]+$")
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class UploadError(Exception):
+    def __init__(self, message, status_code=400):
+        super().__init__(message)
+        self.message = message
+        self.status_code = status_code
+
+
+def _get_executor():
+    # Created on first use so that forked workers don't share the threads
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=current_app.config["UPLOAD_WORKERS"],
+                thread_name_prefix="thumbnails",
+            )
+        return _executor
+
+
+def variant_name(key, variant):
+    root, ext = os.path.splitext(key)
+    return f"{root}_{variant}{ext}"
+
+
+def original_name(filename):
+    """Return the file a variant name was resized from, or None."""
+    match = VARIANT_NAME.match(filename)
+    if not match or match.group("variant") not in current_app.config["THUMBNAIL_SIZES"]:
+        return None
+    return f"{match.group('root')}{match.group('ext')}"
+
+
+def profile_picture_url(key, variant=None):
+    """
+    URL of a stored profile picture, or of one of its resized variants.
+    Pictures stored under their uploaded name are only served as they are.
+    """
+    if not key:
+        return None
+    filename = variant_name(key, variant) if variant and HASHED_NAME.match(key) else key
+    return f"/user/uploads/{filename}"
+
+
+def _stream_to_temp(stream, folder, max_size):
+    """Copy stream to a temporary file in folder, hashing it on the way."""
+    digest = hashlib.sha256()
+    size = 0
+    temp = tempfile.NamedTemporaryFile(dir=folder, prefix=".upload-", delete=False)
+    try:
+        with temp:
+            while chunk := stream.read(CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadError(
+                        f"File is larger than {max_size // 1024} KB", status_code=413
+                    )
+                digest.update(chunk)
+                temp.write(chunk)
+    except BaseException:
+        os.remove(temp.name)
+        raise
+    return temp.name, digest.hexdigest()
+
+
+def _image_extension(path):
+    # Only reads the header, the pixels are decoded by the thumbnail workers
+    try:
+        with Image.open(path) as image:
+            return IMAGE_FORMATS.get(image.format)
+    except (UnidentifiedImageError, OSError):
+        return None
+
+
+def generate_variants(storage, key, sizes):
+    """Store a resized copy of the picture key for each of sizes."""
+    try:
+        with storage.open(key) as f, Image.open(f) as image:
+            for variant, size in sizes.items():
+                thumbnail = image.copy()
+                thumbnail.thumbnail(size)
+                buffer = io.BytesIO()
+                thumbnail.save(buffer, format=image.format)
+                buffer.seek(0)
+                storage.save(variant_name(key, variant), buffer)
+    except Exception:
+        logger.exception("Failed to resize %s", key)
+        raise
+
+
+def save_profile_picture(file):
+    """
+    Store an uploaded picture under the hash of its content and queue the
+    resized variants. Returns the stored file name and the future of the
+    resizing, None when the same picture was already stored.
+    """
+    storage = get_storage()
+    os.makedirs(storage.staging_dir, exist_ok=True)
+
+    temp_path, digest = _stream_to_temp(
+        file.stream, storage.staging_dir, current_app.config["MAX_UPLOAD_SIZE"]
+    )
+    try:
+        extension = _image_extension(temp_path)
+        if extension is None:
+            raise UploadError("File must be a PNG, JPEG or GIF image")
+
+        key = f"{digest}.{extension}"
+        if storage.exists(key):
+            return key, None
+        storage.save_file(key, temp_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+    future = _get_executor().submit(
+        generate_variants, storage, key, current_app.config["THUMBNAIL_SIZES"]
+    )
+    return key, future
+
+
+uploads_cli = AppGroup("uploads", help="Manage uploaded files.")
+
+
+@uploads_cli.command("check-profile-pictures")
+def check_profile_pictures_command():
+    """Clear profile pictures whose file is missing from the storage."""
+    storage = get_storage()
+    keys = db.session.execute(
+        select(User.profile_picture).where(User.profile_picture.isnot(None)).distinct()
+    ).scalars()
+    missing = [key for key in keys if not storage.exists(key)]
+
+    if missing:
+        User.query.filter(User.profile_picture.in_(missing)).update(
+            {User.profile_picture: None}, synchronize_session=False
+        )
+        db.session.commit()
+    click.echo(f"Cleared {len(missing)} missing profile pictures")
+
+
+def init_app(app):
+    app.config.setdefault("UPLOAD_FOLDER", Config.UPLOAD_FOLDER)
+    app.config.setdefault("MAX_UPLOAD_SIZE", Config.MAX_UPLOAD_SIZE)
+    app.config.setdefault("THUMBNAIL_SIZES", Config.THUMBNAIL_SIZES)
+    app.config.setdefault("UPLOAD_WORKERS", Config.UPLOAD_WORKERS)
+    for name in (
+        "UPLOAD_STORAGE",
+        "UPLOAD_SERVE_MODE",
+        "UPLOAD_ACCEL_PREFIX",
+        "UPLOAD_PUBLIC_URL",
+        "UPLOAD_S3_BUCKET",
+        "UPLOAD_S3_ENDPOINT_URL",
+        "UPLOAD_S3_PREFIX",
+    ):
+        app.config.setdefault(name, getattr(Config, name))
+    if app.config["UPLOAD_SERVE_MODE"] == "x-sendfile":
+        app.config["USE_X_SENDFILE"] = True
+    app.extensions["upload_storage"] = create_storage(app.config)
+    app.cli.add_command(uploads_cli)
+    # Refuse bodies well over the limit before Werkzeug spools them to disk
+    app.config.setdefault("MAX_CONTENT_LENGTH", app.config["MAX_UPLOAD_SIZE"] * 2)
@@ -1,17 +1,32 @@
-from flask import request, send_from_directory
+from flask import request
 from flask_restx import Namespace, Resource, fields
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func, select, tuple_
 from sqlalchemy.exc import SQLAlchemyError
+from datetime import datetime
+import base64
 import json
-import os
-from werkzeug.utils import secure_filename
+import logging
 from .utils import create_success_response, create_error_response
 from .config import Config
+from .storage import IMMUTABLE_MAX_AGE, get_storage
+from .uploads import (
+    VARIANT_PENDING_MAX_AGE,
+    UploadError,
+    original_name,
+    profile_picture_url,
+    save_profile_picture,
+)
 from . import db
-from .models import User, Follow
+from .cache import get_cache
+from .models import AccountDeletion, User, Follow, UserStats
+from .deletion import request_account_deletion
+from .stats import adjust_follow_counts
 
 api = Namespace("users", description="User related operations")
 
+logger = logging.getLogger(__name__)
+
 user_model = api.model(
     "User",
     {
@@ -33,11 +48,6 @@ user_model = api.model(
 )
 
 
-UPLOAD_FOLDER = Config.UPLOAD_FOLDER
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-
-
 # Helper function for allowed file extensions
 def allowed_file(filename):
     return (
@@ -50,7 +60,65 @@ def allowed_file(filename):
 @api.route("/uploads/<path:filename>")
 class Uploads(Resource):
     def get(self, filename):
-        return send_from_directory(Config.UPLOAD_FOLDER, filename)
+        # Uploads being staged, and any other hidden file, aren't served
+        if any(part.startswith(".") for part in filename.split("/")):
+            return create_error_response("File not found", status_code=404)
+        storage = get_storage()
+        if storage.exists(filename):
+            return storage.send(filename, IMMUTABLE_MAX_AGE, immutable=True)
+
+        # Resized variants are written shortly after the upload, send the
+        # original meanwhile, without letting it be cached for long
+        original = original_name(filename)
+        if original is None or not storage.exists(original):
+            return create_error_response("File not found", status_code=404)
+        return storage.send(original, VARIANT_PENDING_MAX_AGE)
+
+
+# Profiles are invalidated when the user changes them, follows or is
+# followed, and when their account is deleted
+PROFILE_TTL = 60
+
+
+def load_profile(username):
+    row = (
+        db.session.query(
+            User,
+            func.coalesce(UserStats.followers_count, 0),
+            func.coalesce(UserStats.following_count, 0),
+        )
+        .outerjoin(UserStats)
+        .filter(User.username == username)
+        .first()
+    )
+    if not row:
+        return None
+    user, followers_count, following_count = row
+
+    return {
+        "user_id": user.user_id,
+        "username": user.username,
+        "email": user.email,
+        "bio_description": user.bio_description,
+        "profile_picture": profile_picture_url(user.profile_picture, "medium"),
+        "followers_count": followers_count,
+        "following_count": following_count,
+        "tags": json.loads(user.tags) if user.tags else [],
+        "created_at": user.created_at,
+    }
+
+
+def user_profile(username):
+    """
+    The cached profile of username as seen by any viewer, or None when there
+    is no such user. Concurrent requests for a popular profile share one load.
+    """
+    return get_cache().get_or_set(
+        f"profile:{username}",
+        lambda: load_profile(username),
+        PROFILE_TTL,
+        tags=lambda profile: [f"user:{profile['user_id']}"],
+    )
 
 
 # Get (view) user's profile
@@ -62,34 +130,13 @@ class GetUserProfile(Resource):
         """Get user profile"""
 
         try:
-            current_user_id = int(get_jwt_identity())
-            user = User.query.filter_by(username=username).first()
-
-            if not user:
+            profile = user_profile(username)
+            if profile is None:
                 return create_error_response("User not found", status_code=404)
 
             # Determine if the logged-in user is the profile owner
-            is_owner = current_user_id == user.user_id
-
-            # Create the profile picture URL
-            profile_picture_url = None
-            if user.profile_picture:
-                profile_picture_path = os.path.join(UPLOAD_FOLDER, user.profile_picture)
-                if os.path.exists(profile_picture_path):
-                    profile_picture_url = f"/user/uploads/{user.profile_picture}"
-
-            tags = json.loads(user.tags) if user.tags else []
-
-            user_data = {
-                "user_id": user.user_id,
-                "username": user.username,
-                "email": user.email,
-                "bio_description": user.bio_description,
-                "profile_picture": profile_picture_url,
-                "tags": tags,
-                "created_at": user.created_at,
-                "is_owner": is_owner,
-            }
+            is_owner = int(get_jwt_identity()) == profile["user_id"]
+            user_data = dict(profile, is_owner=is_owner)
             return create_success_response(
                 "User profile fetched successfully", status_code=200, data=user_data
             )
@@ -139,28 +186,28 @@ class ModifyUserProfile(Resource):
 
             # Profile Picture Upload
             if file and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                file.save(os.path.join(UPLOAD_FOLDER, filename))
-                user.profile_picture = filename
+                user.profile_picture, _ = save_profile_picture(file)
 
             # Updating user fields
             user.username = new_username
             user.bio_description = (
                 data.get("bio_description", user.bio_description) or None
             )
-            user.profile_picture = (
-                data.get("profile_picture", user.profile_picture) or None
-            )
+            # Pictures are only set by uploading a file, the form field can
+            # only remove the current one
+            if "profile_picture" in data and not data["profile_picture"]:
+                user.profile_picture = None
             tags = data.get("tags", "[]") or "[]"  # Default to an empty list
             user.tags = json.dumps(json.loads(tags))  # Ensure JSON format
             db.session.commit()
+            get_cache().invalidate_tags(f"user:{current_user_id}")
 
             updated_user_data = {
                 "user_id": user.user_id,
                 "username": user.username,
                 "email": user.email,
                 "bio_description": user.bio_description,
-                "profile_picture": f"/user/uploads/{user.profile_picture}",  # Return relative URL
+                "profile_picture": profile_picture_url(user.profile_picture, "medium"),
                 "created_at": user.created_at,
             }
 
@@ -168,6 +215,9 @@ class ModifyUserProfile(Resource):
                 "Profile updated successfully", status_code=200, data=updated_user_data
             )
 
+        except UploadError as e:
+            return create_error_response(e.message, status_code=e.status_code)
+
         except SQLAlchemyError as e:
             db.session.rollback()
             return create_error_response(
@@ -175,9 +225,7 @@ class ModifyUserProfile(Resource):
             )
 
         except Exception as e:
-            import traceback
-
-            traceback.print_exc()
+            logger.exception("Failed to update profile of user %s", get_jwt_identity())
             return create_error_response(
                 "An unexpected error occurred", status_code=500, details=str(e)
             )
@@ -195,12 +243,13 @@ class ModifyUserProfile(Resource):
             if not user:
                 return create_error_response("User not found", status_code=404)
 
-            # Deleting the user from the database
-            db.session.delete(user)
-            db.session.commit()
+            # Disables the account now, its data is deleted in the background
+            job, _ = request_account_deletion(user.user_id)
 
             return create_success_response(
-                "User account deleted successfully", status_code=200
+                "User account deletion started",
+                status_code=202,
+                data=deletion_status(job),
             )
 
         except SQLAlchemyError as e:
@@ -215,6 +264,42 @@ class ModifyUserProfile(Resource):
             )
 
 
+def deletion_status(job):
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "step": job.step,
+        "deleted_rows": job.deleted_rows,
+        "requested_at": job.requested_at.isoformat(),
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "status_url": f"/user/deletions/{job.job_id}",
+    }
+
+
+# Progress of an account deletion. Not authenticated: the account's tokens
+# stop working as soon as the deletion is requested, the job id is the secret.
+@api.route("/deletions/<string:job_id>")
+class AccountDeletionStatus(Resource):
+    def get(self, job_id):
+        """Get the progress of an account deletion"""
+
+        try:
+            job = db.session.get(AccountDeletion, job_id)
+            if not job:
+                return create_error_response("Deletion not found", status_code=404)
+
+            return create_success_response(
+                "Account deletion status fetched successfully",
+                status_code=200,
+                data=deletion_status(job),
+            )
+
+        except SQLAlchemyError as e:
+            return create_error_response(
+                "Database error occurred", status_code=500, details=str(e)
+            )
+
+
 # Follow user route
 @api.route("/follow/<int:user_id>")
 class FollowUser(Resource):
@@ -249,7 +334,10 @@ class FollowUser(Resource):
             # Create a new follow relationship
             new_follow = Follow(follower_id=current_user_id, user_id=user_id)
             db.session.add(new_follow)
+            db.session.flush()
+            adjust_follow_counts(current_user_id, user_id, 1)
             db.session.commit()
+            get_cache().invalidate_tags(f"user:{current_user_id}", f"user:{user_id}")
 
             return create_success_response(
                 "Successfully followed the user", status_code=200
@@ -301,7 +389,10 @@ class UnfollowUser(Resource):
 
             # Remove the follow relationship
             db.session.delete(existing_follow)
+            db.session.flush()
+            adjust_follow_counts(current_user_id, user_id, -1)
             db.session.commit()
+            get_cache().invalidate_tags(f"user:{current_user_id}", f"user:{user_id}")
 
             return create_success_response(
                 "Successfully unfollowed the user", status_code=200
@@ -320,6 +411,137 @@ class UnfollowUser(Resource):
             )
 
 
+# Columns for each list: (Follow column of the profile's user, Follow column
+# of the listed users, count in UserStats)
+FOLLOW_LISTS = {
+    "followers": (Follow.user_id, Follow.follower_id, UserStats.followers_count),
+    "following": (Follow.follower_id, Follow.user_id, UserStats.following_count),
+}
+
+
+def encode_cursor(followed_at, user_id):
+    raw = json.dumps([followed_at.isoformat(), user_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return the (followed_at, user_id) position of a cursor, or None if invalid."""
+    try:
+        followed_at, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(followed_at), int(user_id)
+    except (ValueError, TypeError):
+        return None
+
+
+def follow_page(user_id, list_name, position, limit):
+    """
+    Return (total, rows, next position) for a page of a user's followers or
+    followings, newest first, starting after position. The total is None if
+    the user doesn't exist. One query, two when the page is empty.
+    """
+    owner_column, listed_column, count_column = FOLLOW_LISTS[list_name]
+    total = func.coalesce(
+        select(count_column).where(UserStats.user_id == user_id).scalar_subquery(), 0
+    )
+    query = (
+        db.session.query(
+            listed_column.label("user_id"),
+            User.username,
+            User.profile_picture,
+            Follow.followed_at,
+            total.label("total"),
+        )
+        .join(User, User.user_id == listed_column)
+        .filter(owner_column == user_id)
+        .order_by(Follow.followed_at.desc(), listed_column.desc())
+    )
+    if position:
+        query = query.filter(tuple_(Follow.followed_at, listed_column) < position)
+
+    # One extra row tells whether there is a next page
+    rows = query.limit(limit + 1).all()
+    next_position = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_position = (rows[-1].followed_at, rows[-1].user_id)
+
+    if rows:
+        return rows[0].total, rows, next_position
+
+    # Past the last page there is no row to read the total from
+    user = (
+        db.session.query(func.coalesce(count_column, 0))
+        .select_from(User)
+        .outerjoin(UserStats)
+        .filter(User.user_id == user_id)
+        .first()
+    )
+    return (user[0] if user else None), rows, next_position
+
+
+def follow_list_response(user_id, list_name):
+    position = None
+    cursor = request.args.get("cursor")
+    if cursor:
+        position = decode_cursor(cursor)
+        if position is None:
+            return create_error_response("Invalid cursor", status_code=400)
+    limit = min(max(request.args.get("limit", 20, type=int), 1), 100)
+
+    total, rows, next_position = follow_page(user_id, list_name, position, limit)
+    if total is None:
+        return create_error_response("User not found", status_code=404)
+
+    return create_success_response(
+        f"Got {list_name} successfully",
+        status_code=200,
+        data={
+            list_name: [
+                {
+                    "user_id": row.user_id,
+                    "username": row.username,
+                    "profile_picture": profile_picture_url(
+                        row.profile_picture, "small"
+                    ),
+                }
+                for row in rows
+            ],
+            "total": total,
+            "next_cursor": encode_cursor(*next_position) if next_position else None,
+        },
+    )
+
+
+# Paginated list of a user's followers
+@api.route("/<int:user_id>/followers")
+class UserFollowers(Resource):
+    @api.doc(security="Bearer Auth")
+    @api.expect(
+        api.parser()
+        .add_argument("cursor", type=str, location="args")
+        .add_argument("limit", type=int, location="args")
+    )
+    @jwt_required()
+    def get(self, user_id):
+        """Get a page of the users following a user"""
+        return follow_list_response(user_id, "followers")
+
+
+# Paginated list of the users a user follows
+@api.route("/<int:user_id>/following")
+class UserFollowing(Resource):
+    @api.doc(security="Bearer Auth")
+    @api.expect(
+        api.parser()
+        .add_argument("cursor", type=str, location="args")
+        .add_argument("limit", type=int, location="args")
+    )
+    @jwt_required()
+    def get(self, user_id):
+        """Get a page of the users a user follows"""
+        return follow_list_response(user_id, "following")
+
+
 # Get list of users the current user is following
 @api.route("/following")
 class GetFollowedUsers(Resource):
@@ -328,11 +550,11 @@ class GetFollowedUsers(Resource):
     def get(self):
         """Get list of users the current user is following"""
 
-        current_user = User.query.get(int(get_jwt_identity()))
-
         followed_users = [
-            {"id": follow.user_id, "username": follow.followed_user.username}
-            for follow in current_user.followings
+            {"id": user_id, "username": username}
+            for user_id, username in db.session.query(Follow.user_id, User.username)
+            .join(User, User.user_id == Follow.user_id)
+            .filter(Follow.follower_id == int(get_jwt_identity()))
         ]
 
         return create_success_response(
@@ -350,11 +572,13 @@ class GetFollowers(Resource):
     def get(self):
         """Get list of users following the current user"""
 
-        current_user = User.query.get(int(get_jwt_identity()))
-
         followers = [
-            {"id": follow.follower_id, "username": follow.following_user.username}
-            for follow in current_user.followers
+            {"id": follower_id, "username": username}
+            for follower_id, username in db.session.query(
+                Follow.follower_id, User.username
+            )
+            .join(User, User.user_id == Follow.follower_id)
+            .filter(Follow.user_id == int(get_jwt_identity()))
         ]
         return create_success_response(
             "Got list of users successfully",
@@ -386,7 +610,9 @@ class SearchUsers(Resource):
                 {
                     "user_id": user.user_id,
                     "username": user.username,
-                    "profile_picture": f"/user/uploads/{user.profile_picture}",
+                    "profile_picture": profile_picture_url(
+                        user.profile_picture, "small"
+                    ),
                     "bio_description": user.bio_description,
                 }
                 for user in users
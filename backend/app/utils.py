@@ -1,41 +1,75 @@
-import requests
-from bs4 import BeautifulSoup
+import hashlib
+import json
 from datetime import datetime, timedelta, timezone
-from flask_jwt_extended import get_jwt_identity
-from flask import jsonify, make_response
+from flask import Response, jsonify, make_response, request
+from sqlalchemy import or_
+from sqlalchemy.dialects import postgresql, sqlite
+from . import db
+from .models import Post
 
 
-def check_post_24h(post):
+def post_is_visible(user_id):
+    """
+    SQL predicate for the 24h rule: users see their own posts forever and other
+    users' posts for 24 hours. Use it as a filter, or select it as a column to
+    tell "hidden" apart from "not found" in the same round trip.
+
+    Args:
+        user_id (int): The viewer, None for unauthenticated requests.
+    """
     time_threshold = datetime.now(timezone.utc) - timedelta(hours=24)
 
-    # Remove the timezone because SQLite datetime isn't timezone-aware
-    # time_threshold_naive = time_threshold.replace(tzinfo=None)
+    # Comparing in SQL sidesteps SQLite returning timezone-naive datetimes
+    if user_id is None:
+        return Post.posted_at >= time_threshold
+    return or_(Post.user_id == user_id, Post.posted_at >= time_threshold)
 
-    # Some unauthenticated endpoints still use this function, so we need handle the case where there is no identity
 
-    try:
-        user_id = int(get_jwt_identity())
-    except:
-        user_id = None
+def post_visibility(post_id, user_id):
+    """
+    Check a post's visibility in one query.
+
+    Returns:
+        bool or None: None if the post does not exist, otherwise whether the
+        user is allowed to see it.
+    """
+    return (
+        db.session.query(post_is_visible(user_id))
+        .filter(Post.post_id == post_id)
+        .scalar()
+    )
 
-    # Using timezone-aware datetime objects since deployment is done in Postgres
-    return user_id != post.user_id and post.posted_at < time_threshold
+
+def dialect_insert(model):
+    """
+    INSERT for the current database, with ON CONFLICT support (both Postgres
+    and SQLite have it, the generic insert doesn't).
+    """
+    if db.session.get_bind().dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
 
 
 # ChatGPT-generated function to parse OpenGraph tags from HTML content
-def parse_opengraph_tags(url):
+def parse_opengraph_tags(url, timeout=None):
     """
     Fetch HTML content from the given URL, then extract OpenGraph tags from
     the HTML content.
 
     Args:
-        html_content (str): The HTML content as a string.
+        url (str): The page to fetch.
+        timeout (float, optional): Seconds to wait for the page to connect and
+            for each read, None waits forever.
 
     Returns:
         dict: A dictionary containing the OpenGraph tags and their values.
     """
+    # Only needed here, importing them lazily keeps them out of app startup
+    import requests
+    from bs4 import BeautifulSoup
+
     # Fetch the HTML content of the page
-    response = requests.get(url)
+    response = requests.get(url, timeout=timeout)
     response.raise_for_status()  # Raise an error for bad responses (4xx or 5xx)
 
     # Parse HTML with BeautifulSoup
@@ -70,6 +104,35 @@ def create_success_response(message, status_code=200, data=None):
     )
 
 
+class PrecomputedResponse:
+    """
+    A success response for data that only changes with a deploy, such as the
+    post categories. The body is encoded once, when the app starts, with a
+    strong ETag, so serving it needs no database or JSON work and clients
+    revalidate with If-None-Match.
+
+    Args:
+        message (str): A message describing the success.
+        data (dict): The data of the response.
+        max_age (int, optional): Seconds clients may reuse it. Defaults to a day.
+    """
+
+    def __init__(self, message, data, max_age=86400):
+        self.body = json.dumps(
+            {"status": "success", "message": message, "data": data},
+            separators=(",", ":"),
+        ).encode()
+        self.etag = hashlib.sha256(self.body).hexdigest()
+        self.max_age = max_age
+
+    def response(self):
+        response = Response(self.body, mimetype="application/json")
+        response.set_etag(self.etag)
+        response.cache_control.public = True
+        response.cache_control.max_age = self.max_age
+        return response.make_conditional(request)
+
+
 # Utility function for consistent error handling
 def create_error_response(message, status_code=400, details=None):
     """
@@ -0,0 +1,81 @@
+"""Time a cold start of the app: imports, create_app and the first requests.
+
+Every run is a fresh interpreter, so nothing is imported or cached yet. It
+records the time to import the app package, to create the app, and the
+latency of the first request without a query (the categories) and of the
+first one reading the database (a failed login).
+
+    python -m benchmarks.coldstart --runs 20
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from .common import BACKEND_DIR, summarize, write_results
+
+PHASES = ("import", "create_app", "first_request", "first_db_request")
+
+# Runs in the fresh interpreter, prints the phase timings as JSON
+RUN = """
+import json, time
+start = time.perf_counter()
+from app import create_app, db
+imported = time.perf_counter()
+app = create_app({"SQLALCHEMY_DATABASE_URI": %(database_uri)r})
+created = time.perf_counter()
+client = app.test_client()
+client.get("/api/posts/categories")
+first = time.perf_counter()
+client.post("/api/login", json={"email": "nobody@bench.test", "password": "x"})
+first_db = time.perf_counter()
+print(json.dumps({
+    "import": imported - start,
+    "create_app": created - imported,
+    "first_request": first - created,
+    "first_db_request": first_db - first,
+}))
+"""
+
+
+def cold_start(database_uri):
+    output = subprocess.check_output(
+        [sys.executable, "-c", RUN % {"database_uri": database_uri}],
+        cwd=BACKEND_DIR,
+        stderr=subprocess.DEVNULL,
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--output-dir", help="Defaults to benchmarks/results")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = f"sqlite:///{os.path.join(directory, 'coldstart.sqlite')}"
+        # The schema is created once, like a deploy running the migrations
+        subprocess.check_call(
+            [sys.executable, "-c",
+             f"from app import create_app, db\n"
+             f"app = create_app({{'SQLALCHEMY_DATABASE_URI': {database_uri!r}}})\n"
+             f"with app.app_context(): db.create_all()"],
+            cwd=BACKEND_DIR,
+            stderr=subprocess.DEVNULL,
+        )
+        runs = [cold_start(database_uri) for _ in range(args.runs)]
+
+    results = {phase: summarize([run[phase] for run in runs]) for phase in PHASES}
+    results["total"] = summarize([sum(run.values()) for run in runs])
+    for name, summary in results.items():
+        print(f"{name:>16}: p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms")
+
+    path = write_results("coldstart", vars(args), results, args.output_dir)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""Shared helpers for the benchmark scripts.
+
+Run the scripts from the backend directory, e.g. ``python -m benchmarks.load``.
+"""
+
+import json
+import logging
+import os
+import socket
+import subprocess
+import sys
+import threading
+import time
+import requests
+from datetime import datetime, timezone
+from werkzeug.serving import make_server
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BACKEND_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+DEFAULT_DATABASE_URI = f"sqlite:///{os.path.join(BENCH_DIR, 'bench.sqlite')}"
+
+
+def create_bench_app(database_uri=None):
+    """Create the real app pointed at the benchmark database."""
+    from app import create_app
+
+    return create_app(
+        {"SQLALCHEMY_DATABASE_URI": database_uri or DEFAULT_DATABASE_URI}
+    )
+
+
+class ServerThread:
+    """Serve a WSGI app on a local port from a background thread."""
+
+    def __init__(self, app, host="127.0.0.1", port=0):
+        # Access logs would dominate the client-side timings
+        logging.getLogger("werkzeug").setLevel(logging.WARNING)
+        self.server = make_server(host, port, app, threaded=True)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://{self.server.host}:{self.server.port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.thread.join()
+
+
+def free_port(host="127.0.0.1"):
+    with socket.socket() as sock:
+        sock.bind((host, 0))
+        return sock.getsockname()[1]
+
+
+class GunicornServer:
+    """
+    Serve the benchmark app with gunicorn and gunicorn.conf.py in a
+    subprocess. args are extra command line options, env extra environment.
+    """
+
+    def __init__(self, args=(), env=None, database_uri=None, host="127.0.0.1"):
+        self.host, self.port = host, free_port(host)
+        app = f"benchmarks.common:create_bench_app({database_uri!r})"
+        self.command = [
+            sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py",
+            "--bind", f"{self.host}:{self.port}", "--log-level", "warning",
+            *args, app,
+        ]
+        self.env = {**os.environ, **(env or {})}
+        self.process = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def __enter__(self):
+        self.process = subprocess.Popen(self.command, cwd=BACKEND_DIR, env=self.env)
+        deadline = time.monotonic() + 60
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f"gunicorn exited with {self.process.returncode}")
+            try:
+                requests.get(f"{self.base_url}/api/posts/categories", timeout=5)
+                return self
+            except requests.RequestException:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError("gunicorn did not start within 60 seconds")
+
+    def __exit__(self, *exc):
+        self.process.terminate()
+        self.process.wait(30)
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(0, min(len(sorted_values) - 1, round(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+def summarize(latencies, errors=0, elapsed=None):
+    """Summarize a list of latencies (seconds) into the stored result format."""
+    values = sorted(latencies)
+    summary = {
+        "requests": len(values),
+        "errors": errors,
+        "mean_ms": round(sum(values) / len(values) * 1000, 3) if values else None,
+        "p50_ms": None,
+        "p95_ms": None,
+        "p99_ms": None,
+        "max_ms": round(values[-1] * 1000, 3) if values else None,
+    }
+    for pct in (50, 95, 99):
+        value = percentile(values, pct)
+        summary[f"p{pct}_ms"] = round(value * 1000, 3) if value is not None else None
+    if elapsed:
+        summary["throughput_rps"] = round(len(values) / elapsed, 2)
+    return summary
+
+
+def git_revision():
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=BENCH_DIR,
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def write_results(name, params, results, output_dir=None):
+    """Store results as JSON named after the benchmark and the commit."""
+    output_dir = output_dir or RESULTS_DIR
+    os.makedirs(output_dir, exist_ok=True)
+
+    revision = git_revision()
+    now = datetime.now(timezone.utc)
+    document = {
+        "benchmark": name,
+        "revision": revision,
+        "created_at": now.isoformat(),
+        "params": params,
+        "results": results,
+    }
+    path = os.path.join(
+        output_dir, f"{name}-{revision}-{now.strftime('%Y%m%dT%H%M%S')}.json"
+    )
+    with open(path, "w") as f:
+        json.dump(document, f, indent=2, sort_keys=True)
+    return path
+
+
+class Timer:
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.elapsed = time.perf_counter() - self.start
@@ -0,0 +1,63 @@
+"""Diff two benchmark result files.
+
+    python -m benchmarks.compare old.json new.json [--threshold 10]
+
+Exits with status 1 when a latency percentile got slower, or throughput got
+lower, by more than the threshold (in percent).
+"""
+
+import argparse
+import json
+import sys
+
+# Metric name -> True when higher is better
+METRICS = {
+    "throughput_rps": True,
+    "p50_ms": False,
+    "p95_ms": False,
+    "p99_ms": False,
+}
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(old, new, threshold):
+    """Return printable rows and whether any metric regressed."""
+    rows, regressed = [], False
+    for name in sorted(set(old["results"]) & set(new["results"])):
+        for metric, higher_is_better in METRICS.items():
+            before = old["results"][name].get(metric)
+            after = new["results"][name].get(metric)
+            if not before or after is None:
+                continue
+
+            change = (after - before) / before * 100
+            worse = -change if higher_is_better else change
+            flag = ""
+            if worse > threshold:
+                flag = "REGRESSION"
+                regressed = True
+            rows.append(f"{name:>18} {metric:>15}: {before:>10} -> {after:>10} "
+                        f"({change:+.1f}%) {flag}")
+    return rows, regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("old")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=10.0)
+    args = parser.parse_args()
+
+    old, new = load(args.old), load(args.new)
+    print(f"{old['benchmark']}: {old['revision']} -> {new['revision']}")
+    rows, regressed = compare(old, new, args.threshold)
+    print("\n".join(rows))
+    sys.exit(1 if regressed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""Time deleting a post against the number of likes and comments it has.
+
+Each run seeds one post per fan-in value, with that many likes (one per user)
+and comments, then deletes the posts through DELETE /api/posts/<post_id> and
+records the latency and the SQL statements the request executed. With
+ON DELETE CASCADE the statement count stays the same at every fan-in.
+
+    python -m benchmarks.delete --fan-in 100,1000,10000,100000
+"""
+
+import argparse
+from datetime import datetime, timezone
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event, insert
+from .common import Timer, create_bench_app, summarize, write_results
+
+
+def seed_post(db, fan_in, repeat):
+    """Insert `repeat` posts with fan_in likes and comments each, return their ids."""
+    from app.models import Article, Comment, Like, Post, User
+
+    now = datetime.now(timezone.utc)
+    db.drop_all()
+    db.create_all()
+
+    db.session.execute(
+        insert(User),
+        [
+            {
+                "user_id": user_id,
+                "username": f"bench{user_id}",
+                "email": f"bench{user_id}@bench.test",
+                "password": "benchmark",
+            }
+            for user_id in range(1, fan_in + 1)
+        ],
+    )
+    db.session.execute(insert(Article), [{"article_id": 1, "link": "https://news.example.com/1"}])
+    post_ids = list(range(1, repeat + 1))
+    db.session.execute(
+        insert(Post),
+        [
+            {"post_id": post_id, "user_id": 1, "article_id": 1, "posted_at": now}
+            for post_id in post_ids
+        ],
+    )
+    for post_id in post_ids:
+        db.session.execute(
+            insert(Like),
+            [
+                {"user_id": user_id, "post_id": post_id, "liked_at": now}
+                for user_id in range(1, fan_in + 1)
+            ],
+        )
+        db.session.execute(
+            insert(Comment),
+            [
+                {
+                    "user_id": 1 + index % fan_in,
+                    "post_id": post_id,
+                    "content": "Synthetic comment",
+                    "commented_at": now,
+                }
+                for index in range(fan_in)
+            ],
+        )
+    db.session.commit()
+    return post_ids
+
+
+def time_deletes(app, db, post_ids):
+    """Delete the posts through the endpoint, return latencies and statement counts."""
+    with app.app_context():
+        token = create_access_token(identity="1")
+    client = app.test_client()
+    client.environ_base["HTTP_AUTHORIZATION"] = f"Bearer {token}"
+
+    statements = []
+
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    latencies, counts, errors = [], [], 0
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", count)
+    try:
+        for post_id in post_ids:
+            statements.clear()
+            with Timer() as timer:
+                response = client.delete(f"/api/posts/{post_id}")
+            errors += response.status_code != 200
+            latencies.append(timer.elapsed)
+            counts.append(len(statements))
+    finally:
+        event.remove(engine, "before_cursor_execute", count)
+    return latencies, counts, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-uri", help="Defaults to benchmarks/bench.sqlite")
+    parser.add_argument("--fan-in", default="100,1000,10000,100000",
+                        help="Comma-separated likes (and comments) per post")
+    parser.add_argument("--repeat", type=int, default=3, help="Deletes per fan-in")
+    parser.add_argument("--output-dir", help="Defaults to benchmarks/results")
+    args = parser.parse_args()
+
+    from app import db
+
+    app = create_bench_app(args.database_uri)
+    results = {}
+    for fan_in in (int(value) for value in args.fan_in.split(",")):
+        with app.app_context():
+            post_ids = seed_post(db, fan_in, args.repeat)
+            db.session.remove()
+
+        latencies, counts, errors = time_deletes(app, db, post_ids)
+        summary = summarize(latencies, errors)
+        summary["statements"] = max(counts)
+        results[f"fan_in_{fan_in}"] = summary
+        print(f"{fan_in:>8} likes+comments: p50={summary['p50_ms']}ms "
+              f"max={summary['max_ms']}ms statements={summary['statements']} "
+              f"errors={errors}")
+
+    params = {key: value for key, value in vars(args).items() if key != "database_uri"}
+    path = write_results("delete", params, results, args.output_dir)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
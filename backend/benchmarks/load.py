@@ -0,0 +1,206 @@
+"""Drive the real endpoints with concurrent clients and record latencies.
+
+By default the database is (re)seeded and the app is served in-process on a
+random port. Point --base-url at a running deployment (seeded with the same
+--database-uri) to benchmark gunicorn or the Docker stack instead.
+
+    python -m benchmarks.load --users 2000 --concurrency 32 --duration 60
+    python -m benchmarks.compare results/load-<old>.json results/load-<new>.json
+"""
+
+import argparse
+import random
+import threading
+import time
+import requests
+from sqlalchemy import func
+from .common import ServerThread, create_bench_app, summarize, write_results
+from .seed import BENCH_PASSWORD, add_seed_arguments, seed_from_args, user_email
+
+DEFAULT_MIX = "feed=50,search=15,collection_posts=15,like=10,comment=10"
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(","):
+        name, weight = item.split("=")
+        if name not in SCENARIOS:
+            raise argparse.ArgumentTypeError(f"Unknown scenario: {name}")
+        mix[name] = float(weight)
+    return mix
+
+
+def scenario_feed(session, base_url, rng, ranges):
+    return session.get(f"{base_url}/api/posts/feed", params={"per_page": 10})
+
+
+def scenario_search(session, base_url, rng, ranges):
+    return session.get(
+        f"{base_url}/api/user/search", params={"q": f"bench{rng.randint(1, 99)}"}
+    )
+
+
+def scenario_collection_posts(session, base_url, rng, ranges):
+    collection_id = rng.randint(1, ranges["collections"])
+    return session.get(f"{base_url}/api/collections/{collection_id}/posts")
+
+
+def scenario_like(session, base_url, rng, ranges):
+    post_id = rng.randint(1, ranges["posts"])
+    response = session.post(f"{base_url}/api/likes/{post_id}")
+    if response.status_code == 400:
+        # Already liked: unlike instead so the write mix stays balanced
+        response = session.delete(f"{base_url}/api/likes/{post_id}")
+    return response
+
+
+def scenario_comment(session, base_url, rng, ranges):
+    post_id = rng.randint(1, ranges["posts"])
+    return session.post(
+        f"{base_url}/api/comments/{post_id}", json={"comment": "Benchmark comment"}
+    )
+
+
+SCENARIOS = {
+    "feed": scenario_feed,
+    "search": scenario_search,
+    "collection_posts": scenario_collection_posts,
+    "like": scenario_like,
+    "comment": scenario_comment,
+}
+
+
+def login(session, base_url, user_id):
+    response = session.post(
+        f"{base_url}/api/login",
+        json={"email": user_email(user_id), "password": BENCH_PASSWORD},
+    )
+    response.raise_for_status()
+    token = response.json()["data"]["access_token"]
+    session.headers["Authorization"] = f"Bearer {token}"
+
+
+def run_clients(base_url, ranges, mix, concurrency, duration, warmup, random_seed):
+    """Run the clients and return {scenario: (latencies, errors)} and the elapsed time."""
+    latencies = {name: [] for name in mix}
+    errors = {name: 0 for name in mix}
+    lock = threading.Lock()
+    names, weights = list(mix), list(mix.values())
+
+    start_at = time.perf_counter() + warmup
+    stop_at = start_at + duration
+
+    def client(index):
+        rng = random.Random(random_seed + index)
+        session = requests.Session()
+        login(session, base_url, rng.randint(1, ranges["users"]))
+        local = {name: [] for name in names}
+        local_errors = {name: 0 for name in names}
+
+        while True:
+            now = time.perf_counter()
+            if now >= stop_at:
+                break
+            name = rng.choices(names, weights=weights)[0]
+            try:
+                response = SCENARIOS[name](session, base_url, rng, ranges)
+                failed = response.status_code >= 500
+            except requests.RequestException:
+                failed = True
+            elapsed = time.perf_counter() - now
+            # Requests that started during warmup are not recorded
+            if now >= start_at:
+                local[name].append(elapsed)
+                local_errors[name] += failed
+
+        with lock:
+            for name in names:
+                latencies[name].extend(local[name])
+                errors[name] += local_errors[name]
+
+    threads = [
+        threading.Thread(target=client, args=(index,)) for index in range(concurrency)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return {name: (latencies[name], errors[name]) for name in names}, duration
+
+
+def database_ranges(db):
+    from app.models import Collection, Post, User
+
+    return {
+        "users": db.session.query(func.max(User.user_id)).scalar() or 1,
+        "posts": db.session.query(func.max(Post.post_id)).scalar() or 1,
+        "collections": db.session.query(func.max(Collection.collection_id)).scalar()
+        or 1,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_seed_arguments(parser)
+    parser.add_argument("--base-url", help="Benchmark a running server instead")
+    parser.add_argument("--no-seed", action="store_true", help="Reuse the database")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="Seconds")
+    parser.add_argument("--warmup", type=float, default=3, help="Seconds")
+    parser.add_argument("--mix", type=parse_mix, default=parse_mix(DEFAULT_MIX))
+    parser.add_argument("--output-dir", help="Defaults to benchmarks/results")
+    args = parser.parse_args()
+
+    from app import db
+
+    app = create_bench_app(args.database_uri)
+    with app.app_context():
+        graph = None if args.no_seed else seed_from_args(db, args)
+        ranges = database_ranges(db)
+        db.session.remove()
+
+    def run(base_url):
+        return run_clients(
+            base_url,
+            ranges,
+            args.mix,
+            args.concurrency,
+            args.duration,
+            args.warmup,
+            args.seed,
+        )
+
+    if args.base_url:
+        per_scenario, elapsed = run(args.base_url.rstrip("/"))
+    else:
+        with ServerThread(app) as server:
+            per_scenario, elapsed = run(server.base_url)
+
+    results = {
+        name: summarize(latencies, errors, elapsed)
+        for name, (latencies, errors) in per_scenario.items()
+    }
+    all_latencies = [value for latencies, _ in per_scenario.values() for value in latencies]
+    results["total"] = summarize(
+        all_latencies, sum(errors for _, errors in per_scenario.values()), elapsed
+    )
+
+    params = {
+        key: value for key, value in vars(args).items() if key not in ("database_uri",)
+    }
+    params["graph"] = graph
+    path = write_results("load", params, results, args.output_dir)
+
+    for name, summary in results.items():
+        print(
+            f"{name:>18}: {summary['requests']:>7} req "
+            f"{summary.get('throughput_rps', 0):>9} rps "
+            f"p50={summary['p50_ms']}ms p95={summary['p95_ms']}ms "
+            f"p99={summary['p99_ms']}ms errors={summary['errors']}"
+        )
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Measure login throughput, and the latency of other requests during a login storm.
+
+The app is served by gunicorn, hashing passwords in each mode of --modes:
+"inline" on the request threads (PASSWORD_HASH_WORKERS=0) or "pool" in the
+hashing processes. --concurrency clients log in over and over for
+--duration seconds while one client requests the categories, a request
+that needs no hashing. The same client first runs alone for a baseline.
+
+    python -m benchmarks.logins --concurrency 32 --duration 20
+"""
+
+import argparse
+import os
+import tempfile
+import threading
+import time
+import requests
+from werkzeug.security import generate_password_hash
+from .common import GunicornServer, Timer, create_bench_app, summarize, write_results
+
+MODES = {"inline": {"PASSWORD_HASH_WORKERS": "0"}, "pool": {}}
+PASSWORD = "password123"
+
+
+def create_users(database_uri, count):
+    from app import db
+    from app.config import Config
+    from app.models import User
+
+    app = create_bench_app(database_uri)
+    # One hash for every user, computing one each would take minutes
+    password = generate_password_hash(PASSWORD, Config.PASSWORD_HASH_METHOD)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all(
+            User(username=f"user{i}", email=f"user{i}@bench.test", password=password)
+            for i in range(count)
+        )
+        db.session.commit()
+        db.engine.dispose()
+
+
+def probe(base_url, stop):
+    """Request the categories one after another until stop is set."""
+    latencies, errors = [], 0
+    while not stop.is_set():
+        with Timer() as timer:
+            try:
+                ok = requests.get(f"{base_url}/api/posts/categories", timeout=60).ok
+            except requests.RequestException:
+                ok = False
+        latencies.append(timer.elapsed)
+        errors += not ok
+        time.sleep(0.01)
+    return latencies, errors
+
+
+def storm(base_url, concurrency, duration, users):
+    """Log in from concurrency clients for duration seconds."""
+    latencies, errors, rejected = [], 0, 0
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(index):
+        nonlocal errors, rejected
+        session = requests.Session()
+        attempt = index
+        while time.monotonic() < deadline:
+            email = f"user{attempt % users}@bench.test"
+            attempt += concurrency
+            with Timer() as timer:
+                try:
+                    response = session.post(
+                        f"{base_url}/api/login",
+                        json={"email": email, "password": PASSWORD},
+                        timeout=60,
+                    )
+                    status = response.status_code
+                except requests.RequestException:
+                    status = None
+            with lock:
+                if status == 200:
+                    latencies.append(timer.elapsed)
+                elif status == 503:
+                    rejected += 1
+                else:
+                    errors += 1
+            if status == 503:
+                time.sleep(float(response.headers.get("Retry-After", 1)))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    with Timer() as total:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies, errors, rejected, total.elapsed
+
+
+def run_probe(base_url, seconds):
+    stop = threading.Event()
+    threading.Timer(seconds, stop.set).start()
+    return probe(base_url, stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--modes", default="inline,pool")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=20)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--output-dir", help="Defaults to benchmarks/results")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        database_uri = f"sqlite:///{os.path.join(directory, 'logins.sqlite')}"
+        create_users(database_uri, args.users)
+        for mode in args.modes.split(","):
+            options = ["--workers", str(args.workers), "--threads", str(args.threads)]
+            with GunicornServer(options, MODES[mode], database_uri) as server:
+                baseline, baseline_errors = run_probe(server.base_url, 5)
+                stop = threading.Event()
+                probed = []
+                prober = threading.Thread(
+                    target=lambda: probed.extend(probe(server.base_url, stop))
+                )
+                prober.start()
+                logins, errors, rejected, elapsed = storm(
+                    server.base_url, args.concurrency, args.duration, args.users
+                )
+                stop.set()
+                prober.join()
+            other, other_errors = probed
+
+            results[mode] = {
+                "logins": {**summarize(logins, errors, elapsed), "rejected": rejected},
+                "other_alone": summarize(baseline, baseline_errors),
+                "other_during_storm": summarize(other, other_errors),
+            }
+            login, other = results[mode]["logins"], results[mode]["other_during_storm"]
+            print(
+                f"{mode:>8}: logins {login['throughput_rps']} rps "
+                f"p99={login['p99_ms']}ms rejected={rejected} | other requests "
+                f"p50={results[mode]['other_alone']['p50_ms']}ms alone, "
+                f"p50={other['p50_ms']}ms p99={other['p99_ms']}ms during the storm"
+            )
+
+    path = write_results("logins", vars(args), results, args.output_dir)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""Measure what logging costs each request, against a budget at a target rate.
+
+Runs the access log of --requests requests in a request context, at several
+sample rates, with stdout sent to /dev/null. The CPU time includes the
+thread writing the JSON lines, which holds the GIL while it formats them.
+It reports the CPU time per request and the share of a core that is at
+--rate requests per second. A last run stalls stdout (10 ms per line) to
+check that request threads don't wait for it.
+
+    python -m benchmarks.logs --requests 50000 --rate 5000 --budget 2
+"""
+
+import argparse
+import os
+import sys
+import time
+from flask import g
+from app import logs
+from app.logs import parse_rates
+from .common import create_bench_app, summarize, write_results
+
+SAMPLE_RATES = (0, 0.01, 1)
+
+
+class StalledStdout:
+    """A stdout that takes 10 ms per write, like a blocked pipe, until released."""
+
+    def __init__(self):
+        self.stalled = True
+
+    def write(self, text):
+        if self.stalled:
+            time.sleep(0.01)
+
+    def flush(self):
+        pass
+
+
+def run(app, requests, rate, stdout, log=True):
+    logs._sampler = logs.Sampler({f"{app.import_name}.access": rate})
+    response = app.response_class(status=200)
+    latencies = []
+    saved, sys.stdout = sys.stdout, stdout
+    try:
+        with app.test_request_context("/api/posts/categories"):
+            g.metrics_namespace = "posts"
+            cpu = time.process_time()
+            for _ in range(requests):
+                g.metrics_start = start = time.perf_counter()
+                if log:
+                    logs._log_request(response)
+                latencies.append(time.perf_counter() - start)
+            # Count the writing of what is still queued
+            if isinstance(stdout, StalledStdout):
+                stdout.stalled = False
+            logs._handler.stop()
+            cpu = time.process_time() - cpu
+    finally:
+        sys.stdout = saved
+    return cpu, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=50000)
+    parser.add_argument("--rate", type=int, default=5000, help="Requests per second")
+    parser.add_argument(
+        "--budget", type=float, default=2, help="Percent of a core at --rate"
+    )
+    parser.add_argument("--database-uri", help="Unused, the access log runs no SQL")
+    parser.add_argument("--output-dir", help="Defaults to benchmarks/results")
+    args = parser.parse_args()
+
+    app = create_bench_app(args.database_uri)
+    default_rate = parse_rates(app.config["LOG_SAMPLE_RATES"]).get("access", 1.0)
+    results = {}
+    with open(os.devnull, "w") as devnull:
+        # The same loop without logging, subtracted from the other runs
+        baseline, _ = run(app, args.requests, 0, devnull, log=False)
+        for rate in sorted({*SAMPLE_RATES, default_rate}):
+            cpu, latencies = run(app, args.requests, rate, devnull)
+            per_request = max(0, cpu - baseline) / args.requests
+            results[f"sample_rate_{rate}"] = {
+                **summarize(latencies),
+                "cpu_us_per_request": round(per_request * 1e6, 3),
+                "core_percent_at_rate": round(per_request * args.rate * 100, 3),
+            }
+    _, latencies = run(app, args.requests, 1, StalledStdout())
+    results["stalled_stdout"] = summarize(latencies)
+
+    for name, summary in results.items():
+        line = f"{name:>18}: p99={summary['p99_ms']}ms max={summary['max_ms']}ms"
+        if "cpu_us_per_request" in summary:
+            line += (
+                f" cpu={summary['cpu_us_per_request']}us/request"
+                f" ({summary['core_percent_at_rate']}% of a core at {args.rate}/s)"
+            )
+        print(line)
+
+    path = write_results("logs", vars(args), results, args.output_dir)
+    print(f"Results written to {path}")
+
+    spent = results[f"sample_rate_{default_rate}"]["core_percent_at_rate"]
+    if spent > args.budget:
+        print(f"Over budget: {spent}% > {args.budget}% of a core")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
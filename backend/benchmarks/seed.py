@@ -0,0 +1,265 @@
+"""Seed a synthetic social graph for the benchmarks.
+
+Follows are drawn with preferential weights (rank ** -alpha), so a handful of
+users end up with most of the followers, like a real social network. Posts
+spread over the last 24 hours, across every CategoryEnum value, and likes and
+comments favour the posts of popular users.
+
+    python -m benchmarks.seed --users 2000 --posts-per-user 5
+"""
+
+import argparse
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import insert
+from werkzeug.security import generate_password_hash
+from .common import create_bench_app
+
+BENCH_PASSWORD = "benchmark"
+
+
+def user_email(user_id):
+    return f"bench{user_id}@bench.test"
+
+
+def _weighted_sample(rng, population, weights, k):
+    """Sample k distinct items, favouring heavy weights."""
+    k = min(k, len(population))
+    chosen = set()
+    attempts = 0
+    while len(chosen) < k and attempts < k * 10:
+        chosen.update(rng.choices(population, weights=weights, k=k - len(chosen)))
+        attempts += k
+    return chosen
+
+
+def seed(
+    db,
+    users=1000,
+    avg_follows=20,
+    alpha=1.1,
+    posts_per_user=3,
+    likes_per_post=5,
+    comments_per_post=2,
+    collections_per_user=2,
+    posts_per_collection=10,
+    random_seed=162,
+):
+    """Insert the graph with bulk INSERTs and return a summary of what was created."""
+    from app.models import (
+        Article,
+        CategoryEnum,
+        Collection,
+        CollectionPost,
+        Comment,
+        Follow,
+        Like,
+        Post,
+        PostCategory,
+        User,
+        UserStats,
+    )
+
+    rng = random.Random(random_seed)
+    now = datetime.now(timezone.utc)
+    password = generate_password_hash(BENCH_PASSWORD)
+
+    db.drop_all()
+    db.create_all()
+
+    user_ids = list(range(1, users + 1))
+    # Popularity follows a power law over a random ranking of the users
+    ranking = user_ids[:]
+    rng.shuffle(ranking)
+    popularity = {user_id: (rank + 1) ** -alpha for rank, user_id in enumerate(ranking)}
+    weights = [popularity[user_id] for user_id in user_ids]
+
+    db.session.execute(
+        insert(User),
+        [
+            {
+                "user_id": user_id,
+                "username": f"bench{user_id}",
+                "email": user_email(user_id),
+                "password": password,
+                "created_at": now,
+                "bio_description": f"Benchmark user {user_id}",
+            }
+            for user_id in user_ids
+        ],
+    )
+
+    follows = []
+    for user_id in user_ids:
+        out_degree = max(1, int(rng.expovariate(1 / avg_follows)))
+        for followed_id in _weighted_sample(rng, user_ids, weights, out_degree):
+            if followed_id != user_id:
+                follows.append(
+                    {"user_id": followed_id, "follower_id": user_id, "followed_at": now}
+                )
+    if follows:
+        db.session.execute(insert(Follow), follows)
+
+    # The app keeps these in step with Follow, bulk inserts bypass it
+    followers = Counter(follow["user_id"] for follow in follows)
+    following = Counter(follow["follower_id"] for follow in follows)
+    db.session.execute(
+        insert(UserStats),
+        [
+            {
+                "user_id": user_id,
+                "followers_count": followers[user_id],
+                "following_count": following[user_id],
+            }
+            for user_id in user_ids
+        ],
+    )
+
+    article_count = max(1, users * posts_per_user // 2)
+    db.session.execute(
+        insert(Article),
+        [
+            {
+                "article_id": article_id,
+                "link": f"https://news.example.com/{article_id}",
+                "source": "Example News",
+                "title": f"Article {article_id}",
+                "caption": "Synthetic article for benchmarking",
+                "preview": f"https://news.example.com/{article_id}.png",
+            }
+            for article_id in range(1, article_count + 1)
+        ],
+    )
+
+    categories = list(CategoryEnum)
+    posts, post_categories = [], []
+    post_id = 0
+    for user_id in user_ids:
+        for _ in range(posts_per_user):
+            post_id += 1
+            posts.append(
+                {
+                    "post_id": post_id,
+                    "user_id": user_id,
+                    "article_id": rng.randint(1, article_count),
+                    "description": f"Post {post_id}",
+                    "posted_at": now - timedelta(seconds=rng.randint(0, 23 * 3600)),
+                }
+            )
+            for category in rng.sample(categories, rng.randint(1, 3)):
+                post_categories.append({"post_id": post_id, "category": category})
+    if posts:
+        db.session.execute(insert(Post), posts)
+        db.session.execute(insert(PostCategory), post_categories)
+
+    # Interactions go preferentially to the posts of popular users
+    post_ids = [post["post_id"] for post in posts]
+    post_weights = [popularity[post["user_id"]] for post in posts]
+    likes, comments = [], []
+    for _ in range(len(posts) * likes_per_post):
+        likes.append(
+            {
+                "user_id": rng.choice(user_ids),
+                "post_id": rng.choices(post_ids, weights=post_weights)[0],
+                "liked_at": now,
+            }
+        )
+    # (user_id, post_id) is the primary key of Like
+    likes = list({(like["user_id"], like["post_id"]): like for like in likes}.values())
+    for _ in range(len(posts) * comments_per_post):
+        comments.append(
+            {
+                "user_id": rng.choice(user_ids),
+                "post_id": rng.choices(post_ids, weights=post_weights)[0],
+                "content": "Synthetic comment",
+                "commented_at": now,
+            }
+        )
+    if likes:
+        db.session.execute(insert(Like), likes)
+    if comments:
+        db.session.execute(insert(Comment), comments)
+
+    collections, collection_posts = [], []
+    collection_id = 0
+    for user_id in user_ids:
+        for index in range(collections_per_user):
+            collection_id += 1
+            collections.append(
+                {
+                    "collection_id": collection_id,
+                    "user_id": user_id,
+                    "title": f"Collection {index}",
+                    "is_public": index % 2 == 0,
+                    "created_at": now,
+                }
+            )
+            for saved_post_id in rng.sample(
+                post_ids, min(posts_per_collection, len(post_ids))
+            ):
+                collection_posts.append(
+                    {"collection_id": collection_id, "post_id": saved_post_id}
+                )
+    if collections:
+        db.session.execute(insert(Collection), collections)
+    if collection_posts:
+        db.session.execute(insert(CollectionPost), collection_posts)
+
+    db.session.commit()
+
+    return {
+        "users": users,
+        "follows": len(follows),
+        "posts": len(posts),
+        "likes": len(likes),
+        "comments": len(comments),
+        "collections": len(collections),
+        "collection_posts": len(collection_posts),
+        "most_followed_user_id": ranking[0],
+    }
+
+
+def add_seed_arguments(parser):
+    parser.add_argument("--database-uri", help="Defaults to benchmarks/bench.sqlite")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--avg-follows", type=int, default=20)
+    parser.add_argument("--alpha", type=float, default=1.1)
+    parser.add_argument("--posts-per-user", type=int, default=3)
+    parser.add_argument("--likes-per-post", type=int, default=5)
+    parser.add_argument("--comments-per-post", type=int, default=2)
+    parser.add_argument("--collections-per-user", type=int, default=2)
+    parser.add_argument("--posts-per-collection", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=162)
+
+
+def seed_from_args(db, args):
+    return seed(
+        db,
+        users=args.users,
+        avg_follows=args.avg_follows,
+        alpha=args.alpha,
+        posts_per_user=args.posts_per_user,
+        likes_per_post=args.likes_per_post,
+        comments_per_post=args.comments_per_post,
+        collections_per_user=args.collections_per_user,
+        posts_per_collection=args.posts_per_collection,
+        random_seed=args.seed,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    add_seed_arguments(parser)
+    args = parser.parse_args()
+
+    from app import db
+
+    app = create_bench_app(args.database_uri)
+    with app.app_context():
+        summary = seed_from_args(db, args)
+    print(summary)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""Compare gunicorn startup time and memory per worker with and without preload.
+
+Starts the app under gunicorn.conf.py with GUNICORN_PRELOAD=true and false,
+waits for it to answer, then reads the memory of the master and of every
+worker from /proc (Linux only). RSS counts the pages a worker shares with the
+master, USS only its own, and PSS splits the shared pages between the
+processes sharing them. Preloading mostly lowers USS and PSS.
+
+    python -m benchmarks.startup --workers 4
+"""
+
+import argparse
+import os
+import time
+from .common import GunicornServer, Timer, write_results
+
+
+def memory_kb(pid):
+    """RSS, PSS and USS of a process in kB, from /proc/<pid>/smaps_rollup."""
+    fields = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return {
+        "rss_kb": fields["Rss"],
+        "pss_kb": fields["Pss"],
+        "uss_kb": fields["Private_Clean"] + fields["Private_Dirty"],
+    }
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        return [int(child) for child in f.read().split()]
+
+
+def average(samples, key):
+    return round(sum(sample[key] for sample in samples) / len(samples))
+
+
+def measure(preload, workers, database_uri, settle):
+    options = ["--workers", str(workers)]
+    env = {"GUNICORN_PRELOAD": "true" if preload else "false"}
+    server = GunicornServer(options, env=env, database_uri=database_uri)
+    with Timer() as startup:
+        server.__enter__()
+    try:
+        # The first answer only means one worker is up
+        master = server.process.pid
+        while len(children(master)) < workers:
+            time.sleep(0.1)
+        time.sleep(settle)
+        worker_pids = children(master)
+        samples = [memory_kb(pid) for pid in worker_pids]
+        result = {
+            "startup_s": round(startup.elapsed, 3),
+            "workers": len(worker_pids),
+            "master_rss_kb": memory_kb(master)["rss_kb"],
+        }
+        for key in ("rss_kb", "pss_kb", "uss_kb"):
+            result[f"worker_{key}"] = average(samples, key)
+        result["total_pss_kb"] = sum(s["pss_kb"] for s in samples) + memory_kb(master)[
+            "pss_kb"
+        ]
+        return result
+    finally:
+        server.__exit__()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-uri", help="Defaults to benchmarks/bench.sqlite")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--settle", type=float, default=5,
+                        help="Seconds to let every worker boot before measuring")
+    parser.add_argument("--output-dir", help="Defaults to benchmarks/results")
+    args = parser.parse_args()
+    if not os.path.exists("/proc/self/smaps_rollup"):
+        parser.error("Memory is read from /proc/<pid>/smaps_rollup, Linux only")
+
+    results = {}
+    for preload in (False, True):
+        name = "preload" if preload else "no_preload"
+        results[name] = result = measure(
+            preload, args.workers, args.database_uri, args.settle
+        )
+        print(f"{name:>10}: started in {result['startup_s']}s, per worker "
+              f"rss={result['worker_rss_kb']}kB pss={result['worker_pss_kb']}kB "
+              f"uss={result['worker_uss_kb']}kB, total pss={result['total_pss_kb']}kB")
+
+    params = {key: value for key, value in vars(args).items() if key != "database_uri"}
+    path = write_results("startup", params, results, args.output_dir)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Measure /api/og throughput when the linked pages are slow to respond.
+
+A local upstream answers every page after --delay seconds. The app is served
+by gunicorn with each worker class of --modes, and --concurrency clients ask
+it for the OpenGraph tags of distinct links at once, so none is cached. With
+sync workers a worker is blocked for the whole fetch. With gthread each of
+its --threads waits on its own fetch.
+
+    python -m benchmarks.upstream --concurrency 100 --delay 1
+"""
+
+import argparse
+import threading
+import time
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from .common import GunicornServer, Timer, summarize, write_results
+
+PAGE = b"""<html><head>
+<meta property="og:title" content="Slow article">
+<meta property="og:image" content="https://news.example.com/cover.png">
+</head></html>"""
+
+
+def slow_upstream(delay):
+    """HTTP server answering every GET with PAGE after delay seconds."""
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html")
+            self.send_header("Content-Length", str(len(PAGE)))
+            self.end_headers()
+            self.wfile.write(PAGE)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def fetch_all(base_url, upstream_url, concurrency, run):
+    """Ask for concurrency distinct links at once, return latencies and errors."""
+    latencies, errors = [], 0
+    lock = threading.Lock()
+    start = threading.Barrier(concurrency)
+
+    def client(index):
+        nonlocal errors
+        start.wait()
+        with Timer() as timer:
+            try:
+                response = requests.post(
+                    f"{base_url}/api/og/",
+                    json={"url": f"{upstream_url}/article/{run}-{index}"},
+                    timeout=600,
+                )
+                ok = response.status_code == 200
+            except requests.RequestException:
+                ok = False
+        with lock:
+            latencies.append(timer.elapsed)
+            errors += not ok
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(concurrency)]
+    with Timer() as total:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return latencies, errors, total.elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--database-uri", help="Defaults to benchmarks/bench.sqlite")
+    parser.add_argument("--modes", default="sync,gthread",
+                        help="Comma-separated gunicorn worker classes")
+    parser.add_argument("--workers", type=int, default=1)
+    parser.add_argument("--threads", type=int, default=8, help="Threads per gthread worker")
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--delay", type=float, default=1, help="Upstream latency, seconds")
+    parser.add_argument("--output-dir", help="Defaults to benchmarks/results")
+    args = parser.parse_args()
+
+    upstream = slow_upstream(args.delay)
+    upstream_url = f"http://127.0.0.1:{upstream.server_address[1]}"
+    results = {}
+    try:
+        for mode in args.modes.split(","):
+            # gunicorn turns sync workers with threads into gthread ones
+            threads = 1 if mode == "sync" else args.threads
+            options = ["--workers", str(args.workers), "--worker-class", mode,
+                       "--threads", str(threads)]
+            with GunicornServer(options, database_uri=args.database_uri) as server:
+                latencies, errors, elapsed = fetch_all(
+                    server.base_url, upstream_url, args.concurrency, mode
+                )
+            summary = summarize(latencies, errors, elapsed)
+            results[mode] = summary
+            print(f"{mode:>8}: {summary['throughput_rps']:>8} rps "
+                  f"p50={summary['p50_ms']}ms max={summary['max_ms']}ms "
+                  f"errors={errors}")
+    finally:
+        upstream.shutdown()
+
+    params = {key: value for key, value in vars(args).items() if key != "database_uri"}
+    path = write_results("upstream", params, results, args.output_dir)
+    print(f"Results written to {path}")
+
+
+if __name__ == "__main__":
+    main()
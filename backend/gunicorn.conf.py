@@ -0,0 +1,80 @@
+# Gunicorn picks this file up automatically from the working directory.
+# Every setting can be overridden with the environment variable next to it.
+import os
+import shutil
+import tempfile
+
+
+def available_cpus():
+    # The CPUs this container may run on, not the host's
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+# Metrics are shared between workers through mmap files in this directory.
+# It has to exist before the app is imported, which is here in the master
+# with preload_app: unlabelled metrics open their file at import. Samples
+# from a previous run would otherwise be merged into /metrics, so it is
+# emptied on the first load of this file (not when a HUP reloads it).
+metrics_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "flashnews-metrics")
+)
+if not os.environ.get("FLASHNEWS_METRICS_DIR_READY"):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.environ["FLASHNEWS_METRICS_DIR_READY"] = "1"
+os.makedirs(metrics_dir, exist_ok=True)
+
+# Platforms such as Railway pass the port to listen on in PORT
+bind = os.getenv("GUNICORN_BIND", f"0.0.0.0:{os.getenv('PORT', 5000)}")
+workers = int(os.getenv("GUNICORN_WORKERS", 2 * available_cpus() + 1))
+
+# Threaded workers keep serving while requests wait on the network
+# (OpenGraph fetches, the upload storage) or the database. A worker holds at
+# most `threads` database connections, within SQLAlchemy's default pool of
+# 5 + 10 overflow.
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.getenv("GUNICORN_THREADS", 8))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+
+# Import the app once in the master, the workers share its memory pages
+preload_app = os.getenv("GUNICORN_PRELOAD", "true").lower() == "true"
+
+# Recycle workers now and then so that a leak can't grow forever, at
+# staggered times so they don't all restart at once
+max_requests = int(os.getenv("GUNICORN_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("GUNICORN_MAX_REQUESTS_JITTER", 100))
+
+# Longer than the idle timeout of the proxy in front (60 s for most load
+# balancers), so the proxy always closes idle connections first
+keepalive = int(os.getenv("GUNICORN_KEEPALIVE", 75))
+
+loglevel = os.getenv("GUNICORN_LOG_LEVEL", "info")
+
+
+def post_fork(server, worker):
+    if not server.cfg.preload_app:
+        return
+    from app import db
+
+    # Connections the master opened while loading the app are inherited by
+    # every worker. Drop them from the worker's pools without
+    # closing them, the master still owns the sockets.
+    with server.app.wsgi().app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    from app.deletion import start_resuming
+
+    # Finish account deletions whose runner died, e.g. in a worker restart
+    start_resuming(worker.wsgi)
+
+
+def child_exit(server, worker):
+    from prometheus_client import multiprocess
+
+    # Drop the in-flight gauge of the dead worker
+    multiprocess.mark_process_dead(worker.pid)
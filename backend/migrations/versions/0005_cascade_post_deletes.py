@@ -0,0 +1,61 @@
+"""Cascade post deletes
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 17:03:54.155814
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+# Tables whose rows belong to a post
+POST_CHILDREN = (
+    'archived_comment',
+    'archived_like',
+    'collection_post',
+    'comment',
+    'like',
+    'post_archive',
+    'post_category',
+)
+
+# Names the unnamed foreign keys of SQLite tables created before the naming
+# convention, the way Postgres names them
+NAMING_CONVENTION = {'fk': '%(table_name)s_%(column_0_name)s_fkey'}
+
+
+def post_is_partitioned():
+    # `flask partitions setup` replaced these foreign keys with a trigger
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return False
+    return bool(bind.execute(sa.text(
+        "SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'post'::regclass"
+    )).scalar())
+
+
+def set_post_foreign_keys(ondelete):
+    if post_is_partitioned():
+        return
+    for table in POST_CHILDREN:
+        name = f'{table}_post_id_fkey'
+        with op.batch_alter_table(table, naming_convention=NAMING_CONVENTION) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(
+                name, 'post', ['post_id'], ['post_id'], ondelete=ondelete
+            )
+
+
+def upgrade():
+    set_post_foreign_keys('CASCADE')
+
+
+def downgrade():
+    set_post_foreign_keys(None)
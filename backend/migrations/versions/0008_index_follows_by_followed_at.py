@@ -0,0 +1,39 @@
+"""Index follows by followed_at
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 17:12:41.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0008'
+down_revision = '0007'
+branch_labels = None
+depends_on = None
+
+FOLLOW_INDEXES = {
+    'ix_follow_follower_id_followed_at': ['follower_id', 'followed_at'],
+    'ix_follow_user_id_followed_at': ['user_id', 'followed_at'],
+}
+
+
+def upgrade():
+    # Databases created by the app before the migrations lack them. Those
+    # created by an earlier 0001, which had them, are left as they are.
+    existing = {
+        index['name'] for index in sa.inspect(op.get_bind()).get_indexes('follow')
+    }
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        for name, columns in FOLLOW_INDEXES.items():
+            if name not in existing:
+                batch_op.create_index(name, columns, unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('follow', schema=None) as batch_op:
+        for name in FOLLOW_INDEXES:
+            batch_op.drop_index(name)
@@ -0,0 +1,42 @@
+"""One unfinished account deletion per user
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 17:15:27.804316
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0009'
+down_revision = '0008'
+branch_labels = None
+depends_on = None
+
+UNFINISHED = "status IN ('pending', 'running', 'failed')"
+
+
+def upgrade():
+    # Repeated requests used to create a job each. Keep the oldest one per
+    # user, the others would only delete what it deletes.
+    op.execute(
+        "UPDATE account_deletion SET status = 'superseded' "
+        f"WHERE {UNFINISHED} AND EXISTS ("
+        "SELECT 1 FROM account_deletion AS earlier "
+        "WHERE earlier.user_id = account_deletion.user_id "
+        f"AND earlier.{UNFINISHED} "
+        "AND (earlier.requested_at < account_deletion.requested_at "
+        "OR (earlier.requested_at = account_deletion.requested_at "
+        "AND earlier.job_id < account_deletion.job_id)))"
+    )
+    with op.batch_alter_table('account_deletion', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('heartbeat_at', sa.DateTime(timezone=True), nullable=True))
+        batch_op.create_index('ix_account_deletion_user_id_unfinished', ['user_id'], unique=True, postgresql_where=sa.text(UNFINISHED), sqlite_where=sa.text(UNFINISHED))
+
+
+def downgrade():
+    with op.batch_alter_table('account_deletion', schema=None) as batch_op:
+        batch_op.drop_index('ix_account_deletion_user_id_unfinished', postgresql_where=sa.text(UNFINISHED), sqlite_where=sa.text(UNFINISHED))
+        batch_op.drop_column('heartbeat_at')